@@ -10,6 +10,8 @@ from app.models import Base  # noqa
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
+# Same default as app/database.py; % is escaped for the ini interpolation
+config.set_main_option('sqlalchemy.url', os.getenv('DATABASE_URL', 'sqlite:///./test.db').replace('%', '%%'))
 
 # Interpret the config file for Python logging.
 fileConfig(config.config_file_name)
@@ -17,7 +19,7 @@ fileConfig(config.config_file_name)
 target_metadata = Base.metadata
 
 def run_migrations_offline():
-    url = os.getenv('DATABASE_URL')
+    url = config.get_main_option('sqlalchemy.url')
     context.configure(
         url=url, target_metadata=target_metadata, literal_binds=True, compare_type=True
     )
@@ -0,0 +1,42 @@
+"""issue counters
+
+Revision ID: 0c228a08240b
+Revises: 0d3bd7202828
+Create Date: 2026-10-17 21:47:36.104529
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c228a08240b'
+down_revision: Union[str, Sequence[str], None] = '0d3bd7202828'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'issue_counters',
+        sa.Column('status', sa.Enum('OPEN', 'TRIAGED', 'IN_PROGRESS', 'DONE', name='issuestatus', create_type=False), nullable=False),
+        sa.Column('severity', sa.Enum('LOW', 'MEDIUM', 'HIGH', 'CRITICAL', name='issueseverity', create_type=False), nullable=False),
+        sa.Column('count', sa.Integer(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('status', 'severity'),
+        if_not_exists=True,
+    )
+    # Backfill from existing issues; the reconcile task keeps them honest afterwards.
+    # Skipped when the app (built with create_all) is already maintaining them
+    op.execute(
+        "INSERT INTO issue_counters (status, severity, count) "
+        "SELECT status, severity, count(*) FROM issues "
+        "WHERE NOT EXISTS (SELECT 1 FROM issue_counters) GROUP BY status, severity"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('issue_counters')
@@ -0,0 +1,93 @@
+"""baseline schema
+
+Revision ID: 4b8e1d2c7f90
+Revises:
+Create Date: 2026-10-17 09:04:18.552310
+
+The users, issues and daily_stats tables as they were before any revision
+existed. Databases the app already created with ``Base.metadata.create_all``
+have them, so every step here is skipped when its object exists.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b8e1d2c7f90'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ENUMS = {
+    'userrole': ('ADMIN', 'MAINTAINER', 'REPORTER'),
+    'issuestatus': ('OPEN', 'TRIAGED', 'IN_PROGRESS', 'DONE'),
+    'issueseverity': ('LOW', 'MEDIUM', 'HIGH', 'CRITICAL'),
+}
+
+
+def enum(name: str) -> sa.Enum:
+    return sa.Enum(*ENUMS[name], name=name, create_type=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    for name, values in ENUMS.items():
+        sa.Enum(*values, name=name).create(bind, checkfirst=True)
+
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('hashed_password', sa.String(), nullable=True),
+        sa.Column('google_id', sa.String(), nullable=True),
+        sa.Column('role', enum('userrole'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True,
+    )
+    op.create_index('ix_users_id', 'users', ['id'], if_not_exists=True)
+    op.create_index('ix_users_email', 'users', ['email'], unique=True, if_not_exists=True)
+
+    op.create_table(
+        'issues',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=False),
+        sa.Column('file_path', sa.String(), nullable=True),
+        sa.Column('severity', enum('issueseverity'), nullable=False),
+        sa.Column('status', enum('issuestatus'), nullable=False),
+        sa.Column('reporter_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['reporter_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True,
+    )
+    op.create_index('ix_issues_id', 'issues', ['id'], if_not_exists=True)
+
+    op.create_table(
+        'daily_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('status', enum('issuestatus'), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True,
+    )
+    op.create_index('ix_daily_stats_id', 'daily_stats', ['id'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_daily_stats_id', table_name='daily_stats')
+    op.drop_table('daily_stats')
+    op.drop_index('ix_issues_id', table_name='issues')
+    op.drop_table('issues')
+    op.drop_index('ix_users_email', table_name='users')
+    op.drop_index('ix_users_id', table_name='users')
+    op.drop_table('users')
+    bind = op.get_bind()
+    for name, values in ENUMS.items():
+        sa.Enum(*values, name=name).drop(bind, checkfirst=True)
@@ -0,0 +1,31 @@
+"""user token version
+
+Revision ID: 60c367528152
+Revises: d1f878e9b6bf
+Create Date: 2026-10-17 16:25:50.927446
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '60c367528152'
+down_revision: Union[str, Sequence[str], None] = 'd1f878e9b6bf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # create_all already adds it on databases the app built after this revision
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('users')}
+    if 'token_version' not in columns:
+        op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'token_version')
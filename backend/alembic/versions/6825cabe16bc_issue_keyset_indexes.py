@@ -0,0 +1,30 @@
+"""issue keyset pagination indexes
+
+Revision ID: 6825cabe16bc
+Revises: 4b8e1d2c7f90
+Create Date: 2026-10-17 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6825cabe16bc'
+down_revision: Union[str, Sequence[str], None] = '4b8e1d2c7f90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_issues_created_at_id', 'issues', ['created_at', 'id'], if_not_exists=True)
+    op.create_index('ix_issues_reporter_id_created_at_id', 'issues', ['reporter_id', 'created_at', 'id'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_issues_reporter_id_created_at_id', table_name='issues')
+    op.drop_index('ix_issues_created_at_id', table_name='issues')
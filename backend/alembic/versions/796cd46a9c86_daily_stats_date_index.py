@@ -0,0 +1,28 @@
+"""daily stats date index
+
+Revision ID: 796cd46a9c86
+Revises: 0c228a08240b
+Create Date: 2026-10-17 23:12:58.640117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '796cd46a9c86'
+down_revision: Union[str, Sequence[str], None] = '0c228a08240b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_daily_stats_date_status', 'daily_stats', ['date', 'status'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_daily_stats_date_status', table_name='daily_stats')
@@ -0,0 +1,28 @@
+"""issue list filter indexes
+
+Revision ID: 909cea0e4c3e
+Revises: 6825cabe16bc
+Create Date: 2026-10-17 11:40:07.552981
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '909cea0e4c3e'
+down_revision: Union[str, Sequence[str], None] = '6825cabe16bc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_issues_status_severity_created_at', 'issues', ['status', 'severity', 'created_at'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_issues_status_severity_created_at', table_name='issues')
@@ -0,0 +1,58 @@
+"""issue change feed
+
+Revision ID: be2f444fffe3
+Revises: 796cd46a9c86
+Create Date: 2026-10-17 23:12:05.318402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'be2f444fffe3'
+down_revision: Union[str, Sequence[str], None] = '796cd46a9c86'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing issues start at 0, so they come back in every client's first sync.
+    # create_all already adds it on databases the app built after this revision
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('issues')}
+    if 'change_seq' not in columns:
+        op.add_column('issues', sa.Column('change_seq', sa.BigInteger(), server_default='0', nullable=False))
+    op.create_index('ix_issues_change_seq_id', 'issues', ['change_seq', 'id'], if_not_exists=True)
+    op.create_index('ix_issues_reporter_id_change_seq_id', 'issues', ['reporter_id', 'change_seq', 'id'], if_not_exists=True)
+    op.create_table(
+        'issue_tombstones',
+        sa.Column('issue_id', sa.Integer(), nullable=False),
+        sa.Column('reporter_id', sa.Integer(), nullable=False),
+        sa.Column('change_seq', sa.BigInteger(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('issue_id'),
+        if_not_exists=True,
+    )
+    op.create_index('ix_issue_tombstones_change_seq_issue_id', 'issue_tombstones', ['change_seq', 'issue_id'], if_not_exists=True)
+    op.create_index('ix_issue_tombstones_reporter_id_change_seq_issue_id', 'issue_tombstones', ['reporter_id', 'change_seq', 'issue_id'], if_not_exists=True)
+    op.create_table(
+        'change_sequences',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('value', sa.BigInteger(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('change_sequences')
+    op.drop_index('ix_issue_tombstones_reporter_id_change_seq_issue_id', table_name='issue_tombstones')
+    op.drop_index('ix_issue_tombstones_change_seq_issue_id', table_name='issue_tombstones')
+    op.drop_table('issue_tombstones')
+    op.drop_index('ix_issues_reporter_id_change_seq_id', table_name='issues')
+    op.drop_index('ix_issues_change_seq_id', table_name='issues')
+    op.drop_column('issues', 'change_seq')
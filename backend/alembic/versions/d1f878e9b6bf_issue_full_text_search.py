@@ -0,0 +1,50 @@
+"""issue full-text search
+
+Revision ID: d1f878e9b6bf
+Revises: 909cea0e4c3e
+Create Date: 2026-10-17 14:03:26.104377
+
+Postgres gets a weighted tsvector column with a GIN index, SQLite an FTS5
+shadow table. Both are backfilled from the existing issues.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1f878e9b6bf'
+down_revision: Union[str, Sequence[str], None] = '909cea0e4c3e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("ALTER TABLE issues ADD COLUMN IF NOT EXISTS search_vector tsvector")
+        op.execute(
+            "UPDATE issues SET search_vector = "
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+        )
+        op.execute("CREATE INDEX IF NOT EXISTS ix_issues_search_vector ON issues USING GIN (search_vector)")
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS issues_fts "
+            "USING fts5(title, description, tokenize='porter unicode61')"
+        )
+        op.execute("DELETE FROM issues_fts")
+        op.execute("INSERT INTO issues_fts (rowid, title, description) SELECT id, title, description FROM issues")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_issues_search_vector")
+        op.execute("ALTER TABLE issues DROP COLUMN IF EXISTS search_vector")
+    elif dialect == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS issues_fts")
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """Bounded in-process LRU cache whose entries expire after `ttl` seconds.
+
+    `on_evict(key, value)` is called, outside the lock, for each entry pushed
+    out to stay within `maxsize` (not for expired or popped ones).
+    """
+
+    def __init__(self, maxsize: int, ttl: float, on_evict: Optional[Callable[[Hashable, Any], None]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store a value, optionally expiring sooner than the cache-wide ttl"""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        evicted = []
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted_key, (evicted_value, _) = self._data.popitem(last=False)
+                evicted.append((evicted_key, evicted_value))
+        if self.on_evict is not None:
+            for evicted_key, evicted_value in evicted:
+                self.on_evict(evicted_key, evicted_value)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def discard_where(self, predicate: Callable[[Any], bool]) -> int:
+        """Drop every entry whose value matches `predicate`; returns how many"""
+        with self._lock:
+            keys = [key for key, (value, _) in self._data.items() if predicate(value)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
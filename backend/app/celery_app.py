@@ -25,4 +25,25 @@ celery_app.conf.update(
     task_soft_time_limit=25 * 60,  # 25 minutes
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
-) 
\ No newline at end of file
+)
+
+# Periodic tasks (run `celery -A app.celery_app beat`)
+celery_app.conf.beat_schedule = {
+    "aggregate-stats": {
+        "task": "app.tasks.aggregate_daily_stats",
+        # Every slot is written once, so running more often than the slot only retries
+        "schedule": float(os.getenv("STATS_SNAPSHOT_MINUTES", "60")) * 60,
+    },
+    "reconcile-issue-counters": {
+        "task": "app.tasks.reconcile_issue_counters",
+        "schedule": float(os.getenv("ISSUE_COUNTERS_RECONCILE_SECONDS", "3600")),
+    },
+    "purge-issue-tombstones": {
+        "task": "app.tasks.purge_issue_tombstones",
+        "schedule": 24 * 60 * 60,
+    },
+    "sweep-upload-blobs": {
+        "task": "app.tasks.sweep_upload_blobs",
+        "schedule": 60 * 60,
+    },
+} 
\ No newline at end of file
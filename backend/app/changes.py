@@ -0,0 +1,124 @@
+import heapq
+import os
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Optional
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from . import models
+
+# GET /issues/changes lets clients sync by delta. Every issue write takes the
+# next number from the "issues" change sequence and stamps it on the rows it
+# touches (change_seq); deletes leave a tombstone stamped the same way. The
+# sequence row is bumped inside the writing transaction, so on Postgres its row
+# lock orders writers and numbers become visible in commit order: a client
+# that has read up to N never later finds a commit numbered below N.
+ChangeSequence = models.ChangeSequence
+IssueTombstone = models.IssueTombstone
+
+ISSUES = "issues"
+# Highest change_seq of any purged tombstone; cursors before it may miss deletes
+TOMBSTONES_PURGED = "issue_tombstones_purged"
+
+ISSUE_TOMBSTONE_RETENTION_DAYS = float(os.getenv("ISSUE_TOMBSTONE_RETENTION_DAYS", "30"))
+
+
+class ChangesExpired(Exception):
+    """Raised when a cursor predates purged tombstones; the client must resync"""
+
+
+class ChangeBatch(NamedTuple):
+    changed: list
+    deleted: list[int]
+    position: tuple[int, int]
+    has_more: bool
+
+
+def _insert(dialect_name: str, table):
+    return (postgresql if dialect_name == "postgresql" else sqlite).insert(table)
+
+
+async def next_seq(db: AsyncSession) -> int:
+    """Take the next change number in the current transaction"""
+    stmt = (
+        _insert(db.bind.dialect.name, ChangeSequence)
+        .values(name=ISSUES, value=1)
+        .on_conflict_do_update(index_elements=[ChangeSequence.name], set_={"value": ChangeSequence.value + 1})
+        .returning(ChangeSequence.value)
+    )
+    return await db.scalar(stmt)
+
+
+async def add_tombstone(db: AsyncSession, issue: models.Issue, seq: int):
+    values = {"reporter_id": issue.reporter_id, "change_seq": seq, "deleted_at": datetime.now(timezone.utc)}
+    stmt = _insert(db.bind.dialect.name, IssueTombstone).values(issue_id=issue.id, **values)
+    # SQLite may reuse the id of a deleted issue, so one id can be deleted twice
+    await db.execute(stmt.on_conflict_do_update(index_elements=[IssueTombstone.issue_id], set_=values))
+
+
+async def get_changes(db: AsyncSession, after: tuple[int, int], limit: int, reporter_id: Optional[int] = None) -> ChangeBatch:
+    """Issues written and deleted after the (change_seq, id) position `after`, oldest first"""
+    # Read before the scans: every write numbered up to `issued` has committed
+    sequences = dict((await db.execute(
+        select(ChangeSequence.name, ChangeSequence.value).where(ChangeSequence.name.in_([ISSUES, TOMBSTONES_PURGED]))
+    )).all())
+    issued, purged = sequences.get(ISSUES, 0), sequences.get(TOMBSTONES_PURGED)
+    # A client starting from scratch knows no issues, so it cannot miss a delete
+    if purged and after != (0, 0) and after[0] < purged:
+        raise ChangesExpired(f"Changes before {purged} are no longer kept")
+
+    issues = (
+        select(models.Issue)
+        .where(tuple_(models.Issue.change_seq, models.Issue.id) > after)
+        .order_by(models.Issue.change_seq, models.Issue.id)
+        .limit(limit + 1)
+    )
+    tombstones = (
+        select(IssueTombstone.change_seq, IssueTombstone.issue_id)
+        .where(tuple_(IssueTombstone.change_seq, IssueTombstone.issue_id) > after)
+        .order_by(IssueTombstone.change_seq, IssueTombstone.issue_id)
+        .limit(limit + 1)
+    )
+    if reporter_id is not None:
+        issues = issues.where(models.Issue.reporter_id == reporter_id)
+        tombstones = tombstones.where(IssueTombstone.reporter_id == reporter_id)
+
+    entries = heapq.merge(
+        (((issue.change_seq, issue.id), issue) for issue in await db.scalars(issues)),
+        (((seq, issue_id), None) for seq, issue_id in await db.execute(tombstones)),
+        key=lambda entry: entry[0],
+    )
+    # Only the latest entry per issue is sent, so a batch applies in any order
+    latest = {}
+    position = after
+    has_more = False
+    for count, (key, issue) in enumerate(entries):
+        if count == limit:
+            has_more = True
+            break
+        latest[key[1]] = issue
+        position = key
+    if not has_more and position[0] < issued:
+        # Caught up: skip past writes this client cannot see, so its cursor
+        # stays ahead of tombstones purged later
+        position = (issued, 0)
+    return ChangeBatch(
+        changed=[issue for issue in latest.values() if issue is not None],
+        deleted=[issue_id for issue_id, issue in latest.items() if issue is None],
+        position=position,
+        has_more=has_more,
+    )
+
+
+def purge_tombstones(db: Session, now: Optional[datetime] = None) -> int:
+    """Drop tombstones older than the retention period, recording the horizon"""
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=ISSUE_TOMBSTONE_RETENTION_DAYS)
+    horizon = db.scalar(select(func.max(IssueTombstone.change_seq)).where(IssueTombstone.deleted_at < cutoff))
+    if horizon is None:
+        return 0
+    purged = db.execute(delete(IssueTombstone).where(IssueTombstone.change_seq <= horizon)).rowcount
+    stmt = _insert(db.bind.dialect.name, ChangeSequence).values(name=TOMBSTONES_PURGED, value=horizon)
+    db.execute(stmt.on_conflict_do_update(index_elements=[ChangeSequence.name], set_={"value": horizon}))
+    db.commit()
+    return purged
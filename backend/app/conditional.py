@@ -0,0 +1,53 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Union
+from fastapi import Request, Response
+
+# Conditional GET (RFC 9110 section 13) for API and file responses. Validators
+# are computed from cheap version data (an issue's change_seq, a blob's hash)
+# so a 304 is answered without loading or serializing the representation.
+
+# JSON responses may only be revalidated, never reused unchecked
+API_CACHE_CONTROL = "private, no-cache"
+
+
+def weak_etag(*parts) -> str:
+    """Weak ETag over version parts; weak because the JSON bytes may vary"""
+    digest = hashlib.sha1(repr(parts).encode(), usedforsecurity=False).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+
+def as_utc(value: Union[datetime, str]) -> datetime:
+    """SQLite hands back naive datetimes (or ISO strings from its date functions); they are stored as UTC"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def http_date(value: datetime) -> str:
+    return formatdate(as_utc(value).timestamp(), usegmt=True)
+
+
+def is_not_modified(request: Request, etag: str, mtime: Optional[float] = None) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since (RFC 9110 13.2.2)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, as GET requires
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and mtime is not None:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def not_modified_response(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
@@ -0,0 +1,90 @@
+from collections import Counter
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from . import models
+
+# issue_counters holds one row per (status, severity) with the number of issues
+# in that cell, so totals never need a scan of issues. crud keeps it current by
+# passing the deltas of every write to apply_deltas in the same transaction;
+# reconcile() recomputes it from issues to repair any drift.
+IssueCounter = models.IssueCounter
+
+
+def _insert(dialect_name: str):
+    return (postgresql if dialect_name == "postgresql" else sqlite).insert(IssueCounter)
+
+
+def _upserts(dialect_name: str, deltas: Counter):
+    # Sorted so concurrent writers lock counter rows in the same order
+    for (status, severity), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        stmt = _insert(dialect_name).values(status=status, severity=severity, count=delta)
+        yield stmt.on_conflict_do_update(
+            index_elements=[IssueCounter.status, IssueCounter.severity],
+            set_={"count": IssueCounter.count + delta},
+        )
+
+
+async def apply_deltas(db: AsyncSession, deltas: Counter):
+    """Add {(status, severity): delta} to the counters in the current transaction"""
+    for stmt in _upserts(db.bind.dialect.name, deltas):
+        await db.execute(stmt)
+
+
+def issue_deltas(issues, sign: int = 1) -> Counter:
+    """Counter deltas for adding (sign=1) or removing (sign=-1) issues"""
+    deltas = Counter()
+    for issue in issues:
+        deltas[(issue.status, issue.severity)] += sign
+    return deltas
+
+
+def counts_query():
+    return select(IssueCounter.status, IssueCounter.severity, IssueCounter.count).where(IssueCounter.count != 0)
+
+
+def summarize(rows) -> dict:
+    """Totals from (status, severity, count) rows, in the shape /health/detailed reports"""
+    by_status = Counter()
+    open_by_severity = Counter()
+    for status, severity, count in rows:
+        by_status[status] += count
+        if status != models.IssueStatus.DONE:
+            open_by_severity[severity] += count
+    return {
+        "total_issues": sum(by_status.values()),
+        "open_issues": sum(open_by_severity.values()),
+        "issues_by_status": {s.value: by_status[s] for s in models.IssueStatus},
+        "issues_by_severity": {s.value: open_by_severity[s] for s in models.IssueSeverity},
+    }
+
+
+async def get_summary(db: AsyncSession) -> dict:
+    return summarize((await db.execute(counts_query())).all())
+
+
+def reconcile(db: Session) -> Counter:
+    """Recompute the counters from issues and fix any drift; returns the corrections.
+
+    On Postgres the counters table is locked first: writers already holding
+    counter rows commit before the recount, and later writers apply their
+    deltas on top of the repaired values.
+    """
+    if db.bind.dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE issue_counters IN EXCLUSIVE MODE"))
+    actual = Counter({
+        (status, severity): count
+        for status, severity, count in db.execute(
+            select(models.Issue.status, models.Issue.severity, func.count(models.Issue.id))
+            .group_by(models.Issue.status, models.Issue.severity)
+        )
+    })
+    stored = Counter({(status, severity): count for status, severity, count in db.execute(counts_query())})
+    corrections = Counter({key: actual[key] - stored[key] for key in actual.keys() | stored.keys() if actual[key] != stored[key]})
+    for stmt in _upserts(db.bind.dialect.name, corrections):
+        db.execute(stmt)
+    db.commit()
+    return corrections
@@ -1,79 +1,320 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import case, func, insert, select, tuple_, update
+from collections import Counter
 from typing import Optional
-from . import models, schemas
-from passlib.context import CryptContext
+from datetime import datetime, timezone
+from . import changes, counters, dashboard, models, schemas, search, upload
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+from .passwords import hash_password
 from .logging import db_logger
 import time
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def get_password_hash(password: str):
-    return pwd_context.hash(password)
-
-def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
-
 # User CRUD
-def get_user(db: Session, user_id: int):
-    return db.query(models.User).filter(models.User.id == user_id).first()
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.scalar(select(models.User).where(models.User.id == user_id))
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(models.User).filter(models.User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await db.scalar(select(models.User).where(models.User.email == email))
 
-def create_user(db: Session, user: schemas.UserCreate):
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
     start_time = time.time()
     db_logger.info(f"Creating user: {user.email}")
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await hash_password(user.password)
     db_user = models.User(email=user.email, hashed_password=hashed_password, role=user.role)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     duration = time.time() - start_time
     db_logger.info(f"User created successfully: {db_user.id} in {duration:.3f}s")
     return db_user
 
+async def update_user_role(db: AsyncSession, user_id: int, role: models.UserRole):
+    db_user = await get_user(db, user_id)
+    if db_user:
+        db_user.role = role
+        db_user.token_version += 1
+        await db.commit()
+        await db.refresh(db_user)
+        db_logger.info(f"User {user_id} role changed to {role}")
+    return db_user
+
+async def set_password_hash(db: AsyncSession, db_user: models.User, hashed_password: str):
+    """Replace a stored hash for the same password, e.g. after a bcrypt cost change"""
+    db_user.hashed_password = hashed_password
+    await db.commit()
+    return db_user
+
 # Issue CRUD
-def get_issue(db: Session, issue_id: int):
-    return db.query(models.Issue).filter(models.Issue.id == issue_id).first()
+async def get_issue(db: AsyncSession, issue_id: int):
+    return await db.scalar(select(models.Issue).where(models.Issue.id == issue_id))
+
+async def get_issue_version(db: AsyncSession, issue_id: int):
+    """(reporter_id, change_seq, last modified) of an issue, without loading it"""
+    return (await db.execute(
+        select(
+            models.Issue.reporter_id,
+            models.Issue.change_seq,
+            func.coalesce(models.Issue.updated_at, models.Issue.created_at),
+        ).where(models.Issue.id == issue_id)
+    )).first()
 
-def get_issues(db: Session, skip: int = 0, limit: int = 100, user_id: Optional[int] = None):
-    query = db.query(models.Issue)
+# Sort keys for the issue list. Severity and status sort by their workflow
+# order rather than by name, which would differ between SQLite and Postgres.
+SEVERITY_RANK = {severity: rank for rank, severity in enumerate(models.IssueSeverity)}
+STATUS_RANK = {status: rank for rank, status in enumerate(models.IssueStatus)}
+
+ISSUE_SORT_KEYS = {
+    "created_at": models.Issue.created_at,
+    "updated_at": func.coalesce(models.Issue.updated_at, models.Issue.created_at),
+    "severity": case(SEVERITY_RANK, value=models.Issue.severity),
+    "status": case(STATUS_RANK, value=models.Issue.status),
+}
+
+def filter_issues(query, filters: schemas.IssueFilter):
+    """Apply list filters to a statement over issues"""
+    if filters.status:
+        query = query.where(models.Issue.status.in_(filters.status))
+    if filters.severity:
+        query = query.where(models.Issue.severity.in_(filters.severity))
+    if filters.reporter_id is not None:
+        query = query.where(models.Issue.reporter_id == filters.reporter_id)
+    if filters.created_from:
+        query = query.where(models.Issue.created_at >= filters.created_from)
+    if filters.created_to:
+        query = query.where(models.Issue.created_at < filters.created_to)
+    # Never-edited issues have no updated_at; like sort=updated_at, they count
+    # as last updated when created
+    if filters.updated_from:
+        query = query.where(ISSUE_SORT_KEYS["updated_at"] >= filters.updated_from)
+    if filters.updated_to:
+        query = query.where(ISSUE_SORT_KEYS["updated_at"] < filters.updated_to)
+    return query
+
+def issue_sort_value(issue: models.Issue, field: str):
+    """Python-side value of ISSUE_SORT_KEYS[field] for a loaded issue"""
+    if field == "updated_at":
+        return issue.updated_at or issue.created_at
+    if field == "severity":
+        return SEVERITY_RANK[issue.severity]
+    if field == "status":
+        return STATUS_RANK[issue.status]
+    return issue.created_at
+
+def cursor_sort_value(field: str, key):
+    """A decoded cursor key as a value comparable with ISSUE_SORT_KEYS[field]"""
+    try:
+        if field in ("created_at", "updated_at"):
+            return datetime.fromisoformat(key)
+        if isinstance(key, bool) or not isinstance(key, int):
+            raise TypeError(f"expected an int, got {type(key).__name__}")
+        return key
+    except (TypeError, ValueError) as e:
+        raise InvalidCursor(f"Invalid cursor key for sort '{field}': {key!r}") from e
+
+def issue_cursor(issue: models.Issue, sort: schemas.IssueSort = schemas.IssueSort.CREATED_AT_DESC):
+    """Cursor pointing just past `issue` in the given sort order"""
+    return encode_cursor(sort.value, issue_sort_value(issue, sort.value.lstrip("-")), issue.id)
+
+async def get_issues(db: AsyncSession, skip: int = 0, limit: int = 100, user_id: Optional[int] = None, cursor: Optional[str] = None,
+                     filters: Optional[schemas.IssueFilter] = None, sort: Optional[schemas.IssueSort] = None, columns: Optional[list] = None):
+    """A page of issues; with `columns`, rows of just those columns instead of Issue objects"""
+    query = select(*columns) if columns else select(models.Issue)
+    fetch = db.execute if columns else db.scalars
     if user_id:
-        query = query.filter(models.Issue.reporter_id == user_id)
-    return query.offset(skip).limit(limit).all()
+        query = query.where(models.Issue.reporter_id == user_id)
+    if filters:
+        query = filter_issues(query, filters)
+    if cursor is None and sort is None:
+        return (await fetch(query.offset(skip).limit(limit))).all()
+
+    sort = sort or schemas.IssueSort.CREATED_AT_DESC
+    field = sort.value.lstrip("-")
+    descending = sort.value.startswith("-")
+    sort_key = ISSUE_SORT_KEYS[field]
+    if descending:
+        query = query.order_by(sort_key.desc(), models.Issue.id.desc())
+    else:
+        query = query.order_by(sort_key.asc(), models.Issue.id.asc())
+    if cursor is None:
+        return (await fetch(query.offset(skip).limit(limit))).all()
 
-def create_issue(db: Session, issue: schemas.IssueCreate, reporter_id: int):
+    # Keyset mode, an empty cursor is the first page
+    if cursor:
+        key, issue_id = decode_cursor(cursor, sort.value)
+        key = cursor_sort_value(field, key)
+        position = tuple_(sort_key, models.Issue.id)
+        query = query.where(position < (key, issue_id) if descending else position > (key, issue_id))
+    return (await fetch(query.limit(limit))).all()
+
+async def create_issue(db: AsyncSession, issue: schemas.IssueCreate, reporter_id: int):
     start_time = time.time()
     db_logger.info(f"Creating issue: {issue.title} by reporter: {reporter_id}")
     issue_data = issue.dict()
     issue_data['reporter_id'] = reporter_id
+    issue_data['change_seq'] = await changes.next_seq(db)
     db_issue = models.Issue(**issue_data)
     db.add(db_issue)
-    db.commit()
-    db.refresh(db_issue)
+    await db.flush()
+    await search.index_issue(db, db_issue)
+    await counters.apply_deltas(db, counters.issue_deltas([db_issue]))
+    if db_issue.file_path:
+        await upload.attach_file(db, db_issue.file_path)
+    await db.commit()
+    await dashboard.invalidate()
+    await db.refresh(db_issue)
     duration = time.time() - start_time
     db_logger.info(f"Issue created successfully: {db_issue.id} in {duration:.3f}s")
     return db_issue
 
-def update_issue(db: Session, issue_id: int, issue: schemas.IssueUpdate):
+async def create_issues_bulk(db: AsyncSession, issues: list[schemas.IssueCreate], reporter_id: int) -> list[models.Issue]:
+    """Insert a batch of issues with one multi-row INSERT and one commit"""
+    start_time = time.time()
+    seq = await changes.next_seq(db)
+    rows = [{**issue.dict(), "reporter_id": reporter_id, "change_seq": seq} for issue in issues]
+    db_issues = list(await db.scalars(
+        insert(models.Issue).returning(models.Issue, sort_by_parameter_order=True), rows
+    ))
+    await search.index_issues(db, db_issues)
+    await counters.apply_deltas(db, counters.issue_deltas(db_issues))
+    for file_path, count in Counter(i.file_path for i in db_issues if i.file_path).items():
+        await upload.attach_file(db, file_path, count)
+    await db.commit()
+    await dashboard.invalidate()
+    duration = time.time() - start_time
+    db_logger.info(f"Bulk created {len(db_issues)} issues by reporter: {reporter_id} in {duration:.3f}s")
+    return db_issues
+
+async def update_issues_bulk(db: AsyncSession, items: list[schemas.IssueBulkUpdateItem]):
+    """Apply a batch of partial updates in one transaction.
+
+    Returns the updated issues by id (ids that do not exist are left out) and
+    the status transitions made, as {(from_status, to_status): count}.
+    """
+    start_time = time.time()
+    ids = [item.id for item in items]
+    db_issues = {i.id: i for i in await db.scalars(select(models.Issue).where(models.Issue.id.in_(ids)))}
+    seq = await changes.next_seq(db) if db_issues else None
+    transitions = Counter()
+    counter_deltas = Counter()
+    reindex = []
+    attached, released = Counter(), []
+    for item in items:
+        db_issue = db_issues.get(item.id)
+        if db_issue is None:
+            continue
+        update_data = item.dict(exclude_unset=True, exclude={"id"})
+        old_status, old_severity, old_file_path = db_issue.status, db_issue.severity, db_issue.file_path
+        for field, value in update_data.items():
+            setattr(db_issue, field, value)
+        db_issue.change_seq = seq
+        if db_issue.status != old_status:
+            transitions[(old_status, db_issue.status)] += 1
+        if (db_issue.status, db_issue.severity) != (old_status, old_severity):
+            counter_deltas[(old_status, old_severity)] -= 1
+            counter_deltas[(db_issue.status, db_issue.severity)] += 1
+        if "title" in update_data or "description" in update_data:
+            reindex.append(db_issue)
+        if db_issue.file_path != old_file_path:
+            if db_issue.file_path:
+                attached[db_issue.file_path] += 1
+            if old_file_path:
+                released.append(old_file_path)
+    # The unit of work groups rows updating the same columns into executemany
+    await db.flush()
+    await search.index_issues(db, reindex)
+    await counters.apply_deltas(db, counter_deltas)
+    for file_path, count in attached.items():
+        await upload.attach_file(db, file_path, count)
+    for file_path in released:
+        await upload.delete_upload_file(db, file_path)
+    await db.commit()
+    await dashboard.invalidate()
+    duration = time.time() - start_time
+    db_logger.info(f"Bulk updated {len(db_issues)} issues in {duration:.3f}s")
+    return db_issues, transitions
+
+async def transition_issues(db: AsyncSession, filters: schemas.IssueFilter, to_status: models.IssueStatus, dry_run: bool = False):
+    """Move all issues matching `filters` to `to_status` without loading them.
+
+    Runs one UPDATE ... WHERE per source status and severity so each rowcount
+    is an exact count for both the transition and the issue counters. Returns
+    {(from_status, to_status): count}; with dry_run the counts come from a
+    GROUP BY and nothing is written.
+    """
+    start_time = time.time()
+    from_statuses = [s for s in (filters.status or list(models.IssueStatus)) if s != to_status]
+    transitions = Counter()
+    if dry_run:
+        query = filter_issues(
+            select(models.Issue.status, func.count()).where(models.Issue.status.in_(from_statuses)).group_by(models.Issue.status),
+            filters,
+        )
+        for from_status, count in (await db.execute(query)).all():
+            transitions[(from_status, to_status)] = count
+        return transitions
+
+    now = datetime.now(timezone.utc)
+    seq = await changes.next_seq(db)
+    counter_deltas = Counter()
+    for from_status in from_statuses:
+        for severity in filters.severity or list(models.IssueSeverity):
+            stmt = filter_issues(update(models.Issue), filters).where(
+                models.Issue.status == from_status, models.Issue.severity == severity
+            )
+            result = await db.execute(
+                stmt.values(status=to_status, updated_at=now, change_seq=seq).execution_options(synchronize_session=False)
+            )
+            if result.rowcount:
+                transitions[(from_status, to_status)] += result.rowcount
+                counter_deltas[(from_status, severity)] -= result.rowcount
+                counter_deltas[(to_status, severity)] += result.rowcount
+    await counters.apply_deltas(db, counter_deltas)
+    await db.commit()
+    await dashboard.invalidate()
+    duration = time.time() - start_time
+    db_logger.info(f"Transitioned {sum(transitions.values())} issues to {to_status} in {duration:.3f}s")
+    return transitions
+
+async def update_issue(db: AsyncSession, issue_id: int, issue: schemas.IssueUpdate):
     start_time = time.time()
     db_logger.info(f"Updating issue: {issue_id}")
-    db_issue = get_issue(db, issue_id)
+    db_issue = await get_issue(db, issue_id)
     if db_issue:
         update_data = issue.dict(exclude_unset=True)
+        old_key = (db_issue.status, db_issue.severity)
+        old_file_path = db_issue.file_path
         for field, value in update_data.items():
             setattr(db_issue, field, value)
-        db.commit()
-        db.refresh(db_issue)
+        db_issue.change_seq = await changes.next_seq(db)
+        new_key = (db_issue.status, db_issue.severity)
+        if new_key != old_key:
+            await counters.apply_deltas(db, Counter({old_key: -1, new_key: 1}))
+        if "title" in update_data or "description" in update_data:
+            await db.flush()
+            await search.index_issue(db, db_issue)
+        if db_issue.file_path != old_file_path:
+            if db_issue.file_path:
+                await upload.attach_file(db, db_issue.file_path)
+            if old_file_path:
+                await upload.delete_upload_file(db, old_file_path)
+        await db.commit()
+        await dashboard.invalidate()
+        await db.refresh(db_issue)
         duration = time.time() - start_time
         db_logger.info(f"Issue updated successfully: {issue_id} in {duration:.3f}s")
     else:
         db_logger.warning(f"Issue not found for update: {issue_id}")
     return db_issue
 
-def delete_issue(db: Session, issue_id: int):
-    db_issue = get_issue(db, issue_id)
+async def delete_issue(db: AsyncSession, issue_id: int):
+    db_issue = await get_issue(db, issue_id)
     if db_issue:
-        db.delete(db_issue)
-        db.commit()
+        await db.delete(db_issue)
+        await changes.add_tombstone(db, db_issue, await changes.next_seq(db))
+        await search.remove_issue(db, issue_id)
+        await counters.apply_deltas(db, counters.issue_deltas([db_issue], sign=-1))
+        if db_issue.file_path:
+            await upload.delete_upload_file(db, db_issue.file_path)
+        await db.commit()
+        await dashboard.invalidate()
     return db_issue 
\ No newline at end of file
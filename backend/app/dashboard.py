@@ -0,0 +1,163 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+import redis.asyncio as aioredis
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import counters, models, schemas
+from .cache import TTLCache
+from .celery_app import CELERY_BROKER_URL
+from .logging import api_logger
+from .metrics import DASHBOARD_CACHE_LOOKUPS
+
+# GET /dashboard/summary is served from a per-process cache, optionally backed
+# by Redis (the Celery broker) so workers share one copy. Entries are keyed by
+# a version that crud bumps on every issue write, so a write invalidates every
+# tier at once; the TTL only bounds how stale counts from other sources get.
+DASHBOARD_CACHE_TTL_SECONDS = float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "30"))
+DASHBOARD_CACHE_REDIS = os.getenv("DASHBOARD_CACHE_REDIS", "false").lower() == "true"
+DASHBOARD_RECENT_CRITICALS = int(os.getenv("DASHBOARD_RECENT_CRITICALS", "5"))
+# How long another worker's recompute is waited for before computing anyway
+DASHBOARD_LOCK_SECONDS = float(os.getenv("DASHBOARD_LOCK_SECONDS", "5"))
+
+VERSION_KEY = "dashboard:version"
+
+summary_cache = TTLCache(maxsize=1024, ttl=DASHBOARD_CACHE_TTL_SECONDS)
+_local_version = 0
+_inflight: dict = {}
+_redis = None
+
+
+def get_redis():
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(CELERY_BROKER_URL)
+    return _redis
+
+
+async def current_version() -> str:
+    if DASHBOARD_CACHE_REDIS:
+        try:
+            return "r" + (await get_redis().get(VERSION_KEY) or b"0").decode()
+        except Exception as e:
+            api_logger.warning(f"Dashboard cache version unavailable from Redis: {str(e)}")
+    return str(_local_version)
+
+
+async def invalidate():
+    """Bump the cache version after an issue write; never fails the write"""
+    global _local_version
+    _local_version += 1
+    if DASHBOARD_CACHE_REDIS:
+        try:
+            await get_redis().incr(VERSION_KEY)
+        except Exception as e:
+            api_logger.warning(f"Dashboard cache invalidation failed in Redis: {str(e)}")
+
+
+async def reporter_counts(db: AsyncSession, reporter_id: int) -> dict:
+    """Totals over one reporter's issues, counted from issues (reporter_id leads an index)"""
+    rows = (await db.execute(
+        select(models.Issue.status, models.Issue.severity, func.count())
+        .where(models.Issue.reporter_id == reporter_id)
+        .group_by(models.Issue.status, models.Issue.severity)
+    )).all()
+    return counters.summarize(rows)
+
+
+async def compute_summary(db: AsyncSession, user: schemas.CurrentUser) -> schemas.DashboardSummary:
+    if user.role == models.UserRole.REPORTER:
+        counts = await reporter_counts(db, user.id)
+    else:
+        counts = await counters.get_summary(db)
+    query = (
+        select(models.Issue)
+        .where(
+            models.Issue.severity == models.IssueSeverity.CRITICAL,
+            models.Issue.status.in_([s for s in models.IssueStatus if s != models.IssueStatus.DONE]),
+        )
+        .order_by(models.Issue.created_at.desc(), models.Issue.id.desc())
+        .limit(DASHBOARD_RECENT_CRITICALS)
+    )
+    if user.role == models.UserRole.REPORTER:
+        query = query.where(models.Issue.reporter_id == user.id)
+    criticals = (await db.scalars(query)).all()
+    return schemas.DashboardSummary(
+        **counts,
+        recent_criticals=[schemas.Issue.model_validate(issue) for issue in criticals],
+        generated_at=datetime.now(timezone.utc),
+    )
+
+
+async def _redis_get(key: str):
+    raw = await get_redis().get(key)
+    return schemas.DashboardSummary.model_validate_json(raw) if raw else None
+
+
+async def _recompute(db: AsyncSession, user: schemas.CurrentUser, redis_key: str) -> schemas.DashboardSummary:
+    if not DASHBOARD_CACHE_REDIS:
+        return await compute_summary(db, user)
+    redis = get_redis()
+    lock_key = f"{redis_key}:lock"
+    try:
+        # Another worker is already computing this version: wait for its result
+        if not await redis.set(lock_key, b"1", nx=True, px=int(DASHBOARD_LOCK_SECONDS * 1000)):
+            for _ in range(int(DASHBOARD_LOCK_SECONDS / 0.05)):
+                await asyncio.sleep(0.05)
+                summary = await _redis_get(redis_key)
+                if summary is not None:
+                    DASHBOARD_CACHE_LOOKUPS.labels(result="coalesced").inc()
+                    return summary
+        summary = await compute_summary(db, user)
+        await redis.set(redis_key, summary.model_dump_json(), ex=max(1, int(DASHBOARD_CACHE_TTL_SECONDS)))
+        await redis.delete(lock_key)
+        return summary
+    except Exception as e:
+        api_logger.warning(f"Dashboard cache unavailable in Redis: {str(e)}")
+        return await compute_summary(db, user)
+
+
+async def get_summary(db: AsyncSession, user: schemas.CurrentUser) -> schemas.DashboardSummary:
+    """Cached dashboard summary; concurrent misses share a single recompute"""
+    # Reporters see counts and criticals over their own issues only, as in the issue list
+    scope = f"user:{user.id}" if user.role == models.UserRole.REPORTER else "all"
+    version = await current_version()
+    key = (version, scope)
+
+    summary = summary_cache.get(key)
+    if summary is not None:
+        DASHBOARD_CACHE_LOOKUPS.labels(result="hit").inc()
+        return summary
+    redis_key = f"dashboard:summary:{version}:{scope}"
+    if DASHBOARD_CACHE_REDIS:
+        try:
+            summary = await _redis_get(redis_key)
+        except Exception as e:
+            api_logger.warning(f"Dashboard cache unavailable in Redis: {str(e)}")
+        if summary is not None:
+            DASHBOARD_CACHE_LOOKUPS.labels(result="redis_hit").inc()
+            summary_cache.set(key, summary)
+            return summary
+
+    pending = _inflight.get(key)
+    if pending is not None:
+        DASHBOARD_CACHE_LOOKUPS.labels(result="coalesced").inc()
+        return await asyncio.shield(pending)
+
+    DASHBOARD_CACHE_LOOKUPS.labels(result="miss").inc()
+    pending = asyncio.get_running_loop().create_future()
+    _inflight[key] = pending
+    try:
+        summary = await _recompute(db, user, redis_key)
+        summary_cache.set(key, summary)
+        pending.set_result(summary)
+        return summary
+    except Exception as e:
+        pending.set_exception(e)
+        # Mark it retrieved so an unshared failure is not logged twice
+        pending.exception()
+        raise
+    finally:
+        if not pending.done():
+            pending.cancel()
+        _inflight.pop(key, None)
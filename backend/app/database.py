@@ -1,8 +1,129 @@
 import os
+import time
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from .sql_instrumentation import instrument as instrument_statements
+from .metrics import DB_POOL_CHECKED_OUT, DB_POOL_OVERFLOW, DB_POOL_SIZE, DB_POOL_TIMEOUTS, DB_POOL_WAIT_DURATION
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine) 
\ No newline at end of file
+# Connection pool settings, applied to both engines. Each uvicorn/Celery
+# process opens up to DB_POOL_SIZE + DB_MAX_OVERFLOW connections per engine.
+DB_POOL_SIZE_SETTING = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+
+def get_async_database_url(url: str) -> str:
+    """Swap the sync driver in a database URL for its asyncio counterpart"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    elif parsed.get_backend_name() == "postgresql":
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    return parsed.render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", get_async_database_url(DATABASE_URL))
+
+class InstrumentedPoolMixin:
+    """Record how long checkouts wait for a connection and how often they time out.
+
+    The database_pool_* gauges are set on every checkout and return rather
+    than read on scrape, so in multiprocess mode they reach the files that
+    /metrics sums over all workers.
+    """
+    engine_label = "sync"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts = getattr(self, "timeouts", 0) + 1
+            DB_POOL_TIMEOUTS.labels(engine=self.engine_label).inc()
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_seconds = getattr(self, "wait_seconds", 0.0) + waited
+            DB_POOL_WAIT_DURATION.labels(engine=self.engine_label).observe(waited)
+            self.update_gauges()
+
+    def _do_return_conn(self, record):
+        try:
+            super()._do_return_conn(record)
+        finally:
+            self.update_gauges()
+
+    def update_gauges(self):
+        DB_POOL_SIZE.labels(engine=self.engine_label).set(self.size())
+        DB_POOL_CHECKED_OUT.labels(engine=self.engine_label).set(self.checkedout())
+        DB_POOL_OVERFLOW.labels(engine=self.engine_label).set(max(self.overflow(), 0))
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    engine_label = "sync"
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    engine_label = "async"
+
+def engine_options(url: str, poolclass) -> dict:
+    """Keyword arguments for create_engine/create_async_engine"""
+    parsed = make_url(url)
+    options = {}
+    if parsed.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if parsed.database in (None, "", ":memory:"):
+            # In-memory databases use a single shared connection, not a queue pool
+            return options
+    options.update(
+        poolclass=poolclass,
+        pool_size=DB_POOL_SIZE_SETTING,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    return options
+
+# Sync engine, used for schema creation and by Celery tasks
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL, InstrumentedQueuePool))
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine, used by the API request handlers
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, InstrumentedAsyncQueuePool))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+POOLED_ENGINES = {"sync": engine, "async": async_engine.sync_engine}
+
+# Time every statement, log slow ones and track repeats per request
+for pooled_engine in POOLED_ENGINES.values():
+    instrument_statements(pooled_engine)
+
+def pool_status() -> dict:
+    """Point-in-time usage of each engine's connection pool"""
+    status = {}
+    for label, pooled_engine in POOLED_ENGINES.items():
+        pool = pooled_engine.pool
+        status[label] = {"pool": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            status[label].update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                overflow=max(pool.overflow(), 0),
+                max_overflow=DB_MAX_OVERFLOW,
+                timeouts=getattr(pool, "timeouts", 0),
+                wait_seconds_total=round(getattr(pool, "wait_seconds", 0.0), 6),
+            )
+    return status
+
+# Report each pool before its first checkout; unpooled engines report zeros
+for label, pooled_engine in POOLED_ENGINES.items():
+    if isinstance(pooled_engine.pool, InstrumentedPoolMixin):
+        pooled_engine.pool.update_gauges()
+    else:
+        for gauge in (DB_POOL_SIZE, DB_POOL_CHECKED_OUT, DB_POOL_OVERFLOW):
+            gauge.labels(engine=label).set(0)
@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+import redis
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+from . import counters
+from .cache import TTLCache
+from .celery_app import CELERY_BROKER_URL
+from .database import SessionLocal
+from .logging import db_logger
+from .metrics import register_scrape_collector
+
+# Gauges derived from the database are computed when /metrics is scraped
+# rather than pushed by whichever process last touched an issue. One query on
+# issue_counters (a row per status x severity) is cached for
+# DB_GAUGES_TTL_SECONDS; with DB_GAUGES_REDIS=true the result is shared through
+# Redis (the Celery broker), so every worker reports the same snapshot.
+DB_GAUGES_TTL_SECONDS = float(os.getenv("DB_GAUGES_TTL_SECONDS", "15"))
+DB_GAUGES_REDIS = os.getenv("DB_GAUGES_REDIS", "false").lower() == "true"
+
+REDIS_KEY = "metrics:issue_counts"
+
+
+def load_issue_counts() -> dict:
+    db = SessionLocal()
+    try:
+        return counters.summarize(db.execute(counters.counts_query()).all())
+    finally:
+        db.close()
+
+
+class IssueCountsCollector(Collector):
+    """open_issues_by_severity / open_issues_by_status from issue_counters"""
+
+    def __init__(self, load=load_issue_counts, ttl: float = DB_GAUGES_TTL_SECONDS, use_redis: bool = DB_GAUGES_REDIS):
+        self.load = load
+        self.ttl = ttl
+        self.use_redis = use_redis
+        self.cache = TTLCache(maxsize=1, ttl=ttl)
+        # Concurrent scrapes wait for one query instead of each running it
+        self._lock = threading.Lock()
+        self._last = None
+        self._redis = None
+
+    def _shared(self):
+        if self._redis is None:
+            self._redis = redis.Redis.from_url(CELERY_BROKER_URL, socket_timeout=1)
+        return self._redis
+
+    def _fetch(self) -> dict:
+        if not self.use_redis:
+            return self.load()
+        try:
+            raw = self._shared().get(REDIS_KEY)
+            if raw is not None:
+                return json.loads(raw)
+        except Exception as e:
+            db_logger.warning(f"Shared DB gauges unavailable from Redis: {str(e)}")
+            return self.load()
+        summary = self.load()
+        try:
+            # NX: the first worker's snapshot wins until it expires
+            self._shared().set(REDIS_KEY, json.dumps(summary), ex=max(1, round(self.ttl)), nx=True)
+        except Exception as e:
+            db_logger.warning(f"Could not share DB gauges through Redis: {str(e)}")
+        return summary
+
+    def summary(self):
+        summary = self.cache.get("summary")
+        if summary is not None:
+            return summary
+        with self._lock:
+            summary = self.cache.get("summary")
+            if summary is None:
+                try:
+                    summary = self._last = self._fetch()
+                    self.cache.set("summary", summary)
+                except Exception as e:
+                    # Keep the scrape working; report the last values seen, if any
+                    db_logger.error(f"Error computing DB gauges: {str(e)}")
+                    summary = self._last
+        return summary
+
+    def describe(self):
+        # Lets the registry check names without running the query
+        return [
+            GaugeMetricFamily("open_issues_by_severity", "Number of open issues by severity", labels=["severity"]),
+            GaugeMetricFamily("open_issues_by_status", "Number of issues by status", labels=["status"]),
+        ]
+
+    def collect(self):
+        summary = self.summary()
+        if summary is None:
+            return
+        by_severity, by_status = self.describe()
+        for severity, count in summary["issues_by_severity"].items():
+            by_severity.add_metric([severity], count)
+        for status, count in summary["issues_by_status"].items():
+            by_status.add_metric([status], count)
+        yield by_severity
+        yield by_status
+
+
+issue_counts = register_scrape_collector(IssueCountsCollector())
@@ -1,26 +1,61 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
-from . import crud, models
-from .database import SessionLocal
+import redis.asyncio as aioredis
+from . import crud, models, profiling, schemas
+from .cache import TTLCache
+from .celery_app import CELERY_BROKER_URL
+from .database import AsyncSessionLocal
+from .logging import auth_logger
+from .metrics import AUTH_TOKEN_CACHE_LOOKUPS
+import asyncio
+import contextlib
 import os
+import time
 from datetime import datetime, timedelta
 
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# EventSource cannot send an Authorization header, so GET /issues/stream takes
+# a short-lived ticket (POST /issues/stream/ticket) in the query string rather
+# than the access token, which would end up in access logs and browser history
+STREAM_TICKET_SECONDS = 60
+STREAM_TICKET_AUDIENCE = "stream"
+
+# Verified tokens are cached so repeat requests skip JWT decoding and the user
+# lookup. Revocations (role changes) take effect in this worker at once via
+# revoked_versions; with AUTH_REVOCATIONS_REDIS on they are published on a Redis
+# channel (the Celery broker) so every worker applies them. While a worker is
+# not subscribed it may miss some, so it stops trusting its cache until it is.
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_TOKENS = int(os.getenv("AUTH_CACHE_MAX_TOKENS", "10000"))
+AUTH_REVOCATIONS_REDIS = os.getenv("AUTH_REVOCATIONS_REDIS", "false").lower() == "true"
+REVOCATIONS_CHANNEL = "auth:revocations"
+
+token_cache = TTLCache(maxsize=AUTH_CACHE_MAX_TOKENS, ttl=AUTH_CACHE_TTL_SECONDS)
+
+def _forget_cached_user(user_id: int, min_version: int):
+    # A revocation pushed out by newer ones can no longer reject this user's
+    # cached tokens, so drop them; the next request checks the database
+    token_cache.discard_where(lambda current_user: current_user.id == user_id)
+
+# user id -> lowest token version still accepted. Entries only need to outlive
+# the tokens they reject.
+revoked_versions = TTLCache(maxsize=AUTH_CACHE_MAX_TOKENS, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60, on_evict=_forget_cached_user)
+_redis = None
+_listener: Optional[asyncio.Task] = None
+_revocations_live = False
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -32,12 +67,98 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def create_user_token(user: models.User, expires_delta: Optional[timedelta] = None):
+    """Access token carrying what request handlers need to know about the user"""
+    return create_access_token(
+        data={"sub": str(user.id), "email": user.email, "role": user.role.value, "ver": user.token_version},
+        expires_delta=expires_delta,
+    )
+
+def create_stream_ticket(current_user: schemas.CurrentUser) -> str:
+    """Token that only opens GET /issues/stream; bearer checks reject its audience"""
+    return create_access_token(
+        data={"sub": str(current_user.id), "ver": current_user.token_version, "aud": STREAM_TICKET_AUDIENCE},
+        expires_delta=timedelta(seconds=STREAM_TICKET_SECONDS),
+    )
+
+def credentials_error() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def get_redis():
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(CELERY_BROKER_URL)
+    return _redis
+
+def apply_revocation(user_id: int, min_version: int):
+    """Reject this user's tokens issued before `min_version` in this worker"""
+    revoked_versions.set(user_id, max(min_version, revoked_versions.get(user_id, 0)))
+
+async def revoke_user_tokens(user_id: int, min_version: int):
+    """Reject this user's tokens issued before `min_version`, starting now, in every worker"""
+    apply_revocation(user_id, min_version)
+    if AUTH_REVOCATIONS_REDIS:
+        try:
+            await get_redis().publish(REVOCATIONS_CHANNEL, f"{user_id} {min_version}")
+        except Exception as e:
+            auth_logger.error(f"Token revocation for user {user_id} not published to Redis: {str(e)}")
+
+async def _listen_revocations():
+    """Apply revocations published by other workers, reconnecting on errors"""
+    global _revocations_live
+    while True:
+        try:
+            pubsub = get_redis().pubsub()
+            await pubsub.subscribe(REVOCATIONS_CHANNEL)
+            try:
+                async for message in pubsub.listen():
+                    if message["type"] == "subscribe":
+                        # Revocations published before now may have been missed
+                        token_cache.clear()
+                        _revocations_live = True
+                    elif message["type"] == "message":
+                        user_id, min_version = message["data"].split()
+                        apply_revocation(int(user_id), int(min_version))
+            finally:
+                _revocations_live = False
+                await pubsub.aclose()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            auth_logger.warning(f"Token revocation listener lost Redis, bypassing the token cache: {str(e)}")
+            await asyncio.sleep(1)
+
+def ensure_revocation_listener():
+    global _listener
+    if AUTH_REVOCATIONS_REDIS and (_listener is None or _listener.done()):
+        _listener = asyncio.get_running_loop().create_task(_listen_revocations())
+
+def token_cache_trusted() -> bool:
+    """Cached tokens are only reused while no revocation can have been missed"""
+    if not AUTH_REVOCATIONS_REDIS:
+        return True
+    ensure_revocation_listener()
+    return _revocations_live
+
+async def verify_token(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    with profiling.phase("auth"):
+        return await _verify_token(token, db)
+
+async def _verify_token(token: str, db: AsyncSession):
+    credentials_exception = credentials_error()
+    current_user = token_cache.get(token) if token_cache_trusted() else None
+    if current_user is not None:
+        AUTH_TOKEN_CACHE_LOOKUPS.labels(result="hit").inc()
+        if current_user.token_version >= revoked_versions.get(current_user.id, 0):
+            return current_user
+        token_cache.pop(token)
+        raise credentials_exception
+    AUTH_TOKEN_CACHE_LOOKUPS.labels(result="miss").inc()
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
@@ -45,16 +166,65 @@ def verify_token(token: str = Depends(oauth2_scheme), db: Session = Depends(get_
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = crud.get_user(db, user_id=int(user_id))
-    if user is None:
+    user = await crud.get_user(db, user_id=int(user_id))
+    # Tokens minted before a role change or other user update are stale
+    if user is None or payload.get("ver", 0) != user.token_version:
         raise credentials_exception
-    return user
 
-def get_current_user(current_user: models.User = Depends(verify_token)):
+    current_user = schemas.CurrentUser(id=user.id, email=user.email, role=user.role, token_version=user.token_version)
+    token_cache.set(token, current_user, ttl=payload["exp"] - time.time() if "exp" in payload else None)
+    return current_user
+
+async def is_admin_token(token: str, session_dependency=get_db) -> bool:
+    """Whether a bearer token belongs to an admin, for gating before the route runs
+    (request profiling). Same checks as verify_token, so the database is only
+    consulted on a token cache miss; `session_dependency` stands in for get_db."""
+    try:
+        async with contextlib.asynccontextmanager(session_dependency)() as db:
+            current_user = await _verify_token(token, db)
+    except HTTPException:
+        return False
+    return current_user.role == models.UserRole.ADMIN
+
+async def get_current_user(current_user: schemas.CurrentUser = Depends(verify_token)):
     return current_user
 
+async def verify_stream_ticket(ticket: str, db: AsyncSession) -> schemas.CurrentUser:
+    """The user a ticket from create_stream_ticket was issued to, if still valid"""
+    try:
+        payload = jwt.decode(ticket, SECRET_KEY, algorithms=[ALGORITHM], audience=STREAM_TICKET_AUDIENCE)
+        user_id = int(payload["sub"])
+    except (JWTError, KeyError, ValueError):
+        raise credentials_error()
+    # Access tokens carry no audience, which decode lets through
+    if payload.get("aud") != STREAM_TICKET_AUDIENCE:
+        raise credentials_error()
+    user = await crud.get_user(db, user_id=user_id)
+    if user is None or payload.get("ver", 0) != user.token_version:
+        raise credentials_error()
+    return schemas.CurrentUser(id=user.id, email=user.email, role=user.role, token_version=user.token_version)
+
+async def get_stream_user(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    ticket: Optional[str] = None,
+    # Closed when the route returns, before the stream starts, so a
+    # long-lived stream does not hold a pooled connection
+    db: AsyncSession = Depends(get_db, scope="function"),
+):
+    """Like get_current_user, but also takes a stream ticket as `?ticket=`,
+    since browsers' EventSource cannot send an Authorization header"""
+    if token:
+        return await verify_token(token=token, db=db)
+    if ticket:
+        return await verify_stream_ticket(ticket, db)
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
 def require_role(required_role: models.UserRole):
-    def role_checker(current_user: models.User = Depends(get_current_user)):
+    async def role_checker(current_user: schemas.CurrentUser = Depends(get_current_user)):
         if current_user.role != required_role and current_user.role != models.UserRole.ADMIN:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -63,7 +233,7 @@ def require_role(required_role: models.UserRole):
         return current_user
     return role_checker
 
-def require_admin_or_maintainer(current_user: models.User = Depends(get_current_user)):
+async def require_admin_or_maintainer(current_user: schemas.CurrentUser = Depends(get_current_user)):
     if current_user.role not in [models.UserRole.ADMIN, models.UserRole.MAINTAINER]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,245 @@
+import asyncio
+import collections
+import json
+import os
+import threading
+from typing import NamedTuple, Optional
+import redis.asyncio as aioredis
+from . import models, schemas
+from .celery_app import CELERY_BROKER_URL
+from .logging import api_logger
+from .metrics import ISSUE_EVENTS_PUBLISHED, ISSUE_STREAM_CLIENTS, ISSUE_STREAM_RESYNCS
+
+# Issue changes are pushed to GET /issues/stream clients as server-sent events.
+# Each process fans events out to its own clients; with ISSUE_EVENTS_REDIS on,
+# events go through a Redis channel (the Celery broker) first so every uvicorn
+# worker feeds every client. Event ids are numbered in one
+# sequence (a Redis counter, or per process) so reconnecting clients can resume
+# from Last-Event-ID while the events they missed are still buffered.
+ISSUE_EVENTS_REDIS = os.getenv("ISSUE_EVENTS_REDIS", "false").lower() == "true"
+# Events buffered per client; a client that falls this far behind gets a resync
+ISSUE_STREAM_QUEUE_SIZE = int(os.getenv("ISSUE_STREAM_QUEUE_SIZE", "100"))
+# Recent events kept per process for Last-Event-ID resume
+ISSUE_STREAM_REPLAY_SIZE = int(os.getenv("ISSUE_STREAM_REPLAY_SIZE", "1000"))
+ISSUE_STREAM_KEEPALIVE_SECONDS = float(os.getenv("ISSUE_STREAM_KEEPALIVE_SECONDS", "15"))
+# Streams are closed after this long so clients reconnect, re-authenticating and
+# rebalancing across workers; Last-Event-ID makes the reconnect lossless.
+ISSUE_STREAM_MAX_SECONDS = float(os.getenv("ISSUE_STREAM_MAX_SECONDS", "300"))
+ISSUE_STREAM_RETRY_MS = int(os.getenv("ISSUE_STREAM_RETRY_MS", "3000"))
+
+CHANNEL = "issues:events"
+ID_KEY = "issues:events:id"
+
+# Numbering and publishing in one script keeps ids in channel order
+PUBLISH_SCRIPT = """
+local id = redis.call('INCR', KEYS[1])
+redis.call('PUBLISH', KEYS[2], id .. ' ' .. ARGV[1])
+return id
+"""
+
+RESYNC = "resync"
+
+
+class Event(NamedTuple):
+    id: int
+    type: str
+    # Serialized issue for created/updated, {"id", "reporter_id"} for deleted,
+    # None for resync
+    issue: Optional[dict]
+
+
+def visible_to(user: schemas.CurrentUser, event: Event) -> bool:
+    """Reporters only see events for their own issues; everyone gets resyncs"""
+    if event.issue is None or user.role != models.UserRole.REPORTER:
+        return True
+    return event.issue.get("reporter_id") == user.id
+
+
+def format_event(event: Event) -> str:
+    data = json.dumps(event.issue if event.issue is not None else {}, separators=(",", ":"))
+    return f"id: {event.id}\nevent: {event.type}\ndata: {data}\n\n"
+
+
+class Subscriber:
+    """One connected client: a bounded queue owned by the client's event loop"""
+
+    def __init__(self, user: schemas.CurrentUser, maxsize: int):
+        self.user = user
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def deliver(self, event: Event):
+        """Queue an event from any thread; never blocks the publisher"""
+        if not visible_to(self.user, event):
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self._offer(event)
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._offer, event)
+        except RuntimeError:
+            pass  # the client's loop has closed; it is unsubscribing
+
+    def _offer(self, event: Event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up: drop the backlog and tell the client to
+            # refetch, rather than buffer without bound or stall publishers
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(Event(event.id, RESYNC, None))
+            ISSUE_STREAM_RESYNCS.labels(reason="overflow").inc()
+
+
+class Broadcaster:
+    """Fans events out to this process's subscribers and buffers recent ones"""
+
+    def __init__(self, queue_size: int, replay_size: int):
+        self.queue_size = queue_size
+        self._subscribers: set = set()
+        self._recent: collections.deque = collections.deque(maxlen=replay_size)
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    def subscribe(self, user: schemas.CurrentUser) -> Subscriber:
+        subscriber = Subscriber(user, self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def dispatch(self, event_type: str, issue: Optional[dict] = None, event_id: Optional[int] = None) -> Event:
+        """Deliver an event, numbering it locally unless it carries a Redis id"""
+        with self._lock:
+            if event_id is None:
+                event_id = self._last_id + 1
+            self._last_id = max(self._last_id, event_id)
+            event = Event(event_id, event_type, issue)
+            self._recent.append(event)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.deliver(event)
+        return event
+
+    def replay(self, last_event_id: int, user: schemas.CurrentUser) -> Optional[list[Event]]:
+        """Buffered events after `last_event_id`, or None if some are no longer buffered"""
+        with self._lock:
+            recent = list(self._recent)
+            last_id = self._last_id
+        if last_event_id == last_id:
+            return []
+        if last_event_id > last_id or not recent or recent[0].id > last_event_id + 1:
+            return None
+        return [event for event in recent if event.id > last_event_id and visible_to(user, event)]
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+            self._last_id = 0
+
+
+broker = Broadcaster(queue_size=ISSUE_STREAM_QUEUE_SIZE, replay_size=ISSUE_STREAM_REPLAY_SIZE)
+_redis = None
+_listener: Optional[asyncio.Task] = None
+
+
+def get_redis():
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(CELERY_BROKER_URL)
+    return _redis
+
+
+def issue_payload(issue) -> dict:
+    if isinstance(issue, dict):
+        return issue
+    return schemas.Issue.model_validate(issue).model_dump(mode="json")
+
+
+async def publish(event_type: str, issue=None):
+    """Publish an issue change after its commit; never fails the write"""
+    payload = issue_payload(issue) if issue is not None else None
+    ISSUE_EVENTS_PUBLISHED.labels(type=event_type).inc()
+    if ISSUE_EVENTS_REDIS:
+        try:
+            await get_redis().eval(PUBLISH_SCRIPT, 2, ID_KEY, CHANNEL, json.dumps({"type": event_type, "issue": payload}))
+            return
+        except Exception as e:
+            api_logger.warning(f"Issue event not published to Redis, delivering locally: {str(e)}")
+    broker.dispatch(event_type, payload)
+
+
+async def _listen():
+    """Relay the Redis channel to this process's subscribers, reconnecting on errors"""
+    while True:
+        try:
+            pubsub = get_redis().pubsub()
+            await pubsub.subscribe(CHANNEL)
+            try:
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    event_id, body = message["data"].split(b" ", 1)
+                    data = json.loads(body)
+                    broker.dispatch(data["type"], data["issue"], int(event_id))
+            finally:
+                await pubsub.aclose()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            api_logger.warning(f"Issue event listener lost Redis, resyncing clients: {str(e)}")
+            # Anything published while disconnected is lost to this process
+            broker.dispatch(RESYNC, event_id=broker.last_id)
+            await asyncio.sleep(1)
+
+
+def ensure_listener():
+    global _listener
+    if ISSUE_EVENTS_REDIS and (_listener is None or _listener.done()):
+        _listener = asyncio.get_running_loop().create_task(_listen())
+
+
+async def stream(user: schemas.CurrentUser, last_event_id: Optional[int] = None):
+    """Server-sent event stream of the issue changes `user` may see"""
+    ensure_listener()
+    subscriber = broker.subscribe(user)
+    ISSUE_STREAM_CLIENTS.inc()
+    try:
+        yield f"retry: {ISSUE_STREAM_RETRY_MS}\n\n"
+        sent = last_event_id
+        if last_event_id is not None:
+            missed = broker.replay(last_event_id, user)
+            if missed is None:
+                ISSUE_STREAM_RESYNCS.labels(reason="gap").inc()
+                missed = [Event(broker.last_id, RESYNC, None)]
+            for event in missed:
+                sent = event.id
+                yield format_event(event)
+        # Subscribed before replaying, so events in both are skipped by id
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + ISSUE_STREAM_MAX_SECONDS
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), min(ISSUE_STREAM_KEEPALIVE_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if sent is not None and event.id <= sent and event.type != RESYNC:
+                continue
+            sent = event.id
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(subscriber)
+        ISSUE_STREAM_CLIENTS.dec()
@@ -1,10 +1,10 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import pool_status
 from .deps import get_db
 from .logging import api_logger
-from .metrics import OPEN_ISSUES_BY_SEVERITY, OPEN_ISSUES_BY_STATUS
-from . import models
-from sqlalchemy import func, text
+from . import counters, models
+from sqlalchemy import func, select, text
 
 router = APIRouter()
 
@@ -15,45 +15,29 @@ def health_check():
     return {"status": "ok", "service": "issues-tracker-api"}
 
 @router.get("/health/detailed")
-def detailed_health_check(db: Session = Depends(get_db)):
+async def detailed_health_check(db: AsyncSession = Depends(get_db)):
     """Detailed health check with database connectivity and metrics"""
     try:
         # Test database connection
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
         
         # Get basic metrics
-        total_users = db.query(func.count(models.User.id)).scalar()
-        total_issues = db.query(func.count(models.Issue.id)).scalar()
+        total_users = await db.scalar(select(func.count(models.User.id)))
         
-        # Get issues by severity
-        severity_counts = db.query(
-            models.Issue.severity,
-            func.count(models.Issue.id)
-        ).filter(models.Issue.status != 'DONE').group_by(models.Issue.severity).all()
-        
-        # Get issues by status
-        status_counts = db.query(
-            models.Issue.status,
-            func.count(models.Issue.id)
-        ).group_by(models.Issue.status).all()
-        
-        # Update Prometheus metrics
-        for severity, count in severity_counts:
-            OPEN_ISSUES_BY_SEVERITY.labels(severity=severity).set(count)
-        
-        for status, count in status_counts:
-            OPEN_ISSUES_BY_STATUS.labels(status=status).set(count)
+        # Issue totals come from the maintained counters, not a scan of issues
+        summary = await counters.get_summary(db)
         
         api_logger.info("Detailed health check completed successfully")
         
         return {
             "status": "healthy",
             "database": "connected",
+            "pool": pool_status(),
             "metrics": {
                 "total_users": total_users,
-                "total_issues": total_issues,
-                "issues_by_severity": dict(severity_counts),
-                "issues_by_status": dict(status_counts)
+                "total_issues": summary["total_issues"],
+                "issues_by_severity": summary["issues_by_severity"],
+                "issues_by_status": summary["issues_by_status"]
             }
         }
         
@@ -62,5 +46,6 @@ def detailed_health_check(db: Session = Depends(get_db)):
         return {
             "status": "unhealthy",
             "database": "disconnected",
+            "pool": pool_status(),
             "error": str(e)
         } 
\ No newline at end of file
@@ -1,47 +1,192 @@
-import sys
+import atexit
+import copy
+import contextvars
 import os
+import queue
+import re
+import sys
+import threading
+import uuid
 from loguru import logger
-from datetime import datetime
-
-# Remove default logger
-logger.remove()
-
-# Add structured JSON logging to stdout
-logger.add(
-    sys.stdout,
-    format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {name}:{function}:{line} | {message}",
-    level="INFO",
-    serialize=True,
-    backtrace=True,
-    diagnose=True
-)
-
-# Add file logging for errors
-logger.add(
-    "logs/error.log",
-    format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {name}:{function}:{line} | {message}",
-    level="ERROR",
-    rotation="10 MB",
-    retention="30 days",
-    serialize=True,
-    backtrace=True,
-    diagnose=True
-)
-
-# Add file logging for all levels
-logger.add(
-    "logs/app.log",
-    format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {name}:{function}:{line} | {message}",
-    level="DEBUG",
-    rotation="50 MB",
-    retention="7 days",
-    serialize=True
-)
-
-# Create logs directory if it doesn't exist
-os.makedirs("logs", exist_ok=True)
+
+LOG_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level} | {name}:{function}:{line} | {message}"
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
+# diagnose prints local variable values (tokens, passwords) into tracebacks
+LOG_DIAGNOSE = os.getenv("LOG_DIAGNOSE", "false" if ENVIRONMENT == "production" else "true").lower() == "true"
+# async: the request thread formats each message once and a writer thread does
+# the I/O. sync: every sink formats and writes in the logging thread.
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() == "true"
+# Messages waiting for the writer thread. When full, DEBUG/INFO messages are
+# dropped rather than stalling requests; WARNING and above wait for room, but
+# at most LOG_QUEUE_PUT_TIMEOUT seconds (usually on the event loop) before
+# they are dropped too.
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_QUEUE_PUT_TIMEOUT = float(os.getenv("LOG_QUEUE_PUT_TIMEOUT", "0.05"))
+# Fraction of DEBUG/INFO messages kept per bound logger name, e.g.
+# "api=0.1,database=0.05". WARNING and above are never sampled.
+LOG_SAMPLE_RATES = {
+    name.strip(): float(rate)
+    for name, rate in (item.split("=", 1) for item in os.getenv("LOG_SAMPLE_RATES", "").split(",") if "=" in item)
+}
+
+request_id_var: contextvars.ContextVar = contextvars.ContextVar("request_id", default=None)
+
+
+def add_request_id(record):
+    request_id = request_id_var.get()
+    if request_id is not None:
+        record["extra"]["request_id"] = request_id
+
+
+def sample_filter(sample_rates: dict):
+    """Handler filter keeping `rate` of each logger's DEBUG/INFO messages"""
+    def keep(record) -> bool:
+        rate = sample_rates.get(record["extra"].get("name"))
+        if rate is None or record["level"].no >= 30:
+            return True
+        # Decided from the record itself so every sink keeps or drops it alike
+        return (hash((record["time"], record["message"])) & 0xFFFF) < rate * 0x10000
+    return keep
+
+
+class QueueSink:
+    """Loguru sink that hands formatted messages to a background writer thread.
+
+    `writer` is a separate loguru logger holding the real sinks; each message
+    is re-emitted there raw at its original level, so per-sink level
+    thresholds, rotation and retention work as before.
+    """
+
+    def __init__(self, writer, maxsize: int, put_timeout: float = LOG_QUEUE_PUT_TIMEOUT):
+        self.writer = writer.opt(raw=True)
+        self.maxsize = maxsize
+        self.put_timeout = put_timeout
+        self.dropped = 0
+        self.start()
+
+    def start(self):
+        self.queue: queue.Queue = queue.Queue(self.maxsize)
+        self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def __call__(self, message):
+        item = (message.record["level"].name, str(message))
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            if message.record["level"].no < 30:
+                self.dropped += 1
+                return
+            try:
+                self.queue.put(item, timeout=self.put_timeout)
+            except queue.Full:
+                self.dropped += 1
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                self.writer.log(*item)
+            except Exception as e:
+                sys.stderr.write(f"Log writer failed: {e}\n")
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """Block until everything queued so far has been written"""
+        self.queue.join()
+
+    def stop(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+
+def _add_sinks(target, stdout, log_dir: str, **options):
+    # Add structured JSON logging to stdout
+    target.add(stdout, level="INFO", **options)
+    # Add file logging for errors
+    target.add(os.path.join(log_dir, "error.log"), level="ERROR", rotation="10 MB", retention="30 days", **options)
+    # Add file logging for all levels
+    target.add(os.path.join(log_dir, "app.log"), level="DEBUG", rotation="50 MB", retention="7 days", **options)
+
+
+queue_sink = None
+
+
+def configure_logging(async_mode: bool = LOG_ASYNC, sample_rates: dict = LOG_SAMPLE_RATES, diagnose: bool = LOG_DIAGNOSE,
+                      stdout=sys.stdout, log_dir: str = LOG_DIR, queue_size: int = LOG_QUEUE_SIZE):
+    """(Re)configure the global logger; called at import with settings from the environment"""
+    global queue_sink
+    logger.remove()
+    if queue_sink is not None:
+        queue_sink.stop()
+        queue_sink = None
+    os.makedirs(log_dir, exist_ok=True)
+    # A logger with its own handlers for the writer thread: copied while the
+    # global logger has none, so the two never share a sink
+    writer = copy.deepcopy(logger)
+    logger.configure(patcher=add_request_id)
+    message_options = dict(format=LOG_FORMAT, serialize=True, backtrace=True, diagnose=diagnose, filter=sample_filter(sample_rates))
+    if not async_mode:
+        _add_sinks(logger, stdout, log_dir, **message_options)
+        return
+
+    _add_sinks(writer, stdout, log_dir, format="{message}")
+    queue_sink = QueueSink(writer, queue_size)
+    logger.add(queue_sink, level="DEBUG", **message_options)
+
+
+def flush_logs():
+    if queue_sink is not None:
+        queue_sink.flush()
+
+
+def _restart_writer_after_fork():
+    # Threads do not survive fork (Celery prefork, gunicorn --preload)
+    if queue_sink is not None:
+        queue_sink.start()
+
+
+configure_logging()
+atexit.register(lambda: queue_sink and queue_sink.stop())
+os.register_at_fork(after_in_child=_restart_writer_after_fork)
 
 # Custom logger for API requests
 api_logger = logger.bind(name="api")
 db_logger = logger.bind(name="database")
-auth_logger = logger.bind(name="auth") 
\ No newline at end of file
+auth_logger = logger.bind(name="auth")
+
+
+REQUEST_ID_HEADER = "x-request-id"
+# Client-supplied ids are echoed into logs, so only accept plain tokens
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+class RequestIDMiddleware:
+    """Tag every log line of a request with its X-Request-ID, minting one if absent"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = dict(scope["headers"]).get(REQUEST_ID_HEADER.encode(), b"").decode("latin-1")
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (REQUEST_ID_HEADER.encode(), request_id.encode())]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
@@ -1,36 +1,74 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from . import crud, models, schemas, deps
-from .database import engine, SessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import changes, conditional, counters, crud, dashboard, db_metrics, events, models, profiling, sql_instrumentation, schemas, deps, passwords, search, serialization, stats, upload
+from .database import engine
 from .models import Base
-from .logging import api_logger, auth_logger
-from .metrics import get_metrics, update_issue_metrics, update_status_change_metrics, update_login_metrics
+from .logging import RequestIDMiddleware, api_logger, auth_logger
+from .metrics import MetricsMiddleware, get_metrics, update_issue_metrics, update_status_change_metrics, update_bulk_issue_metrics, update_bulk_status_change_metrics, update_login_metrics
 from .health import router as health_router
-from .upload import save_upload_file, delete_upload_file, get_file_path
+from .upload import UploadSizeLimitMiddleware, save_upload_file, serve_upload_file
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
 from fastapi import File, UploadFile
-from fastapi.responses import FileResponse
-import os
-from datetime import timedelta
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
 app = FastAPI(title="Issues & Insights Tracker")
 
+async def profiling_allowed(token: str) -> bool:
+    # Resolved per call so dependency overrides of get_db apply here too
+    return await deps.is_admin_token(token, app.dependency_overrides.get(deps.get_db, deps.get_db))
+
+if profiling.PROFILING_ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware, allow=profiling_allowed)
+app.add_middleware(sql_instrumentation.QueryTrackingMiddleware)
+app.add_middleware(UploadSizeLimitMiddleware)
+# Outside the upload limit so its 413s are counted too
+app.add_middleware(MetricsMiddleware)
+# Outermost, so every response and log line of a request carries its id
+app.add_middleware(RequestIDMiddleware)
+
 # Include routers
 app.include_router(health_router, tags=["health"])
 
+@app.exception_handler(passwords.PasswordHasherBusy)
+async def password_hasher_busy_handler(request, exc: passwords.PasswordHasherBusy):
+    auth_logger.warning(f"Password hashing queue full, rejecting {request.url.path}")
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Too many concurrent password checks, try again shortly"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 # Add metrics endpoint
 @app.get("/metrics")
 def metrics():
     return get_metrics()
 
+@app.get("/admin/profiles", response_model=list[schemas.ProfileSummary])
+async def list_profiles(current_user: schemas.CurrentUser = Depends(deps.require_role(models.UserRole.ADMIN))):
+    """Profiles stored by this worker via `X-Profile: store`, newest first"""
+    return [profile.summary() for profile in reversed(profiling.profiles)]
+
+@app.get("/admin/profiles/{profile_id}", response_model=schemas.ProfileDetail)
+async def read_profile(profile_id: str, current_user: schemas.CurrentUser = Depends(deps.require_role(models.UserRole.ADMIN))):
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return {**profile.summary(), "top_functions": profile.top_functions(), "stacks": profile.folded()}
+
 @app.post("/token", response_model=schemas.Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(deps.get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(deps.get_db)):
     auth_logger.info(f"Login attempt for user: {form_data.username}")
-    user = crud.get_user_by_email(db, email=form_data.username)
-    if not user or not crud.verify_password(form_data.password, user.hashed_password):
+    user = await crud.get_user_by_email(db, email=form_data.username)
+    valid, new_hash = await passwords.verify_password(form_data.password, user.hashed_password) if user else (False, None)
+    if not valid:
         auth_logger.warning(f"Failed login attempt for user: {form_data.username}")
         update_login_metrics(success=False)
         raise HTTPException(
@@ -38,54 +76,265 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        auth_logger.info(f"Rehashing password for user: {form_data.username}")
+        await crud.set_password_hash(db, user, new_hash)
     access_token_expires = timedelta(minutes=deps.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = deps.create_access_token(
-        data={"sub": str(user.id)}, expires_delta=access_token_expires
-    )
+    access_token = deps.create_user_token(user, expires_delta=access_token_expires)
     auth_logger.info(f"Successful login for user: {form_data.username}")
     update_login_metrics(success=True)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/users/", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(deps.get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(deps.get_db)):
+    db_user = await crud.get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db=db, user=user)
+    return await crud.create_user(db=db, user=user)
 
 @app.get("/users/me/", response_model=schemas.User)
-def read_users_me(current_user: models.User = Depends(deps.get_current_user)):
-    return current_user
+async def read_users_me(current_user: schemas.CurrentUser = Depends(deps.get_current_user), db: AsyncSession = Depends(deps.get_db)):
+    return await crud.get_user(db, user_id=current_user.id)
+
+@app.put("/users/{user_id}/role", response_model=schemas.User)
+async def update_user_role(user_id: int, role_update: schemas.UserRoleUpdate, current_user: schemas.CurrentUser = Depends(deps.require_role(models.UserRole.ADMIN)), db: AsyncSession = Depends(deps.get_db)):
+    auth_logger.info(f"Changing role of user {user_id} to {role_update.role} by user: {current_user.email}")
+    db_user = await crud.update_user_role(db, user_id=user_id, role=role_update.role)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    # Tokens carrying the old role stop working immediately
+    await deps.revoke_user_tokens(db_user.id, db_user.token_version)
+    return db_user
 
 @app.post("/issues/", response_model=schemas.Issue)
-def create_issue(issue: schemas.IssueCreate, current_user: models.User = Depends(deps.get_current_user), db: Session = Depends(deps.get_db)):
+async def create_issue(issue: schemas.IssueCreate, current_user: schemas.CurrentUser = Depends(deps.get_current_user), db: AsyncSession = Depends(deps.get_db)):
     api_logger.info(f"Creating issue: {issue.title} by user: {current_user.email}")
-    created_issue = crud.create_issue(db=db, issue=issue, reporter_id=current_user.id)
+    created_issue = await crud.create_issue(db=db, issue=issue, reporter_id=current_user.id)
     update_issue_metrics(severity=issue.severity, status=issue.status)
+    await events.publish("created", created_issue)
     api_logger.info(f"Issue created successfully: {created_issue.id}")
     return created_issue
 
+async def validate_bulk_items(model, items: list[dict], results: dict) -> list[tuple[int, BaseModel]]:
+    """Parse each raw bulk item, recording failures in `results` by index"""
+    valid = []
+    seen_ids = set()
+    for index, raw in enumerate(items):
+        try:
+            item = model.model_validate(raw)
+        except ValidationError as e:
+            results[index] = schemas.IssueBulkItemResult(index=index, status_code=422, detail=jsonable_encoder(e.errors(include_url=False, include_context=False)))
+            continue
+        item_id = getattr(item, "id", None)
+        if item_id is not None and item_id in seen_ids:
+            results[index] = schemas.IssueBulkItemResult(index=index, status_code=409, detail=f"Issue {item_id} appears more than once in the batch")
+            continue
+        if item.file_path and not await upload.attachment_exists(item.file_path):
+            results[index] = schemas.IssueBulkItemResult(index=index, status_code=400, detail=f"Unknown attachment: {item.file_path}")
+            continue
+        seen_ids.add(item_id)
+        valid.append((index, item))
+    return valid
+
+def bulk_result(results: dict) -> schemas.IssueBulkResult:
+    ordered = [results[index] for index in sorted(results)]
+    succeeded = sum(1 for r in ordered if r.status_code < 400)
+    return schemas.IssueBulkResult(succeeded=succeeded, failed=len(ordered) - succeeded, results=ordered)
+
+@app.post("/issues/bulk", response_model=schemas.IssueBulkResult)
+async def create_issues_bulk(payload: schemas.IssueBulkRequest, current_user: schemas.CurrentUser = Depends(deps.get_current_user), db: AsyncSession = Depends(deps.get_db)):
+    """Create many issues in one transaction, reporting the outcome per item"""
+    api_logger.info(f"Bulk creating {len(payload.items)} issues by user: {current_user.email}")
+    results = {}
+    valid = await validate_bulk_items(schemas.IssueCreate, payload.items, results)
+    if valid:
+        created = await crud.create_issues_bulk(db=db, issues=[item for _, item in valid], reporter_id=current_user.id)
+        for (index, _), db_issue in zip(valid, created):
+            results[index] = schemas.IssueBulkItemResult(index=index, status_code=201, issue=schemas.Issue.model_validate(db_issue))
+        update_bulk_issue_metrics(created)
+        for db_issue in created:
+            await events.publish("created", db_issue)
+    return bulk_result(results)
+
+@app.patch("/issues/bulk", response_model=schemas.IssueBulkResult)
+async def update_issues_bulk(payload: schemas.IssueBulkRequest, current_user: schemas.CurrentUser = Depends(deps.require_admin_or_maintainer), db: AsyncSession = Depends(deps.get_db)):
+    """Apply partial updates to many issues in one transaction, reporting the outcome per item"""
+    api_logger.info(f"Bulk updating {len(payload.items)} issues by user: {current_user.email}")
+    results = {}
+    valid = await validate_bulk_items(schemas.IssueBulkUpdateItem, payload.items, results)
+    if valid:
+        updated, transitions = await crud.update_issues_bulk(db=db, items=[item for _, item in valid])
+        for index, item in valid:
+            if item.id in updated:
+                results[index] = schemas.IssueBulkItemResult(index=index, status_code=200, issue=schemas.Issue.model_validate(updated[item.id]))
+            else:
+                results[index] = schemas.IssueBulkItemResult(index=index, status_code=404, detail="Issue not found")
+        update_bulk_status_change_metrics(transitions)
+        for db_issue in updated.values():
+            await events.publish("updated", db_issue)
+    return bulk_result(results)
+
+@app.post("/issues/transition", response_model=schemas.IssueStatusTransitionResult)
+async def transition_issues(transition: schemas.IssueStatusTransition, current_user: schemas.CurrentUser = Depends(deps.require_admin_or_maintainer), db: AsyncSession = Depends(deps.get_db)):
+    """Move every issue matching a filter to a new status in one set-based update"""
+    api_logger.info(f"Bulk transition to {transition.to_status} by user: {current_user.email} (dry_run={transition.dry_run})")
+    transitions = await crud.transition_issues(db, transition.filter, transition.to_status, dry_run=transition.dry_run)
+    if not transition.dry_run:
+        update_bulk_status_change_metrics(transitions)
+        if transitions:
+            # The set-based update never loads the rows, so clients refetch
+            await events.publish(events.RESYNC)
+    return schemas.IssueStatusTransitionResult(
+        affected=sum(transitions.values()),
+        dry_run=transition.dry_run,
+        transitions=[
+            schemas.IssueStatusTransitionCount(from_status=from_status, to_status=to_status, count=count)
+            for (from_status, to_status), count in sorted(transitions.items())
+        ],
+    )
+
+@app.post("/issues/stream/ticket", response_model=schemas.StreamTicket)
+async def create_stream_ticket(current_user: schemas.CurrentUser = Depends(deps.get_current_user)):
+    """Short-lived ticket for opening GET /issues/stream?ticket= from an EventSource"""
+    return schemas.StreamTicket(ticket=deps.create_stream_ticket(current_user), expires_in=deps.STREAM_TICKET_SECONDS)
+
+@app.get("/issues/stream")
+async def stream_issues(request: Request, current_user: schemas.CurrentUser = Depends(deps.get_stream_user)):
+    """Server-sent events for issue changes, resuming after the Last-Event-ID header"""
+    try:
+        last_event_id = int(request.headers["last-event-id"])
+    except (KeyError, ValueError):
+        last_event_id = None
+    return StreamingResponse(
+        events.stream(current_user, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/issues/changes", response_model=schemas.IssueChanges)
+async def read_issue_changes(since: Optional[str] = None, limit: int = Query(500, ge=1, le=1000), current_user: schemas.CurrentUser = Depends(deps.get_current_user), db: AsyncSession = Depends(deps.get_db)):
+    """Issues created, updated or deleted since a cursor from an earlier call; no cursor starts a full sync"""
+    user_id = current_user.id if current_user.role == models.UserRole.REPORTER else None
+    try:
+        after = decode_cursor(since, "changes") if since else (0, 0)
+        after = (int(after[0]), after[1])
+    except (InvalidCursor, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        batch = await changes.get_changes(db, after, limit, reporter_id=user_id)
+    except changes.ChangesExpired:
+        raise HTTPException(status_code=410, detail="Cursor has expired, sync again without `since`")
+    return schemas.IssueChanges(
+        changed=[schemas.Issue.model_validate(issue) for issue in batch.changed],
+        deleted=batch.deleted,
+        cursor=encode_cursor("changes", *batch.position),
+        has_more=batch.has_more,
+    )
+
 @app.get("/issues/", response_model=list[schemas.Issue])
-def read_issues(skip: int = 0, limit: int = 100, current_user: models.User = Depends(deps.get_current_user), db: Session = Depends(deps.get_db)):
-    if current_user.role == models.UserRole.REPORTER:
-        issues = crud.get_issues(db, skip=skip, limit=limit, user_id=current_user.id)
-    else:
-        issues = crud.get_issues(db, skip=skip, limit=limit)
-    return issues
+async def read_issues(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    status_filter: Optional[list[models.IssueStatus]] = Query(None, alias="status"),
+    severity: Optional[list[models.IssueSeverity]] = Query(None),
+    reporter_id: Optional[int] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    updated_from: Optional[datetime] = None,
+    updated_to: Optional[datetime] = None,
+    sort: Optional[schemas.IssueSort] = None,
+    current_user: schemas.CurrentUser = Depends(deps.get_current_user),
+    db: AsyncSession = Depends(deps.get_db),
+):
+    """List issues, paged by skip/limit or, when `cursor` is given, by keyset"""
+    user_id = current_user.id if current_user.role == models.UserRole.REPORTER else None
+    filters = schemas.IssueFilter(
+        status=status_filter, severity=severity, reporter_id=reporter_id,
+        created_from=created_from, created_to=created_to,
+        updated_from=updated_from, updated_to=updated_to,
+    )
+    try:
+        # change_seq rides along for the ETag; the serializer only reads ISSUE_FIELDS
+        issues = await crud.get_issues(db, skip=skip, limit=limit, user_id=user_id, cursor=cursor, filters=filters, sort=sort,
+                                       columns=[*serialization.ISSUE_COLUMNS, models.Issue.change_seq])
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # The response is a function of the parameters and the page's rows, and a
+    # row's content of its change_seq, so the page fingerprints itself. Any
+    # write that adds, removes or changes a row of this page changes the ETag
+    # at the cost of one bounded page query, never a scan of the selected set.
+    headers = {
+        "ETag": conditional.weak_etag("issues", user_id, str(request.query_params), [(row.id, row.change_seq) for row in issues]),
+        "Cache-Control": conditional.API_CACHE_CONTROL,
+    }
+    if issues:
+        headers["Last-Modified"] = conditional.http_date(max(row.updated_at or row.created_at for row in issues))
+    # Deletes do not move Last-Modified, so only the ETag can answer 304 here
+    if "if-none-match" in request.headers and conditional.is_not_modified(request, headers["ETag"]):
+        return conditional.not_modified_response(headers)
+    if cursor is not None and issues and len(issues) == limit:
+        headers["X-Next-Cursor"] = crud.issue_cursor(issues[-1], sort or schemas.IssueSort.CREATED_AT_DESC)
+    return serialization.issue_list_response(issues, headers)
+
+@app.get("/issues/search", response_model=list[schemas.IssueSearchResult])
+async def search_issues(response: Response, q: str = Query(..., min_length=1), limit: int = 20, cursor: Optional[str] = None, highlight: bool = True, current_user: schemas.CurrentUser = Depends(deps.get_current_user), db: AsyncSession = Depends(deps.get_db)):
+    """Full-text search over issue titles and descriptions, best match first"""
+    user_id = current_user.id if current_user.role == models.UserRole.REPORTER else None
+    after = None
+    try:
+        if cursor:
+            score, after_id = decode_cursor(cursor, "relevance")
+            after = (float(score), after_id)
+    except (InvalidCursor, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        hits = await search.search_issues(db, q, limit=limit, user_id=user_id, after=after, highlight=highlight)
+    except search.SearchUnsupported:
+        raise HTTPException(status_code=501, detail="Search is not available on this database")
+    if hits and len(hits) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor("relevance", hits[-1].score, hits[-1].issue.id)
+    return [
+        schemas.IssueSearchResult(
+            **schemas.Issue.model_validate(hit.issue).model_dump(),
+            rank=-hit.score,
+            title_highlight=hit.title_highlight,
+            snippet=hit.snippet,
+        )
+        for hit in hits
+    ]
+
+def issue_validators(issue_id: int, change_seq: int, last_modified: datetime) -> dict:
+    return {
+        "ETag": conditional.weak_etag("issue", issue_id, change_seq),
+        "Last-Modified": conditional.http_date(last_modified),
+        "Cache-Control": conditional.API_CACHE_CONTROL,
+    }
 
 @app.get("/issues/{issue_id}", response_model=schemas.Issue)
-def read_issue(issue_id: int, current_user: models.User = Depends(deps.get_current_user), db: Session = Depends(deps.get_db)):
-    db_issue = crud.get_issue(db, issue_id=issue_id)
+async def read_issue(issue_id: int, request: Request, response: Response, current_user: schemas.CurrentUser = Depends(deps.get_current_user), db: AsyncSession = Depends(deps.get_db)):
+    if conditional.is_conditional(request):
+        # Revalidation reads the version columns only
+        version = await crud.get_issue_version(db, issue_id)
+        if version is not None:
+            reporter_id, change_seq, last_modified = version
+            headers = issue_validators(issue_id, change_seq, last_modified)
+            allowed = current_user.role != models.UserRole.REPORTER or reporter_id == current_user.id
+            if allowed and conditional.is_not_modified(request, headers["ETag"], conditional.as_utc(last_modified).timestamp()):
+                return conditional.not_modified_response(headers)
+    db_issue = await crud.get_issue(db, issue_id=issue_id)
     if db_issue is None:
         raise HTTPException(status_code=404, detail="Issue not found")
     if current_user.role == models.UserRole.REPORTER and db_issue.reporter_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
+    response.headers.update(issue_validators(db_issue.id, db_issue.change_seq, db_issue.updated_at or db_issue.created_at))
     return db_issue
 
 @app.put("/issues/{issue_id}", response_model=schemas.Issue)
-def update_issue(issue_id: int, issue: schemas.IssueUpdate, current_user: models.User = Depends(deps.require_admin_or_maintainer), db: Session = Depends(deps.get_db)):
+async def update_issue(issue_id: int, issue: schemas.IssueUpdate, current_user: schemas.CurrentUser = Depends(deps.require_admin_or_maintainer), db: AsyncSession = Depends(deps.get_db)):
     api_logger.info(f"Updating issue {issue_id} by user: {current_user.email}")
-    db_issue = crud.get_issue(db, issue_id=issue_id)
+    db_issue = await crud.get_issue(db, issue_id=issue_id)
     if db_issue is None:
         api_logger.warning(f"Issue not found: {issue_id}")
         raise HTTPException(status_code=404, detail="Issue not found")
@@ -95,29 +344,59 @@ def update_issue(issue_id: int, issue: schemas.IssueUpdate, current_user: models
         api_logger.info(f"Issue {issue_id} status changed from {db_issue.status} to {issue.status}")
         update_status_change_metrics(from_status=db_issue.status, to_status=issue.status)
     
-    updated_issue = crud.update_issue(db=db, issue_id=issue_id, issue=issue)
+    updated_issue = await crud.update_issue(db=db, issue_id=issue_id, issue=issue)
+    await events.publish("updated", updated_issue)
     api_logger.info(f"Issue {issue_id} updated successfully")
     return updated_issue
 
 @app.delete("/issues/{issue_id}")
-def delete_issue(issue_id: int, current_user: models.User = Depends(deps.require_role(models.UserRole.ADMIN)), db: Session = Depends(deps.get_db)):
-    db_issue = crud.get_issue(db, issue_id=issue_id)
+async def delete_issue(issue_id: int, current_user: schemas.CurrentUser = Depends(deps.require_role(models.UserRole.ADMIN)), db: AsyncSession = Depends(deps.get_db)):
+    db_issue = await crud.get_issue(db, issue_id=issue_id)
     if db_issue is None:
         raise HTTPException(status_code=404, detail="Issue not found")
-    crud.delete_issue(db=db, issue_id=issue_id)
+    reporter_id = db_issue.reporter_id
+    await crud.delete_issue(db=db, issue_id=issue_id)
+    await events.publish("deleted", {"id": issue_id, "reporter_id": reporter_id})
     return {"ok": True}
 
+@app.get("/stats/issues", response_model=schemas.IssueCounts)
+async def issue_counts(current_user: schemas.CurrentUser = Depends(deps.get_current_user), db: AsyncSession = Depends(deps.get_db)):
+    """Issue totals by status and open issues by severity, read from issue_counters"""
+    return await counters.get_summary(db)
+
+@app.get("/dashboard/summary", response_model=schemas.DashboardSummary)
+async def dashboard_summary(current_user: schemas.CurrentUser = Depends(deps.get_current_user), db: AsyncSession = Depends(deps.get_db)):
+    """Totals, open issues by severity, issues by status and the newest open criticals"""
+    return await dashboard.get_summary(db, current_user)
+
+@app.get("/stats/timeseries", response_model=schemas.StatsTimeseries)
+async def stats_timeseries(
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    bucket: schemas.StatsBucket = schemas.StatsBucket.DAY,
+    status_filter: Optional[list[models.IssueStatus]] = Query(None, alias="status"),
+    current_user: schemas.CurrentUser = Depends(deps.get_current_user),
+    db: AsyncSession = Depends(deps.get_db),
+):
+    """Issue counts per status over time from the stats snapshots, one point per bucket"""
+    end = conditional.as_utc(end) if end else datetime.now(timezone.utc)
+    start = conditional.as_utc(start) if start else end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    try:
+        series = await stats.get_timeseries(db, start, end, bucket.value, status_filter)
+    except stats.TooManyPoints as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"start": start, "end": end, "bucket": bucket, "series": series}
+
 @app.post("/upload/")
-async def upload_file(file: UploadFile = File(...), current_user: models.User = Depends(deps.get_current_user)):
+async def upload_file(file: UploadFile = File(...), current_user: schemas.CurrentUser = Depends(deps.get_current_user)):
     """Upload a file for an issue"""
     api_logger.info(f"File upload requested by user: {current_user.email}")
     filename = await save_upload_file(file)
     return {"filename": filename, "message": "File uploaded successfully"}
 
 @app.get("/files/{filename}")
-async def get_file(filename: str):
+async def get_file(request: Request, filename: str, current_user: schemas.CurrentUser = Depends(deps.get_current_user)):
     """Get uploaded file"""
-    file_path = get_file_path(filename)
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(file_path) 
\ No newline at end of file
+    return await serve_upload_file(request, filename) 
\ No newline at end of file
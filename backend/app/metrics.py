@@ -1,8 +1,22 @@
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Histogram, Gauge, CollectorRegistry, REGISTRY, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+from starlette.routing import Match
 from fastapi import Response
+import atexit
+import collections
+import os
 import time
 
-# Request metrics
+# Multiprocess mode: with several workers each process writes its samples to
+# files in this directory and /metrics aggregates all of them. Must be set
+# before prometheus_client is imported and emptied before the server starts.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Latency buckets for http_request_duration_seconds, e.g. "0.01,0.05,0.1,0.5,1"
+HTTP_REQUEST_DURATION_BUCKETS = tuple(
+    float(bucket) for bucket in os.getenv("HTTP_REQUEST_DURATION_BUCKETS", "").split(",") if bucket.strip()
+) or Histogram.DEFAULT_BUCKETS
+
+# Request metrics, labelled by route template ("/issues/{issue_id}")
 REQUEST_COUNT = Counter(
     'http_requests_total',
     'Total number of HTTP requests',
@@ -12,7 +26,15 @@ REQUEST_COUNT = Counter(
 REQUEST_DURATION = Histogram(
     'http_request_duration_seconds',
     'HTTP request duration in seconds',
-    ['method', 'endpoint']
+    ['method', 'endpoint'],
+    buckets=HTTP_REQUEST_DURATION_BUCKETS
+)
+
+REQUESTS_IN_PROGRESS = Gauge(
+    'http_requests_in_progress',
+    'HTTP requests currently being served',
+    ['method'],
+    multiprocess_mode='livesum'
 )
 
 # Issue metrics
@@ -35,81 +57,210 @@ USER_LOGIN_ATTEMPTS = Counter(
     ['success']
 )
 
-# Database metrics
+AUTH_TOKEN_CACHE_LOOKUPS = Counter(
+    'auth_token_cache_lookups_total',
+    'Access token verifications served from (hit) or missing (miss) the token cache',
+    ['result']
+)
+
+DASHBOARD_CACHE_LOOKUPS = Counter(
+    'dashboard_cache_lookups_total',
+    'Dashboard summary requests by outcome: hit, redis_hit, coalesced (waited on a recompute) or miss',
+    ['result']
+)
+
+# Issue event stream metrics
+ISSUE_STREAM_CLIENTS = Gauge(
+    'issue_stream_clients',
+    'Clients connected to GET /issues/stream',
+    multiprocess_mode='livesum'
+)
+
+ISSUE_EVENTS_PUBLISHED = Counter(
+    'issue_events_published_total',
+    'Issue change events published to stream clients',
+    ['type']
+)
+
+ISSUE_STREAM_RESYNCS = Counter(
+    'issue_stream_resyncs_total',
+    'Resync events sent instead of missed changes: overflow (client too slow) or gap (resume point no longer buffered)',
+    ['reason']
+)
+
+# Password hashing metrics
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    'password_hash_queue_depth',
+    'Password hash jobs queued or running',
+    multiprocess_mode='livesum'
+)
+
+PASSWORD_HASH_DURATION = Histogram(
+    'password_hash_duration_seconds',
+    'Time from submitting a password hash job to its result, including queueing',
+    ['operation'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
+PASSWORD_HASH_REJECTED = Counter(
+    'password_hash_rejected_total',
+    'Password hash jobs refused because the queue was full',
+    ['operation']
+)
+
+# Database metrics, observed for every statement (see sql_instrumentation)
 DB_OPERATION_DURATION = Histogram(
     'database_operation_duration_seconds',
     'Database operation duration in seconds',
+    ['operation', 'table'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+
+DB_SLOW_QUERIES = Counter(
+    'database_slow_queries_total',
+    'Statements slower than SQL_SLOW_QUERY_MS',
     ['operation', 'table']
 )
 
+DB_N_PLUS_ONE = Counter(
+    'database_n_plus_one_total',
+    'Requests that ran the same SELECT more than SQL_N_PLUS_ONE_THRESHOLD times',
+    ['endpoint', 'table']
+)
+
+# Connection pool metrics, labelled by engine ("sync" or "async")
+DB_POOL_SIZE = Gauge(
+    'database_pool_size',
+    'Configured number of pooled database connections',
+    ['engine'],
+    multiprocess_mode='livesum'
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    'database_pool_checked_out_connections',
+    'Database connections currently checked out of the pool',
+    ['engine'],
+    multiprocess_mode='livesum'
+)
+
+DB_POOL_OVERFLOW = Gauge(
+    'database_pool_overflow_connections',
+    'Database connections currently open beyond the pool size',
+    ['engine'],
+    multiprocess_mode='livesum'
+)
+
+DB_POOL_WAIT_DURATION = Histogram(
+    'database_pool_checkout_wait_seconds',
+    'Time spent waiting to check a connection out of the pool',
+    ['engine'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+DB_POOL_TIMEOUTS = Counter(
+    'database_pool_checkout_timeouts_total',
+    'Number of pool checkouts that gave up after pool_timeout',
+    ['engine']
+)
+
 # Active users gauge
 ACTIVE_USERS = Gauge(
     'active_users_current',
-    'Current number of active users'
+    'Current number of active users',
+    multiprocess_mode='sum'
 )
 
-# Open issues by severity gauge
-OPEN_ISSUES_BY_SEVERITY = Gauge(
-    'open_issues_by_severity',
-    'Number of open issues by severity',
-    ['severity']
-)
+# Collectors computed at scrape time (e.g. db_metrics); they are not written to
+# the multiprocess files, so they are added to the aggregating registry as well
+_scrape_collectors = []
 
-# Open issues by status gauge
-OPEN_ISSUES_BY_STATUS = Gauge(
-    'open_issues_by_status',
-    'Number of open issues by status',
-    ['status']
-)
+def register_scrape_collector(collector):
+    REGISTRY.register(collector)
+    _scrape_collectors.append(collector)
+    return collector
 
 def get_metrics():
-    """Return Prometheus metrics"""
-    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    """Return Prometheus metrics, for every worker in multiprocess mode"""
+    registry = REGISTRY
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        for collector in _scrape_collectors:
+            registry.register(collector)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+if PROMETHEUS_MULTIPROC_DIR:
+    # Drop this process's livesum gauges (in-flight requests, pool) on exit
+    atexit.register(lambda: multiprocess.mark_process_dead(os.getpid(), PROMETHEUS_MULTIPROC_DIR))
+
+# Requests that matched no route (404s) share one label instead of one per URL
+UNMATCHED_ENDPOINT = "unmatched"
+
+def route_template(scope) -> str:
+    """Path template of the route that handled the request"""
+    route = scope.get("route")
+    if route is None and "app" in scope:
+        # Answered before routing (e.g. a 413 from UploadSizeLimitMiddleware)
+        for candidate in scope["app"].routes:
+            if candidate.matches(scope)[0] == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", UNMATCHED_ENDPOINT)
 
 class MetricsMiddleware:
-    """Middleware to collect request metrics"""
-    
+    """Count and time requests by method, route template and real status code"""
+
     def __init__(self, app):
         self.app = app
-    
+
     async def __call__(self, scope, receive, send):
         if scope["type"] != "http":
             await self.app(scope, receive, send)
             return
-        
+
         method = scope["method"]
-        path = scope["path"]
-        
-        # Start timing
-        start_time = time.time()
-        
-        # Track request
-        REQUEST_COUNT.labels(method=method, endpoint=path, status="pending").inc()
-        
-        # Process request
+        status = "500"  # if the app raises before starting a response
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method=method)
+        in_progress.inc()
+        start_time = time.perf_counter()
         try:
-            await self.app(scope, receive, send)
-            status = "200"  # Default success status
-        except Exception as e:
-            status = "500"
-            raise e
+            await self.app(scope, receive, send_with_status)
         finally:
-            # Record metrics
-            duration = time.time() - start_time
-            REQUEST_DURATION.labels(method=method, endpoint=path).observe(duration)
-            REQUEST_COUNT.labels(method=method, endpoint=path, status=status).inc()
+            duration = time.perf_counter() - start_time
+            in_progress.dec()
+            # The router records the matched route in the scope on the way in
+            endpoint = route_template(scope)
+            REQUEST_DURATION.labels(method=method, endpoint=endpoint).observe(duration)
+            REQUEST_COUNT.labels(method=method, endpoint=endpoint, status=status).inc()
 
-def update_issue_metrics(severity, status):
+def label(value):
+    """Label value for enums and plain values alike ("LOW", not "IssueSeverity.LOW")"""
+    return getattr(value, "value", value)
+
+def update_issue_metrics(severity, status, count=1):
     """Update issue-related metrics"""
-    ISSUE_CREATED.labels(severity=severity, status=status).inc()
-    OPEN_ISSUES_BY_SEVERITY.labels(severity=severity).inc()
-    OPEN_ISSUES_BY_STATUS.labels(status=status).inc()
+    ISSUE_CREATED.labels(severity=label(severity), status=label(status)).inc(count)
 
-def update_status_change_metrics(from_status, to_status):
+def update_status_change_metrics(from_status, to_status, count=1):
     """Update status change metrics"""
-    ISSUE_STATUS_CHANGED.labels(from_status=from_status, to_status=to_status).inc()
-    OPEN_ISSUES_BY_STATUS.labels(status=from_status).dec()
-    OPEN_ISSUES_BY_STATUS.labels(status=to_status).inc()
+    ISSUE_STATUS_CHANGED.labels(from_status=label(from_status), to_status=label(to_status)).inc(count)
+
+def update_bulk_issue_metrics(issues):
+    """Update issue-related metrics once for a batch of created issues"""
+    for (severity, status), count in collections.Counter((i.severity, i.status) for i in issues).items():
+        update_issue_metrics(severity, status, count)
+
+def update_bulk_status_change_metrics(transitions):
+    """Update status change metrics from {(from_status, to_status): count}"""
+    for (from_status, to_status), count in transitions.items():
+        update_status_change_metrics(from_status, to_status, count)
 
 def update_login_metrics(success):
     """Update login attempt metrics"""
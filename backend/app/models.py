@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Enum, ForeignKey, DateTime, Text
+from sqlalchemy import BigInteger, Column, Integer, String, Enum, ForeignKey, DateTime, Text, Index
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
+from datetime import datetime, timezone
 import enum
 
 Base = declarative_base()
@@ -29,6 +30,8 @@ class User(Base):
     hashed_password = Column(String, nullable=True)
     google_id = Column(String, nullable=True)
     role = Column(Enum(UserRole), default=UserRole.REPORTER, nullable=False)
+    # Bumped on every change that must invalidate previously issued tokens
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
     issues = relationship("Issue", back_populates="reporter")
 
 class Issue(Base):
@@ -40,13 +43,67 @@ class Issue(Base):
     severity = Column(Enum(IssueSeverity), nullable=False)
     status = Column(Enum(IssueStatus), default=IssueStatus.OPEN, nullable=False)
     reporter_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Set client-side as well so keyset cursors compare against values stored
+    # in the same format (SQLite keeps CURRENT_TIMESTAMP without microseconds)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=lambda: datetime.now(timezone.utc))
+    # Position in the change feed (GET /issues/changes), set on every write
+    change_seq = Column(BigInteger, default=0, server_default="0", nullable=False)
     reporter = relationship("User", back_populates="issues")
 
+    __table_args__ = (
+        # Keyset pagination on GET /issues/, newest first
+        Index("ix_issues_created_at_id", "created_at", "id"),
+        Index("ix_issues_reporter_id_created_at_id", "reporter_id", "created_at", "id"),
+        # Triage filters on GET /issues/
+        Index("ix_issues_status_severity_created_at", "status", "severity", "created_at"),
+        # Change feed scans
+        Index("ix_issues_change_seq_id", "change_seq", "id"),
+        Index("ix_issues_reporter_id_change_seq_id", "reporter_id", "change_seq", "id"),
+    )
+
+class IssueTombstone(Base):
+    """Marks a deleted issue so the change feed can report the delete"""
+    __tablename__ = "issue_tombstones"
+    issue_id = Column(Integer, primary_key=True)
+    reporter_id = Column(Integer, nullable=False)
+    change_seq = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_issue_tombstones_change_seq_issue_id", "change_seq", "issue_id"),
+        Index("ix_issue_tombstones_reporter_id_change_seq_issue_id", "reporter_id", "change_seq", "issue_id"),
+    )
+
+class ChangeSequence(Base):
+    """Named monotonic counters; see app/changes.py"""
+    __tablename__ = "change_sequences"
+    name = Column(String, primary_key=True)
+    value = Column(BigInteger, default=0, server_default="0", nullable=False)
+
+class IssueCounter(Base):
+    """Number of issues per (status, severity), maintained alongside issue writes"""
+    __tablename__ = "issue_counters"
+    status = Column(Enum(IssueStatus), primary_key=True)
+    severity = Column(Enum(IssueSeverity), primary_key=True)
+    count = Column(Integer, default=0, server_default="0", nullable=False)
+
+class FileBlob(Base):
+    """One stored attachment body, shared by every issue that references it"""
+    __tablename__ = "file_blobs"
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, default=0, server_default="0", nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class DailyStats(Base):
     __tablename__ = "daily_stats"
     id = Column(Integer, primary_key=True, index=True)
     date = Column(DateTime(timezone=True), nullable=False)
     status = Column(Enum(IssueStatus), nullable=False)
-    count = Column(Integer, nullable=False) 
\ No newline at end of file
+    count = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        # Range scans for GET /stats/timeseries
+        Index("ix_daily_stats_date_status", "date", "status"),
+    ) 
\ No newline at end of file
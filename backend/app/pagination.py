@@ -0,0 +1,29 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue"""
+
+
+def encode_cursor(sort: str, key: Any, issue_id: int) -> str:
+    """Encode a (sort key, id) keyset position as an opaque cursor"""
+    if isinstance(key, datetime):
+        key = key.isoformat()
+    payload = json.dumps([sort, key, issue_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple[Any, int]:
+    """Decode a cursor produced by encode_cursor for the same sort order"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, key, issue_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        issue_id = int(issue_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+    if cursor_sort != sort:
+        raise InvalidCursor(f"Cursor was issued for sort '{cursor_sort}', not '{sort}'")
+    return key, issue_id
@@ -0,0 +1,72 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from passlib.context import CryptContext
+from .metrics import PASSWORD_HASH_DURATION, PASSWORD_HASH_QUEUE_DEPTH, PASSWORD_HASH_REJECTED
+
+# bcrypt work factor. Hashes made with any other cost are upgraded on the
+# next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# bcrypt releases the GIL, so a small dedicated thread pool is enough to keep
+# hashing off the event loop and Starlette's shared threadpool. Jobs beyond
+# PASSWORD_HASH_QUEUE_LIMIT (queued + running) are refused straight away.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_lock = threading.Lock()
+_pending = 0
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full"""
+
+    def __init__(self, retry_after: int = PASSWORD_HASH_RETRY_AFTER):
+        super().__init__("Password hashing queue is full")
+        self.retry_after = retry_after
+
+
+async def _submit(operation: str, fn, *args):
+    global _pending
+    with _lock:
+        if _pending >= PASSWORD_HASH_QUEUE_LIMIT:
+            PASSWORD_HASH_REJECTED.labels(operation=operation).inc()
+            raise PasswordHasherBusy()
+        _pending += 1
+        PASSWORD_HASH_QUEUE_DEPTH.set(_pending)
+    started = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        PASSWORD_HASH_DURATION.labels(operation=operation).observe(time.perf_counter() - started)
+        with _lock:
+            _pending -= 1
+            PASSWORD_HASH_QUEUE_DEPTH.set(_pending)
+
+
+async def hash_password(password: str) -> str:
+    return await _submit("hash", pwd_context.hash, password)
+
+
+async def verify_password(password: str, hashed_password: Optional[str]) -> tuple[bool, Optional[str]]:
+    """Check a password, returning (valid, new_hash).
+
+    new_hash is set when the stored hash should be replaced, e.g. after
+    BCRYPT_ROUNDS changed.
+    """
+    if not hashed_password:
+        return False, None
+    return await _submit("verify", pwd_context.verify_and_update, password, hashed_password)
@@ -0,0 +1,237 @@
+import collections
+import contextvars
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional
+from .logging import api_logger
+
+# On-demand profiling of single requests. An admin sends `X-Profile: 1` (or
+# `?profile=1`) and gets a Server-Timing header with SQL, auth and
+# serialization time; `X-Profile: store` (or `?profile=store`) also keeps the
+# full profile for GET /admin/profiles/{id}. Off by default: with
+# PROFILING_ENABLED=false the middleware is not mounted at all, and when on,
+# requests without the flag still pay for a header and query string check.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "1"))
+# Most recent stored profiles kept per process
+PROFILE_STORE_SIZE = int(os.getenv("PROFILE_STORE_SIZE", "20"))
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_PARAM = b"profile="
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Stacks whose only frames from this package are in these files are the
+# profiler itself or idle background threads (the log writer), not request work
+IGNORED_FILES = frozenset({os.path.join(APP_DIR, "profiling.py"), os.path.join(APP_DIR, "logging.py")})
+# FastAPI's response-model serialization has no hook, so its time is estimated
+# from samples; the app's own serializers time themselves with phase()
+SERIALIZE_FUNCTIONS = frozenset({"serialize_response", "jsonable_encoder"})
+
+current_profile: contextvars.ContextVar = contextvars.ContextVar("current_profile", default=None)
+profiles: collections.deque = collections.deque(maxlen=PROFILE_STORE_SIZE)
+
+
+class Profile:
+    """Timings and sampled stacks of one request"""
+
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.started_at = datetime.now(timezone.utc)
+        self.status = None
+        self.duration = 0.0
+        # phase -> [count, seconds]
+        self.phases = collections.defaultdict(lambda: [0, 0.0])
+        self.stacks = collections.Counter()
+        self.ticks = 0
+
+    def add(self, phase: str, seconds: float):
+        entry = self.phases[phase]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def sample_period(self) -> float:
+        # Real spacing of samples; the sampler wakes up late under load
+        return self.duration / self.ticks if self.ticks else 0.0
+
+    def sampled_seconds(self, functions: frozenset) -> float:
+        samples = sum(count for stack, count in self.stacks.items() if any(frame.split(" ", 1)[0] in functions for frame in stack))
+        return samples * self.sample_period()
+
+    def server_timing(self) -> str:
+        sql_count, sql_seconds = self.phases.get("sql", (0, 0.0))
+        serialize_seconds = self.phases.get("serialize", (0, 0.0))[1] + self.sampled_seconds(SERIALIZE_FUNCTIONS)
+        metrics = [
+            f"total;dur={self.duration * 1000:.1f}",
+            f'sql;dur={sql_seconds * 1000:.1f};desc="{sql_count} queries"',
+            f"auth;dur={self.phases.get('auth', (0, 0.0))[1] * 1000:.1f}",
+            f"serialize;dur={serialize_seconds * 1000:.1f}",
+        ]
+        return ", ".join(metrics)
+
+    def top_functions(self, limit: int = 30) -> list:
+        """Functions by sampled self time (innermost frame)"""
+        period = self.sample_period()
+        leaves = collections.Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack[-1]] += count
+        return [{"function": frame, "samples": count, "ms": round(count * period * 1000, 2)} for frame, count in leaves.most_common(limit)]
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 2),
+            "server_timing": self.server_timing(),
+        }
+
+    def folded(self) -> str:
+        """Stacks in the folded format flame graph tools (flamegraph.pl, speedscope) read"""
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common())
+
+
+@contextmanager
+def phase(name: str):
+    """Time a block into the current request's profile, if it is being profiled"""
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - started)
+
+
+class StackSampler:
+    """Samples every thread's stack, keeping those running code from this package.
+
+    Covers async routes on the event loop and sync routes in the threadpool
+    alike. Other requests served at the same time show up too, so profile on
+    a quiet worker where possible.
+    """
+
+    def __init__(self, profile: Profile, interval: float):
+        self.profile = profile
+        self.interval = interval
+        self.labels = {}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _label(self, code) -> str:
+        label = self.labels.get(code)
+        if label is None:
+            label = self.labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            self.profile.ticks += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack, in_app = [], False
+                while frame is not None:
+                    code = frame.f_code
+                    in_app = in_app or (code.co_filename.startswith(APP_DIR) and code.co_filename not in IGNORED_FILES)
+                    stack.append(self._label(code))
+                    frame = frame.f_back
+                if in_app:
+                    stack.reverse()
+                    self.profile.stacks[tuple(stack)] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+def requested_mode(scope) -> Optional[str]:
+    """"1" or "store" when the request asks to be profiled"""
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return value.decode("latin-1")
+    query = scope["query_string"]
+    if PROFILE_PARAM in query:
+        for item in query.split(b"&"):
+            if item.startswith(PROFILE_PARAM):
+                return item[len(PROFILE_PARAM):].decode("latin-1")
+    return None
+
+
+def bearer_token(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return token if scheme.lower() == "bearer" else None
+    return None
+
+
+def get_profile(profile_id: str) -> Optional[Profile]:
+    return next((profile for profile in profiles if profile.id == profile_id), None)
+
+
+class ProfilingMiddleware:
+    """Profile requests that ask for it, when `await allow(token)` accepts the caller's token"""
+
+    def __init__(self, app, allow):
+        self.app = app
+        self.allow = allow
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        mode = requested_mode(scope)
+        if mode is None or mode == "0":
+            await self.app(scope, receive, send)
+            return
+        token = bearer_token(scope)
+        if token is None or not await self.allow(token):
+            # Not an error: the flag is simply ignored for everyone else
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope["method"], scope["path"])
+        sampler = StackSampler(profile, PROFILE_SAMPLE_INTERVAL_MS / 1000)
+        store = mode == "store" and PROFILE_STORE_SIZE > 0
+        started = time.perf_counter()
+
+        def finish():
+            if not sampler.stopped.is_set():
+                profile.duration = time.perf_counter() - started
+                sampler.stop()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                # Measured up to the response headers; a streamed body is not included
+                finish()
+                profile.status = message["status"]
+                headers = [*message.get("headers", []), (b"server-timing", profile.server_timing().encode())]
+                if store:
+                    profiles.append(profile)
+                    headers.append((b"x-profile-id", profile.id.encode()))
+                message["headers"] = headers
+            await send(message)
+
+        # SQL time is added by sql_instrumentation's statement timing
+        context_token = current_profile.set(profile)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            finish()
+            current_profile.reset(context_token)
+            api_logger.info(f"Profiled {profile.method} {profile.path}: {profile.server_timing()}")
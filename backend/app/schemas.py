@@ -1,7 +1,13 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import Any, Optional
 from datetime import datetime
 from .models import UserRole, IssueStatus, IssueSeverity
+from .upload import is_upload_name
+import enum
+import os
+
+# Largest batch accepted by POST/PATCH /issues/bulk
+ISSUE_BULK_MAX_ITEMS = int(os.getenv("ISSUE_BULK_MAX_ITEMS", "500"))
 
 class UserBase(BaseModel):
     email: str
@@ -16,20 +22,41 @@ class User(UserBase):
     class Config:
         from_attributes = True
 
+class UserRoleUpdate(BaseModel):
+    role: UserRole
+
+class CurrentUser(BaseModel):
+    """The authenticated caller, as resolved from their access token"""
+    id: int
+    email: str
+    role: UserRole
+    token_version: int
+
 class IssueBase(BaseModel):
     title: str
     description: str
     severity: IssueSeverity
     status: IssueStatus = IssueStatus.OPEN
 
+def check_upload_name(file_path: Optional[str]) -> Optional[str]:
+    """Attachments are names returned by POST /upload/, never paths"""
+    if file_path is not None and not is_upload_name(file_path):
+        raise ValueError("file_path must be a filename returned by /upload/")
+    return file_path
+
 class IssueCreate(IssueBase):
-    pass
+    file_path: Optional[str] = None
+
+    _check_file_path = field_validator("file_path")(check_upload_name)
 
 class IssueUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
     severity: Optional[IssueSeverity] = None
     status: Optional[IssueStatus] = None
+    file_path: Optional[str] = None
+
+    _check_file_path = field_validator("file_path")(check_upload_name)
 
 class Issue(IssueBase):
     id: int
@@ -40,6 +67,99 @@ class Issue(IssueBase):
     class Config:
         from_attributes = True
 
+class IssueSearchResult(Issue):
+    rank: float
+    title_highlight: Optional[str] = None
+    snippet: Optional[str] = None
+
+class IssueBulkUpdateItem(IssueUpdate):
+    id: int
+
+class IssueBulkRequest(BaseModel):
+    """A batch for /issues/bulk. Items are validated one by one (as IssueCreate
+    or IssueBulkUpdateItem) so a bad item fails alone, not the whole batch."""
+    items: list[dict[str, Any]] = Field(..., min_length=1, max_length=ISSUE_BULK_MAX_ITEMS)
+
+class IssueBulkItemResult(BaseModel):
+    index: int
+    status_code: int
+    issue: Optional[Issue] = None
+    detail: Optional[Any] = None
+
+class IssueBulkResult(BaseModel):
+    succeeded: int
+    failed: int
+    results: list[IssueBulkItemResult]
+
+class IssueSort(str, enum.Enum):
+    CREATED_AT = "created_at"
+    CREATED_AT_DESC = "-created_at"
+    UPDATED_AT = "updated_at"
+    UPDATED_AT_DESC = "-updated_at"
+    SEVERITY = "severity"
+    SEVERITY_DESC = "-severity"
+    STATUS = "status"
+    STATUS_DESC = "-status"
+
+class IssueFilter(BaseModel):
+    status: Optional[list[IssueStatus]] = None
+    severity: Optional[list[IssueSeverity]] = None
+    reporter_id: Optional[int] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    updated_from: Optional[datetime] = None
+    updated_to: Optional[datetime] = None
+
+class IssueStatusTransition(BaseModel):
+    """Move every issue matching `filter` to `to_status`"""
+    to_status: IssueStatus
+    filter: IssueFilter = Field(default_factory=IssueFilter)
+    dry_run: bool = False
+
+class IssueStatusTransitionCount(BaseModel):
+    from_status: IssueStatus
+    to_status: IssueStatus
+    count: int
+
+class IssueStatusTransitionResult(BaseModel):
+    affected: int
+    dry_run: bool
+    transitions: list[IssueStatusTransitionCount]
+
+class IssueChanges(BaseModel):
+    """One batch of GET /issues/changes: issues to upsert and ids to drop.
+    Pass `cursor` back as `since`; fetch again at once while `has_more`."""
+    changed: list[Issue]
+    deleted: list[int]
+    cursor: str
+    has_more: bool
+
+class IssueCounts(BaseModel):
+    total_issues: int
+    open_issues: int
+    issues_by_status: dict[IssueStatus, int]
+    issues_by_severity: dict[IssueSeverity, int]
+
+class DashboardSummary(IssueCounts):
+    recent_criticals: list[Issue]
+    generated_at: datetime
+
+class StatsBucket(str, enum.Enum):
+    HOUR = "hour"
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+class TimeseriesPoint(BaseModel):
+    bucket: datetime
+    count: int
+
+class StatsTimeseries(BaseModel):
+    start: datetime
+    end: datetime
+    bucket: StatsBucket
+    series: dict[IssueStatus, list[TimeseriesPoint]]
+
 class DailyStats(BaseModel):
     id: int
     date: datetime
@@ -48,6 +168,29 @@ class DailyStats(BaseModel):
     class Config:
         from_attributes = True
 
+class ProfileSummary(BaseModel):
+    id: str
+    method: str
+    path: str
+    status: Optional[int]
+    started_at: datetime
+    duration_ms: float
+    server_timing: str
+
+class ProfileFunction(BaseModel):
+    function: str
+    samples: int
+    ms: float
+
+class ProfileDetail(ProfileSummary):
+    top_functions: list[ProfileFunction]
+    # Folded stacks ("outer;inner count" per line) for flame graph tools
+    stacks: str
+
 class Token(BaseModel):
     access_token: str
-    token_type: str 
\ No newline at end of file
+    token_type: str
+
+class StreamTicket(BaseModel):
+    ticket: str
+    expires_in: int 
\ No newline at end of file
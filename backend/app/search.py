@@ -0,0 +1,150 @@
+from sqlalchemy import DDL, bindparam, event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import NamedTuple, Optional
+from . import models
+
+# Postgres keeps a weighted tsvector on the issues row itself; SQLite (tests and
+# local dev) keeps a copy of the text in an FTS5 shadow table keyed by issue id.
+# Neither lives on the ORM model: both are created alongside the issues table and
+# kept current by crud through index_issue / remove_issue.
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+
+event.listen(
+    models.Issue.__table__,
+    "after_create",
+    DDL(
+        "ALTER TABLE issues ADD COLUMN IF NOT EXISTS search_vector tsvector; "
+        "CREATE INDEX IF NOT EXISTS ix_issues_search_vector ON issues USING GIN (search_vector)"
+    ).execute_if(dialect="postgresql"),
+)
+event.listen(
+    models.Issue.__table__,
+    "after_create",
+    DDL(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS issues_fts "
+        "USING fts5(title, description, tokenize='porter unicode61')"
+    ).execute_if(dialect="sqlite"),
+)
+event.listen(
+    models.Issue.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS issues_fts").execute_if(dialect="sqlite"),
+)
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+
+
+class SearchHit(NamedTuple):
+    issue: models.Issue
+    score: float
+    title_highlight: Optional[str]
+    snippet: Optional[str]
+
+
+class SearchUnsupported(Exception):
+    """Raised when the database has no full-text search backend here"""
+
+
+def _dialect(db: AsyncSession) -> str:
+    return db.get_bind().dialect.name
+
+
+async def index_issue(db: AsyncSession, issue: models.Issue):
+    """Refresh the search document for an issue in the current transaction"""
+    await index_issues(db, [issue])
+
+
+async def index_issues(db: AsyncSession, issues: list[models.Issue]):
+    """Refresh the search documents for several issues with one statement each"""
+    if not issues:
+        return
+    dialect = _dialect(db)
+    if dialect == "postgresql":
+        await db.execute(
+            text(f"UPDATE issues SET search_vector = {POSTGRES_VECTOR} WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+            {"ids": [issue.id for issue in issues]},
+        )
+    elif dialect == "sqlite":
+        await db.execute(text("DELETE FROM issues_fts WHERE rowid = :id"), [{"id": issue.id} for issue in issues])
+        await db.execute(
+            text("INSERT INTO issues_fts (rowid, title, description) VALUES (:id, :title, :description)"),
+            [{"id": issue.id, "title": issue.title, "description": issue.description} for issue in issues],
+        )
+
+
+async def remove_issue(db: AsyncSession, issue_id: int):
+    """Drop an issue from the search index in the current transaction"""
+    if _dialect(db) == "sqlite":
+        await db.execute(text("DELETE FROM issues_fts WHERE rowid = :id"), {"id": issue_id})
+
+
+def fts5_query(q: str) -> str:
+    """Quote each term so user input can't use FTS5 query syntax"""
+    terms = [term.replace('"', '""') for term in q.split()]
+    return " ".join(f'"{term}"' for term in terms if term)
+
+
+async def search_issues(db: AsyncSession, q: str, limit: int = 20, user_id: Optional[int] = None,
+                  after: Optional[tuple[float, int]] = None, highlight: bool = True) -> list[SearchHit]:
+    """Rank issues matching `q`, best first.
+
+    Scores are normalised so lower is better on every backend, which lets
+    `after` be a plain (score, id) keyset position.
+    """
+    dialect = _dialect(db)
+    params = {"limit": limit, "user_id": user_id}
+    scope = "AND issues.reporter_id = :user_id" if user_id else ""
+    page = "WHERE (hits.score, hits.id) > (:after_score, :after_id)" if after else ""
+    if after:
+        params["after_score"], params["after_id"] = after
+
+    if dialect == "postgresql":
+        params["q"] = q
+        headlines = (
+            f"ts_headline('english', issues.title, query, 'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, HighlightAll=true'), "
+            f"ts_headline('english', issues.description, query, 'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxFragments=2')"
+            if highlight else "NULL, NULL"
+        )
+        # Headlines are expensive, so only build them for the page being returned
+        sql = f"""
+            SELECT hits.id, hits.score, {headlines}
+            FROM (
+                SELECT issues.id, -ts_rank_cd(issues.search_vector, query) AS score
+                FROM issues, websearch_to_tsquery('english', :q) AS query
+                WHERE issues.search_vector @@ query {scope}
+            ) AS hits
+            JOIN issues ON issues.id = hits.id, websearch_to_tsquery('english', :q) AS query
+            {page}
+            ORDER BY hits.score, hits.id
+            LIMIT :limit
+        """
+    elif dialect == "sqlite":
+        params["q"] = fts5_query(q)
+        if not params["q"]:
+            return []
+        headlines = (
+            f"highlight(issues_fts, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}') AS title_highlight, "
+            f"snippet(issues_fts, 1, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', 16) AS snippet"
+            if highlight else "NULL AS title_highlight, NULL AS snippet"
+        )
+        sql = f"""
+            SELECT hits.id, hits.score, hits.title_highlight, hits.snippet
+            FROM (
+                SELECT issues_fts.rowid AS id, bm25(issues_fts, 4.0, 1.0) AS score, {headlines}
+                FROM issues_fts JOIN issues ON issues.id = issues_fts.rowid
+                WHERE issues_fts MATCH :q {scope}
+            ) AS hits
+            {page}
+            ORDER BY hits.score, hits.id
+            LIMIT :limit
+        """
+    else:
+        raise SearchUnsupported(f"Full-text search is not supported on {dialect}")
+
+    rows = (await db.execute(text(sql), params)).all()
+    issues = {issue.id: issue for issue in await db.scalars(select(models.Issue).where(models.Issue.id.in_([row[0] for row in rows])))}
+    return [SearchHit(issues[row[0]], row[1], row[2], row[3]) for row in rows if row[0] in issues]
@@ -0,0 +1,25 @@
+from fastapi import Response
+from pydantic import TypeAdapter
+from . import models, profiling, schemas
+
+# Fast path for large issue lists. Instead of loading ORM objects and letting
+# FastAPI validate them against the response model and encode the result, a
+# list endpoint selects just the columns schemas.Issue needs, validates the
+# whole page in one pydantic-core call and encodes it straight to JSON bytes.
+ISSUE_FIELDS = list(schemas.Issue.model_fields)
+ISSUE_COLUMNS = [getattr(models.Issue, name) for name in ISSUE_FIELDS]
+
+issue_list_adapter = TypeAdapter(list[schemas.Issue])
+
+
+def issue_list_json(rows) -> bytes:
+    """JSON for rows of ISSUE_COLUMNS, identical to the list[schemas.Issue] response model"""
+    with profiling.phase("serialize"):
+        # Plain dicts validate several times faster than attribute lookups on Rows
+        issues = issue_list_adapter.validate_python([dict(zip(ISSUE_FIELDS, row)) for row in rows])
+        return issue_list_adapter.dump_json(issues)
+
+
+def issue_list_response(rows, headers: dict) -> Response:
+    # Returned as-is, so FastAPI skips validating and encoding it again
+    return Response(content=issue_list_json(rows), media_type="application/json", headers=headers)
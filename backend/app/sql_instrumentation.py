@@ -0,0 +1,140 @@
+import collections
+import contextvars
+import functools
+import os
+import re
+import time
+from sqlalchemy import event
+from . import profiling
+from .logging import db_logger
+from .metrics import DB_N_PLUS_ONE, DB_OPERATION_DURATION, DB_SLOW_QUERIES, route_template
+
+# Every statement on an instrumented engine is timed into
+# database_operation_duration_seconds{operation, table}. Statements slower than
+# SQL_SLOW_QUERY_MS are logged with the shape (not the values) of their
+# parameters. Within a request, a SELECT run more than SQL_N_PLUS_ONE_THRESHOLD
+# times with the same fingerprint - typically a lazy load in a loop, like
+# Issue.reporter per issue - is logged and counted as an N+1.
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "500"))
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "10"))
+
+OPERATIONS = {"SELECT": "select", "WITH": "select", "INSERT": "insert", "UPDATE": "update", "DELETE": "delete"}
+TABLE_PATTERNS = {
+    "select": re.compile(r'\bFROM\s+"?(\w+)', re.IGNORECASE),
+    "insert": re.compile(r'\bINTO\s+"?(\w+)', re.IGNORECASE),
+    "update": re.compile(r'^\s*UPDATE\s+"?(\w+)', re.IGNORECASE),
+    "delete": re.compile(r'\bFROM\s+"?(\w+)', re.IGNORECASE),
+}
+# Placeholders of every DBAPI paramstyle, and IN lists of any length
+PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|%s|:\w+|\?")
+IN_LIST = re.compile(r"\(\?(?:\s*,\s*\?)+\)")
+WHITESPACE = re.compile(r"\s+")
+
+statement_counts: contextvars.ContextVar = contextvars.ContextVar("statement_counts", default=None)
+
+
+class StatementInfo:
+    __slots__ = ("fingerprint", "operation", "table", "duration", "slow")
+
+    def __init__(self, fingerprint: str, operation: str, table: str):
+        self.fingerprint = fingerprint
+        self.operation = operation
+        self.table = table
+        # Children looked up once per distinct statement, not per execution
+        self.duration = DB_OPERATION_DURATION.labels(operation=operation, table=table)
+        self.slow = DB_SLOW_QUERIES.labels(operation=operation, table=table)
+
+
+@functools.lru_cache(maxsize=2048)
+def describe(statement: str) -> StatementInfo:
+    """Fingerprint, operation and main table of a statement (cached per SQL string)"""
+    fingerprint = IN_LIST.sub("(?)", PLACEHOLDER.sub("?", WHITESPACE.sub(" ", statement.strip())))
+    operation = OPERATIONS.get(fingerprint.split(" ", 1)[0].upper(), "other")
+    match = TABLE_PATTERNS[operation].search(fingerprint) if operation in TABLE_PATTERNS else None
+    return StatementInfo(fingerprint, operation, match.group(1).lower() if match else "")
+
+
+def _shape(values) -> str:
+    # Runs of one type are collapsed, so a 1000-item IN list stays one entry
+    runs = []
+    for value in values:
+        name = type(value).__name__
+        if runs and runs[-1][0] == name:
+            runs[-1][1] += 1
+        else:
+            runs.append([name, 1])
+    return ", ".join(name if count == 1 else f"{name} x{count}" for name, count in runs)
+
+
+def parameter_shape(parameters, executemany: bool = False) -> str:
+    """Types of a statement's parameters, never their values"""
+    if executemany:
+        return f"{len(parameters)} rows of {parameter_shape(parameters[0])}" if parameters else "0 rows"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return f"({_shape(parameters)})"
+    return type(parameters).__name__
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_start_time"].pop()
+    info = describe(statement)
+    info.duration.observe(duration)
+    if duration * 1000 >= SQL_SLOW_QUERY_MS:
+        info.slow.inc()
+        db_logger.warning(f"Slow query ({duration * 1000:.0f} ms, {info.operation} {info.table}): {info.fingerprint[:1000]} params {parameter_shape(parameters, executemany)}")
+    counts = statement_counts.get()
+    if counts is not None and info.operation == "select":
+        counts[(info.fingerprint, info.table)] += 1
+    profile = profiling.current_profile.get()
+    if profile is not None:
+        profile.add("sql", duration)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    starts = exception_context.connection.info.get("query_start_time") if exception_context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def instrument(engine):
+    """Time every statement run on a (sync) Engine; async engines pass .sync_engine"""
+    if not event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+def report_repeats(counts: collections.Counter, endpoint: str, threshold: int = SQL_N_PLUS_ONE_THRESHOLD) -> list:
+    """Log and count the SELECTs a request repeated more than `threshold` times"""
+    repeated = [(fingerprint, table, count) for (fingerprint, table), count in counts.items() if count > threshold]
+    for fingerprint, table, count in repeated:
+        DB_N_PLUS_ONE.labels(endpoint=endpoint, table=table).inc()
+        db_logger.warning(f"Possible N+1 in {endpoint}: same query run {count} times: {fingerprint[:1000]}")
+    return repeated
+
+
+class QueryTrackingMiddleware:
+    """Count each request's SELECTs by fingerprint and report N+1 patterns"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        counts = collections.Counter()
+        token = statement_counts.set(counts)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            statement_counts.reset(token)
+            if counts:
+                report_repeats(counts, f"{scope['method']} {route_template(scope)}")
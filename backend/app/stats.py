@@ -0,0 +1,96 @@
+import os
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import and_, func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from . import models
+from .conditional import as_utc
+
+# Snapshots of issue counts per status are written to daily_stats once per
+# STATS_SNAPSHOT_MINUTES slot (hourly by default, despite the table name) and
+# read back as bucketed series by GET /stats/timeseries.
+STATS_SNAPSHOT_MINUTES = int(os.getenv("STATS_SNAPSHOT_MINUTES", "60"))
+# Upper bound on buckets per series; ask for a coarser bucket beyond this
+STATS_MAX_POINTS = int(os.getenv("STATS_MAX_POINTS", "2000"))
+
+BUCKET_SECONDS = {
+    "hour": 3600,
+    "day": 86400,
+    "week": 7 * 86400,
+    "month": 31 * 86400,
+}
+
+# SQLite keeps datetimes as ISO strings; truncate them with strftime
+SQLITE_BUCKETS = {
+    "hour": ("'%Y-%m-%d %H:00:00'",),
+    "day": ("'%Y-%m-%d 00:00:00'",),
+    # Monday on or before the date, matching date_trunc('week')
+    "week": ("'%Y-%m-%d 00:00:00'", "'-6 days'", "'weekday 1'"),
+    "month": ("'%Y-%m-01 00:00:00'",),
+}
+
+
+class TooManyPoints(ValueError):
+    pass
+
+
+def snapshot_slot(now: datetime) -> datetime:
+    """Start of the snapshot slot containing `now`"""
+    slot_seconds = STATS_SNAPSHOT_MINUTES * 60
+    return datetime.fromtimestamp(int(now.timestamp()) // slot_seconds * slot_seconds, tz=timezone.utc)
+
+
+def take_snapshot(db: Session, now: Optional[datetime] = None) -> Optional[datetime]:
+    """Record the per-status totals from issue_counters for the current slot.
+
+    Returns the slot written, or None if that slot already has a snapshot.
+    """
+    slot = snapshot_slot(now or datetime.now(timezone.utc))
+    if db.scalar(select(models.DailyStats.id).where(models.DailyStats.date == slot).limit(1)) is not None:
+        return None
+    totals = dict(db.execute(
+        select(models.IssueCounter.status, func.sum(models.IssueCounter.count)).group_by(models.IssueCounter.status)
+    ).all())
+    # Zero counts are written too, so a series drops to 0 instead of showing a gap
+    db.add_all(models.DailyStats(date=slot, status=status, count=totals.get(status) or 0) for status in models.IssueStatus)
+    db.commit()
+    return slot
+
+
+def _bucket_start(dialect: str, bucket: str):
+    # Inlined rather than bound: Postgres only matches the SELECT expression to
+    # the GROUP BY one when they are textually identical
+    if dialect == "postgresql":
+        return func.date_trunc(literal_column(f"'{bucket}'"), models.DailyStats.date, literal_column("'UTC'"))
+    fmt, *modifiers = SQLITE_BUCKETS[bucket]
+    return func.strftime(literal_column(fmt), models.DailyStats.date, *map(literal_column, modifiers))
+
+
+async def get_timeseries(db: AsyncSession, start: datetime, end: datetime, bucket: str,
+                         statuses: Optional[list[models.IssueStatus]] = None) -> dict:
+    """Issue counts per status in [start, end), one point per bucket.
+
+    Each point is the last snapshot inside its bucket, so a coarse bucket
+    downsamples the series without averaging away the current value.
+    """
+    if (end - start).total_seconds() / BUCKET_SECONDS[bucket] > STATS_MAX_POINTS:
+        raise TooManyPoints(f"More than {STATS_MAX_POINTS} {bucket} buckets requested; use a coarser bucket or a shorter range")
+    bucket_start = _bucket_start(db.bind.dialect.name, bucket)
+    latest = (
+        select(bucket_start.label("bucket"), models.DailyStats.status, func.max(models.DailyStats.date).label("latest"))
+        .where(models.DailyStats.date >= start, models.DailyStats.date < end)
+        .group_by(bucket_start, models.DailyStats.status)
+    )
+    if statuses:
+        latest = latest.where(models.DailyStats.status.in_(statuses))
+    latest = latest.subquery()
+    rows = await db.execute(
+        select(latest.c.bucket, models.DailyStats.status, models.DailyStats.count)
+        .join(latest, and_(models.DailyStats.status == latest.c.status, models.DailyStats.date == latest.c.latest))
+        .order_by(latest.c.bucket)
+    )
+    series = {status: [] for status in (statuses or list(models.IssueStatus))}
+    for bucket_value, status, count in rows:
+        series[status].append({"bucket": as_utc(bucket_value), "count": count})
+    return series
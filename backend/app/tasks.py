@@ -1,50 +1,29 @@
 from celery import shared_task
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime, date
 from .database import SessionLocal
-from .models import Issue, DailyStats, IssueStatus
+from .models import Issue, IssueStatus
 from .logging import db_logger
+from . import changes, counters, stats, upload
 
 @shared_task
 def aggregate_daily_stats():
-    """Aggregate issue counts by status into daily_stats table every 30 minutes"""
+    """Snapshot issue counts by status into daily_stats once per STATS_SNAPSHOT_MINUTES slot"""
     db = SessionLocal()
     try:
-        today = date.today()
-        db_logger.info(f"Starting daily stats aggregation for {today}")
+        db_logger.info("Starting stats snapshot")
         
-        # Check if stats already exist for today
-        existing_stats = db.query(DailyStats).filter(
-            func.date(DailyStats.date) == today
-        ).first()
-        
-        if existing_stats:
-            db_logger.info(f"Stats already exist for {today}, skipping aggregation")
+        # Counts come from the maintained counters; a slot is only written once
+        slot = stats.take_snapshot(db)
+        if slot is None:
+            db_logger.info("Stats snapshot already exists for this slot, skipping aggregation")
             return {"status": "skipped", "reason": "already_exists"}
         
-        # Get issue counts by status
-        status_counts = db.query(
-            Issue.status,
-            func.count(Issue.id).label('count')
-        ).group_by(Issue.status).all()
-        
-        # Create daily stats records
-        for status, count in status_counts:
-            daily_stat = DailyStats(
-                date=datetime.now(),
-                status=status,
-                count=count
-            )
-            db.add(daily_stat)
-        
-        db.commit()
-        db_logger.info(f"Daily stats aggregation completed for {today}")
+        db_logger.info(f"Stats snapshot completed for {slot.isoformat()}")
         
         return {
             "status": "success",
-            "date": today.isoformat(),
-            "stats_created": len(status_counts)
+            "date": slot.isoformat(),
+            "stats_created": len(IssueStatus)
         }
         
     except Exception as e:
@@ -93,35 +72,51 @@ def send_notifications():
         db.close()
 
 @shared_task
-def update_metrics():
-    """Update Prometheus metrics from database"""
-    from .metrics import OPEN_ISSUES_BY_SEVERITY, OPEN_ISSUES_BY_STATUS
+def reconcile_issue_counters():
+    """Recount issue_counters from the issues table and repair any drift"""
+    db = SessionLocal()
+    try:
+        corrections = counters.reconcile(db)
+        if corrections:
+            drift = {f"{status.value}/{severity.value}": delta for (status, severity), delta in corrections.items()}
+            db_logger.warning(f"Issue counters drifted, corrected: {drift}")
+        else:
+            db_logger.info("Issue counters reconciled, no drift")
+        return {"status": "success", "corrections": sum(abs(d) for d in corrections.values())}
     
+    except Exception as e:
+        db_logger.error(f"Error reconciling issue counters: {str(e)}")
+        db.rollback()
+        raise e
+    finally:
+        db.close()
+
+@shared_task
+def purge_issue_tombstones():
+    """Drop delete markers older than ISSUE_TOMBSTONE_RETENTION_DAYS from the change feed"""
     db = SessionLocal()
     try:
-        # Update severity metrics
-        severity_counts = db.query(
-            Issue.severity,
-            func.count(Issue.id)
-        ).filter(Issue.status != IssueStatus.DONE).group_by(Issue.severity).all()
-        
-        for severity, count in severity_counts:
-            OPEN_ISSUES_BY_SEVERITY.labels(severity=severity).set(count)
-        
-        # Update status metrics
-        status_counts = db.query(
-            Issue.status,
-            func.count(Issue.id)
-        ).group_by(Issue.status).all()
-        
-        for status, count in status_counts:
-            OPEN_ISSUES_BY_STATUS.labels(status=status).set(count)
-        
-        db_logger.info("Metrics updated successfully")
-        return {"status": "success", "metrics_updated": True}
-        
+        purged = changes.purge_tombstones(db)
+        db_logger.info(f"Purged {purged} issue tombstones")
+        return {"status": "success", "purged": purged}
+    except Exception as e:
+        db_logger.error(f"Error purging issue tombstones: {str(e)}")
+        db.rollback()
+        raise e
+    finally:
+        db.close()
+
+@shared_task
+def sweep_upload_blobs():
+    """Delete attachment blobs that no issue references once their grace period is over"""
+    db = SessionLocal()
+    try:
+        removed = upload.sweep_blobs(db)
+        db_logger.info(f"Swept {removed} unreferenced upload blobs")
+        return {"status": "success", "removed": removed}
     except Exception as e:
-        db_logger.error(f"Error updating metrics: {str(e)}")
+        db_logger.error(f"Error sweeping upload blobs: {str(e)}")
+        db.rollback()
         raise e
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
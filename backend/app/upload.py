@@ -1,13 +1,44 @@
+import hashlib
+import mimetypes
 import os
+import re
+import tempfile
 import uuid
-from fastapi import UploadFile, HTTPException
+from datetime import datetime, timezone
+from email.utils import formatdate
+from fastapi import Request, Response, UploadFile, HTTPException
 from pathlib import Path
+from typing import Optional
+from fastapi.responses import FileResponse, JSONResponse
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from .conditional import is_not_modified, not_modified_response
 from .logging import api_logger
+from .models import FileBlob
 
 # Upload configuration
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+# "content" stores each distinct body once as ab/cd/<sha256>, shared between
+# issues via reference counts in file_blobs; "flat" keeps one uuid-named copy
+# per upload directly in UPLOAD_DIR
+UPLOAD_STORAGE = os.getenv("UPLOAD_STORAGE", "content")
+# When set, GET /files/ only authorizes and answers with an X-Accel-Redirect
+# to this internal nginx location, which must alias UPLOAD_DIR
+UPLOAD_ACCEL_REDIRECT_PREFIX = os.getenv("UPLOAD_ACCEL_REDIRECT_PREFIX", "")
+# Attachments never change under a given name, so clients may keep them
+UPLOAD_CACHE_CONTROL = "private, max-age=31536000, immutable"
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
+# Allowance for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
 ALLOWED_EXTENSIONS = {'.txt', '.pdf', '.doc', '.docx', '.png', '.jpg', '.jpeg', '.gif'}
+# Blobs with no file_blobs row are removed by sweep_blobs once they have gone
+# this long without being uploaded again; covers the gap between an upload
+# and the issue write that attaches it
+UPLOAD_BLOB_GRACE_SECONDS = int(os.getenv("UPLOAD_BLOB_GRACE_SECONDS", str(24 * 60 * 60)))
 
 # Create upload directory if it doesn't exist
 Path(UPLOAD_DIR).mkdir(exist_ok=True)
@@ -20,6 +51,94 @@ def is_allowed_file(filename: str) -> bool:
     """Check if file extension is allowed"""
     return get_file_extension(filename) in ALLOWED_EXTENSIONS
 
+# The extension picks the served Content-Type, so only the allowed ones are accepted
+_EXTENSION = "(" + "|".join(re.escape(extension) for extension in sorted(ALLOWED_EXTENSIONS)) + ")?"
+# Filenames handed out in content mode: <sha256><extension>
+BLOB_NAME = re.compile(r"^([0-9a-f]{64})" + _EXTENSION + "$")
+# Filenames handed out in flat mode: <uuid4><extension>
+FLAT_NAME = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}" + _EXTENSION + "$")
+# Types browsers may render inline; anything else is served as a download
+INLINE_MEDIA_TYPES = {"image/png", "image/jpeg", "image/gif", "application/pdf"}
+
+def blob_digest(filename: str) -> Optional[str]:
+    """The sha256 behind a content-addressed filename, None for flat files"""
+    match = BLOB_NAME.match(filename)
+    return match.group(1) if match else None
+
+def is_upload_name(filename: str) -> bool:
+    """Whether `filename` is a name save_upload_file could have handed out"""
+    return bool(BLOB_NAME.match(filename) or FLAT_NAME.match(filename))
+
+def blob_path(digest: str) -> str:
+    return os.path.join(UPLOAD_DIR, digest[:2], digest[2:4], digest)
+
+def file_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=400,
+        detail=f"File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB"
+    )
+
+def _open_temp_file():
+    # Temp files live inside UPLOAD_DIR so the final rename never crosses filesystems
+    tmp_dir = os.path.join(UPLOAD_DIR, ".tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix=".part")
+    return os.fdopen(fd, "wb"), tmp_path
+
+def _write_chunk(f, digest, chunk: bytes):
+    digest.update(chunk)
+    f.write(chunk)
+
+def _close_temp_file(f):
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+
+def _discard_temp_file(f, tmp_path: str):
+    f.close()
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+async def stream_to_temp_file(upload_file: UploadFile) -> tuple[str, int, str]:
+    """Copy an upload to a temp file in UPLOAD_CHUNK_SIZE chunks.
+
+    Only one chunk is held in memory at a time; hashing and disk writes run in
+    the threadpool. Raises as soon as MAX_FILE_SIZE is crossed. Returns the
+    temp path, the size in bytes and the SHA-256 hex digest; the caller moves
+    the file into place.
+    """
+    if upload_file.size is not None and upload_file.size > MAX_FILE_SIZE:
+        raise file_too_large()
+
+    f, tmp_path = await run_in_threadpool(_open_temp_file)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while chunk := await upload_file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > MAX_FILE_SIZE:
+                raise file_too_large()
+            await run_in_threadpool(_write_chunk, f, digest, chunk)
+        await run_in_threadpool(_close_temp_file, f)
+    except BaseException:
+        await run_in_threadpool(_discard_temp_file, f, tmp_path)
+        raise
+    return tmp_path, size, digest.hexdigest()
+
+def _store_blob(tmp_path: str, digest: str) -> bool:
+    """Move a temp file to its blob path unless that body is already stored"""
+    path = blob_path(digest)
+    try:
+        # Already stored: restart its grace period so sweep_blobs leaves it
+        # alone until the issue write that attaches it
+        os.utime(path)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return True
+    os.remove(tmp_path)
+    return False
+
 async def save_upload_file(upload_file: UploadFile) -> str:
     """Save uploaded file and return the file path"""
     try:
@@ -33,24 +152,21 @@ async def save_upload_file(upload_file: UploadFile) -> str:
                 detail=f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
             )
         
-        # Generate unique filename
+        # Stream to a temp file, then rename so readers never see a partial file
         file_extension = get_file_extension(upload_file.filename)
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, unique_filename)
-        
-        # Check file size
-        content = await upload_file.read()
-        if len(content) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB"
-            )
+        tmp_path, size, digest = await stream_to_temp_file(upload_file)
         
-        # Save file
-        with open(file_path, "wb") as f:
-            f.write(content)
+        if UPLOAD_STORAGE == "content":
+            unique_filename = f"{digest}{file_extension}"
+            stored = await run_in_threadpool(_store_blob, tmp_path, digest)
+            if not stored:
+                api_logger.info(f"File already stored, reusing blob: {unique_filename}")
+                return unique_filename
+        else:
+            unique_filename = f"{uuid.uuid4()}{file_extension}"
+            await run_in_threadpool(os.replace, tmp_path, os.path.join(UPLOAD_DIR, unique_filename))
         
-        api_logger.info(f"File uploaded successfully: {unique_filename}")
+        api_logger.info(f"File uploaded successfully: {unique_filename} ({size} bytes)")
         return unique_filename
         
     except HTTPException:
@@ -59,24 +175,204 @@ async def save_upload_file(upload_file: UploadFile) -> str:
         api_logger.error(f"Error saving file: {str(e)}")
         raise HTTPException(status_code=500, detail="Error saving file")
 
-def delete_upload_file(filename: str) -> bool:
-    """Delete uploaded file"""
+def _blob_insert(db: AsyncSession):
+    return (postgresql if db.bind.dialect.name == "postgresql" else sqlite).insert(FileBlob)
+
+async def attachment_exists(filename: str) -> bool:
+    """Whether attach_file would accept this name"""
     try:
-        file_path = os.path.join(UPLOAD_DIR, filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            api_logger.info(f"File deleted: {filename}")
-            return True
+        path = get_file_path(filename)
+    except ValueError:
         return False
-    except Exception as e:
-        api_logger.error(f"Error deleting file {filename}: {str(e)}")
+    return await run_in_threadpool(os.path.isfile, path)
+
+async def attach_file(db: AsyncSession, filename: str, count: int = 1):
+    """Take `count` references on the blob behind an issue attachment.
+
+    Runs in the caller's transaction. Flat (uuid-named) files are only checked
+    to exist; they are not reference counted.
+    """
+    digest = blob_digest(filename)
+    if digest is None:
+        if not await attachment_exists(filename):
+            raise HTTPException(status_code=400, detail=f"Unknown attachment: {filename}")
+        return
+    try:
+        size = await run_in_threadpool(os.path.getsize, blob_path(digest))
+    except FileNotFoundError:
+        raise HTTPException(status_code=400, detail=f"Unknown attachment: {filename}")
+    stmt = _blob_insert(db).values(sha256=digest, size=size, ref_count=count)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[FileBlob.sha256],
+        set_={"ref_count": FileBlob.ref_count + count},
+    ))
+
+async def delete_upload_file(db: AsyncSession, filename: str) -> bool:
+    """Drop one reference to an uploaded file, freeing it with the last one.
+
+    For content-addressed files the reference is released in the caller's
+    transaction and the file_blobs row deleted with the last one; the blob on
+    disk is left for sweep_blobs, since an identical upload may be about to
+    attach it again. Flat files carry no reference count - another issue may
+    still point at one - so they are never removed here. Returns True if the
+    file was freed.
+    """
+    digest = blob_digest(filename)
+    if digest is None:
+        return False
+    remaining = (await db.execute(
+        update(FileBlob)
+        .where(FileBlob.sha256 == digest, FileBlob.ref_count > 0)
+        .values(ref_count=FileBlob.ref_count - 1)
+        .returning(FileBlob.ref_count)
+        .execution_options(synchronize_session=False)
+    )).scalar_one_or_none()
+    if remaining != 0:
         return False
+    freed = await db.execute(
+        delete(FileBlob)
+        .where(FileBlob.sha256 == digest, FileBlob.ref_count == 0)
+        .execution_options(synchronize_session=False)
+    )
+    return bool(freed.rowcount)
+
+class UploadSizeLimitMiddleware:
+    """Reject oversized uploads from Content-Length before the body is read.
+
+    Without this the multipart parser spools the whole request to disk before
+    save_upload_file ever sees it.
+    """
+
+    def __init__(self, app, paths: tuple = ("/upload/",)):
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in self.paths:
+            content_length = dict(scope["headers"]).get(b"content-length")
+            if content_length and content_length.isdigit() and int(content_length) > MAX_FILE_SIZE + MULTIPART_OVERHEAD:
+                response = JSONResponse(status_code=413, content={"detail": file_too_large().detail})
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+def _stored_blobs():
+    """(digest, path) for every blob file under UPLOAD_DIR"""
+    for dirpath, dirnames, filenames in os.walk(UPLOAD_DIR):
+        dirnames[:] = [name for name in dirnames if len(name) == 2]
+        for name in filenames:
+            if BLOB_NAME.fullmatch(name) and os.path.join(dirpath, name) == blob_path(name):
+                yield name, blob_path(name)
+
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return float("inf")
+
+def _referenced(db: Session, digests: list[str]) -> set[str]:
+    return set(db.scalars(select(FileBlob.sha256).where(FileBlob.sha256.in_(digests))))
+
+def sweep_blobs(db: Session, now: Optional[datetime] = None, batch_size: int = 500) -> int:
+    """Delete blobs without a file_blobs row that outlived UPLOAD_BLOB_GRACE_SECONDS.
+
+    This is the only place blobs are removed from disk: both those whose last
+    reference was released and uploads that were never attached. Each blob's
+    row and mtime are checked again right before the unlink, so one attached
+    or uploaded again since the batch lookup is kept.
+    """
+    cutoff = (now or datetime.now(timezone.utc)).timestamp() - UPLOAD_BLOB_GRACE_SECONDS
+    stale = [(digest, path) for digest, path in _stored_blobs() if _mtime(path) < cutoff]
+    removed = 0
+    for start in range(0, len(stale), batch_size):
+        batch = stale[start:start + batch_size]
+        referenced = _referenced(db, [digest for digest, _ in batch])
+        for digest, path in batch:
+            if digest in referenced:
+                continue
+            # A fresh transaction, so the re-check sees rows committed since
+            db.rollback()
+            if _referenced(db, [digest]) or _mtime(path) >= cutoff:
+                continue
+            try:
+                os.remove(path)
+                removed += 1
+                api_logger.info(f"File blob freed: {digest}")
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                api_logger.error(f"Error deleting file blob {digest}: {str(e)}")
+        db.rollback()
+    return removed
 
 def get_file_path(filename: str) -> str:
-    """Get full file path for a filename"""
-    return os.path.join(UPLOAD_DIR, filename)
+    """Get full file path for a filename; ValueError for anything not under UPLOAD_DIR"""
+    if not is_upload_name(filename):
+        raise ValueError(f"Not an upload name: {filename!r}")
+    digest = blob_digest(filename)
+    path = blob_path(digest) if digest is not None else os.path.join(UPLOAD_DIR, filename)
+    root = os.path.realpath(UPLOAD_DIR)
+    if os.path.commonpath([root, os.path.realpath(path)]) != root:
+        raise ValueError(f"Upload path outside {UPLOAD_DIR}: {filename!r}")
+    return path
 
 def file_exists(filename: str) -> bool:
     """Check if file exists"""
-    file_path = os.path.join(UPLOAD_DIR, filename)
-    return os.path.exists(file_path) 
\ No newline at end of file
+    try:
+        return os.path.exists(get_file_path(filename))
+    except ValueError:
+        return False
+
+def _stat_file(path: str) -> Optional[os.stat_result]:
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat_result if os.path.isfile(path) else None
+
+def file_etag(filename: str, stat_result: Optional[os.stat_result] = None) -> str:
+    """Strong ETag: the content hash for blobs, mtime and size for flat files"""
+    digest = blob_digest(filename)
+    if digest is not None:
+        return f'"{digest}"'
+    etag_base = f"{stat_result.st_mtime}-{stat_result.st_size}"
+    return f'"{hashlib.md5(etag_base.encode(), usedforsecurity=False).hexdigest()}"'
+
+async def serve_upload_file(request: Request, filename: str) -> Response:
+    """Respond with an uploaded file, honouring conditional and Range requests.
+
+    Range and multi-range handling (206, multipart/byteranges, If-Range) comes
+    from FileResponse. With UPLOAD_ACCEL_REDIRECT_PREFIX set, nginx streams
+    the body instead of this worker.
+    """
+    try:
+        path = get_file_path(filename)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="File not found")
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    headers = {"Cache-Control": UPLOAD_CACHE_CONTROL, "X-Content-Type-Options": "nosniff"}
+    if media_type not in INLINE_MEDIA_TYPES:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    # A blob's ETag is its name, so revalidation needs no disk access at all
+    digest = blob_digest(filename)
+    if digest is not None:
+        headers["ETag"] = file_etag(filename)
+        if is_not_modified(request, headers["ETag"]):
+            return not_modified_response(headers)
+
+    if UPLOAD_ACCEL_REDIRECT_PREFIX:
+        if not await run_in_threadpool(os.path.isfile, path):
+            raise HTTPException(status_code=404, detail="File not found")
+        relative_path = os.path.relpath(path, UPLOAD_DIR).replace(os.sep, "/")
+        headers["X-Accel-Redirect"] = UPLOAD_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + relative_path
+        return Response(media_type=media_type, headers=headers)
+
+    stat_result = await run_in_threadpool(_stat_file, path)
+    if stat_result is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    headers["ETag"] = file_etag(filename, stat_result)
+    headers["Last-Modified"] = formatdate(stat_result.st_mtime, usegmt=True)
+    if is_not_modified(request, headers["ETag"], stat_result.st_mtime):
+        return not_modified_response(headers)
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat_result) 
\ No newline at end of file
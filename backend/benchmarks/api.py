@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Benchmark the main API endpoints on seeded datasets and check for regressions.
+
+Brings the database to exactly each dataset size (seeding what is missing,
+dropping issues a previous run created), then drives the real app in-process
+with a concurrent client against GET /issues/, POST /issues/, POST /token and
+POST /upload/, reporting throughput and p50/p95/p99 per endpoint. Each
+endpoint is measured --repeat times and its best pass (lowest p95) is kept.
+The seeded database is reused across runs, so larger sizes are seeded once.
+Results are compared with a JSON baseline and the run fails when p95
+latency or throughput is worse by more than --threshold. Baselines are only
+meaningful on the machine and database they were recorded on; re-record one
+with --save-baseline.
+
+By default a scratch SQLite file in the temp directory is used; pass
+--database-url postgresql://... for a local Postgres.
+
+    cd backend && python -m benchmarks.api --sizes 10k,100k
+    cd backend && python run_tests.py --bench --sizes 1m --save-baseline
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import drive, find_regressions, print_table
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRATCH_DIR = os.path.join(tempfile.gettempdir(), "issues-bench")
+DEFAULT_DATABASE_URL = f"sqlite:///{os.path.join(SCRATCH_DIR, 'bench.db')}"
+BENCH_EMAIL = "bench-admin@example.com"
+BENCH_PASSWORD = "benchpassword"
+SEED_BATCH = 10_000
+DESCRIPTION = "Steps to reproduce: open the page, click save, observe the error. " * 3
+UPLOAD_BYTES = os.urandom(64 * 1024)
+
+
+def parse_size(value: str) -> int:
+    """"10k" -> 10000, "1m" -> 1000000"""
+    value = value.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(value[-1:], 1)
+    return int(float(value.rstrip("km")) * multiplier)
+
+
+def size_label(size: int) -> str:
+    for suffix, unit in (("m", 1_000_000), ("k", 1_000)):
+        if size >= unit and size % unit == 0:
+            return f"{size // unit}{suffix}"
+    return str(size)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10k", help="comma-separated dataset sizes, e.g. 10k,100k,1m")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL", DEFAULT_DATABASE_URL))
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per endpoint (POST /token runs a tenth)")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per endpoint first")
+    parser.add_argument("--repeat", type=int, default=3, help="measured passes per endpoint; the best one is kept")
+    parser.add_argument("--baseline", help="baseline JSON (default: benchmarks/baselines/api-<backend>.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run as the new baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("BENCH_REGRESSION_THRESHOLD", "0.25")),
+                        help="allowed relative slowdown before failing (0.25 = 25%%)")
+    parser.add_argument("--output", help="also write this run's results to a JSON file")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args):
+    """Point the app at the benchmark database before any app module is imported"""
+    os.makedirs(SCRATCH_DIR, exist_ok=True)
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    # Uploads start empty on every run, so content-addressed storage does the same work
+    os.environ["UPLOAD_DIR"] = tempfile.mkdtemp(prefix="uploads-", dir=SCRATCH_DIR)
+    os.environ.setdefault("LOG_DIR", os.path.join(SCRATCH_DIR, "logs"))
+
+
+async def prepare(size: int):
+    """Make the issues table hold exactly `size` seeded issues, then repair the counters"""
+    from sqlalchemy import delete, func, insert, select, text
+    from app import counters, crud, models, schemas
+    from app.database import AsyncSessionLocal, SessionLocal
+
+    async def ensure_user():
+        async with AsyncSessionLocal() as db:
+            user = await crud.get_user_by_email(db, BENCH_EMAIL)
+            if user is None:
+                user = await crud.create_user(db, schemas.UserCreate(email=BENCH_EMAIL, password=BENCH_PASSWORD, role=models.UserRole.ADMIN))
+            return user.id
+
+    reporter_id = await ensure_user()
+    severities, statuses = list(models.IssueSeverity), list(models.IssueStatus)
+    with SessionLocal() as db:
+        existing = db.scalar(select(func.count(models.Issue.id)))
+        if existing > size:
+            # Issues created by earlier runs, or a larger dataset: keep the first `size`
+            keep_max = db.scalar(select(models.Issue.id).order_by(models.Issue.id).offset(size - 1).limit(1)) if size else 0
+            db.execute(delete(models.Issue).where(models.Issue.id > keep_max))
+            if db.bind.dialect.name == "sqlite":
+                db.execute(text("DELETE FROM issues_fts WHERE rowid > :id"), {"id": keep_max})
+            db.commit()
+            counters.reconcile(db)
+            return
+        if existing == size:
+            return
+        started = time.perf_counter()
+        for start in range(existing, size, SEED_BATCH):
+            db.execute(insert(models.Issue), [
+                {"title": f"Bench issue {i}", "description": DESCRIPTION, "severity": severities[i % len(severities)],
+                 "status": statuses[i % len(statuses)], "reporter_id": reporter_id}
+                for i in range(start, min(size, start + SEED_BATCH))
+            ])
+            db.commit()
+        counters.reconcile(db)
+        print(f"Seeded {size - existing} issues in {time.perf_counter() - started:.1f}s")
+
+
+def scenarios(headers: dict) -> dict:
+    """name -> (make_request, share of --requests, max concurrency)"""
+    from app import passwords
+
+    async def list_issues(client, i):
+        return await client.get("/issues/", params={"limit": 50}, headers=headers)
+
+    async def create_issue(client, i):
+        return await client.post("/issues/", json={"title": f"Bench create {i}", "description": DESCRIPTION, "severity": "MEDIUM"}, headers=headers)
+
+    async def login(client, i):
+        return await client.post("/token", data={"username": BENCH_EMAIL, "password": BENCH_PASSWORD})
+
+    async def upload(client, i):
+        # Distinct bodies, so content-addressed storage writes every one
+        body = i.to_bytes(8, "big") + UPLOAD_BYTES
+        return await client.post("/upload/", files={"file": ("bench.txt", body, "text/plain")}, headers=headers)
+
+    return {
+        "GET /issues/": (list_issues, 1.0, None),
+        "POST /issues/": (create_issue, 1.0, None),
+        # bcrypt by design; more concurrent logins than the hash queue holds get 503s
+        "POST /token": (login, 0.1, passwords.PASSWORD_HASH_QUEUE_LIMIT),
+        "POST /upload/": (upload, 1.0, None),
+    }
+
+
+async def run_size(app, size: int, args) -> dict:
+    import httpx
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        token = (await client.post("/token", data={"username": BENCH_EMAIL, "password": BENCH_PASSWORD})).json()["access_token"]
+    results = {}
+    for name, (make_request, share, max_concurrency) in scenarios({"Authorization": f"Bearer {token}"}).items():
+        concurrency = min(args.concurrency, max_concurrency or args.concurrency)
+        total = max(1, int(args.requests * share))
+        await drive(app, name, make_request, total=max(1, int(args.warmup * share)), concurrency=concurrency)
+        passes = [await drive(app, name, make_request, total=total, concurrency=concurrency) for _ in range(args.repeat)]
+        best = min(passes, key=lambda result: result["p95_ms"])
+        results[f"{size_label(size)} {name}"] = {**best, "name": f"{size_label(size)} {name}"}
+    return results
+
+
+async def run_sizes(app, sizes: list, args) -> dict:
+    # One event loop for every size: the async engine's pool is bound to the
+    # loop it first ran on
+    results = {}
+    for size in sizes:
+        await prepare(size)
+        results.update(await run_size(app, size, args))
+    return results
+
+
+def baseline_path(args) -> str:
+    if args.baseline:
+        return args.baseline
+    backend = args.database_url.split(":", 1)[0].split("+", 1)[0]
+    return os.path.join(BENCH_DIR, "baselines", f"api-{backend}.json")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    configure_environment(args)
+    from app import logging as app_logging
+    from app.main import app
+
+    with open(os.path.join(SCRATCH_DIR, "stdout.log"), "a") as log_output:
+        # Keep request logging (it is part of the cost) but out of the report
+        app_logging.configure_logging(stdout=log_output)
+        sizes = sorted(parse_size(s) for s in args.sizes.split(","))
+        results = asyncio.run(run_sizes(app, sizes, args))
+        app_logging.flush_logs()
+    shutil.rmtree(os.environ["UPLOAD_DIR"], ignore_errors=True)
+    print_table(list(results.values()))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    path = baseline_path(args)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        recorded = {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+                    "requests": args.requests, "concurrency": args.concurrency, "repeat": args.repeat}
+        with open(path, "w") as f:
+            json.dump({"recorded_with": recorded, "results": results}, f, indent=2)
+        print(f"Baseline written to {path}")
+        return 0
+    if not os.path.exists(path):
+        print(f"No baseline at {path}; record one with --save-baseline")
+        return 0
+    with open(path) as f:
+        baseline = json.load(f)["results"]
+    regressions = find_regressions(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No regressions beyond {args.threshold:.0%} against {path}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
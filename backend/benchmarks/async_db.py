@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Compare sync (threadpool) and async database access under concurrency.
+
+Two minimal apps run the same issue-list query: one as a sync `def` route
+using SessionLocal, which Starlette runs in its ~40-slot threadpool, and one
+as an `async def` route using AsyncSessionLocal. Point DATABASE_URL at a
+local Postgres for realistic numbers; SQLite works but has no network
+round-trip. --db-latency-ms adds a simulated round-trip per request
+(time.sleep for sync, asyncio.sleep for async) to show the threadpool
+ceiling without a remote database.
+
+    cd backend && python -m benchmarks.async_db --concurrency 200 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from sqlalchemy import select
+
+from app.database import AsyncSessionLocal, SessionLocal, engine
+from app.models import Base, Issue, IssueSeverity, User
+from benchmarks.common import drive, print_table
+
+PAGE_SIZE = 50
+
+
+def seed(issue_count):
+    """Make sure there are at least `issue_count` issues to page through"""
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        existing = db.query(Issue).count()
+        if existing >= issue_count:
+            return
+        user = db.query(User).filter(User.email == "bench@example.com").first()
+        if user is None:
+            user = User(email="bench@example.com", hashed_password="x")
+            db.add(user)
+            db.flush()
+        db.add_all(
+            Issue(title=f"Bench issue {i}", description="Seeded by benchmarks.async_db", severity=IssueSeverity.LOW, reporter_id=user.id)
+            for i in range(existing, issue_count)
+        )
+        db.commit()
+
+
+def build_apps(latency):
+    query = select(Issue.id, Issue.title, Issue.status).order_by(Issue.id).limit(PAGE_SIZE)
+
+    sync_app = FastAPI()
+
+    @sync_app.get("/issues/")
+    def sync_issues():
+        with SessionLocal() as db:
+            rows = db.execute(query).mappings().all()
+        if latency:
+            time.sleep(latency)
+        return [dict(row) for row in rows]
+
+    async_app = FastAPI()
+
+    @async_app.get("/issues/")
+    async def async_issues():
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(query)).mappings().all()
+        if latency:
+            await asyncio.sleep(latency)
+        return [dict(row) for row in rows]
+
+    return sync_app, async_app
+
+
+async def main(args):
+    seed(args.issues)
+    sync_app, async_app = build_apps(args.db_latency_ms / 1000)
+
+    async def list_issues(client, i):
+        return await client.get("/issues/")
+
+    results = []
+    for name, app in (("sync", sync_app), ("async", async_app)):
+        # Warm up connections before measuring
+        await drive(app, name, list_issues, total=args.concurrency, concurrency=args.concurrency)
+        results.append(await drive(app, name, list_issues, total=args.requests, concurrency=args.concurrency))
+    print_table(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--issues", type=int, default=1000)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    asyncio.run(main(parser.parse_args()))
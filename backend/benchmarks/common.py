@@ -0,0 +1,95 @@
+"""
+Helpers shared by the benchmark scripts
+"""
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(name, latencies, elapsed, errors=0):
+    """Throughput and latency percentiles (in ms) for one benchmark run"""
+    return {
+        "name": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def drive(app, name, make_request, total, concurrency):
+    """Send `total` requests to an ASGI app in-process, `concurrency` at a time.
+
+    `make_request(client, i)` issues request number i and returns the response.
+    """
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    # Unhandled app errors become 500s and are counted, instead of ending the run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                response = await make_request(client, i)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+
+    return summarize(name, latencies, elapsed, errors)
+
+
+def print_table(results):
+    """Print benchmark summaries as an aligned table"""
+    columns = ["name", "requests", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in results)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for result in results:
+        print("  ".join(str(result[c]).ljust(widths[c]) for c in columns))
+
+
+# Lower is better for latencies, higher for throughput
+COMPARED_METRICS = {"p95_ms": 1, "throughput_rps": -1}
+
+
+def find_regressions(results, baseline, threshold):
+    """Describe each result worse than its baseline entry by more than `threshold` (0.2 = 20%).
+
+    `results` and `baseline` map a benchmark key to a summarize() dict; keys
+    missing from the baseline are not compared. Failed requests always count.
+    """
+    regressions = []
+    for key, result in results.items():
+        if result.get("errors"):
+            regressions.append(f"{key}: {result['errors']} of {result['requests']} requests failed")
+        reference = baseline.get(key)
+        if not reference:
+            continue
+        for metric, direction in COMPARED_METRICS.items():
+            before, after = reference[metric], result[metric]
+            if not before:
+                continue
+            change = (after - before) / before * direction
+            if change > threshold:
+                regressions.append(f"{key}: {metric} {before} -> {after} ({change:+.0%} worse)")
+    return regressions
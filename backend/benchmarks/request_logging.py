@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Measure per-request logging overhead for each logging configuration.
+
+A minimal app behind RequestIDMiddleware logs a few INFO lines per request,
+the way the API handlers do. "none" has no sinks at all; "sync" is the
+previous setup, where each of the three sinks serializes and writes the
+message on the event loop; "async" serializes once and leaves the writes to
+the writer thread; "async+sampled" additionally keeps 10% of the api
+logger's INFO lines. stdout and the log files go to a scratch directory.
+
+    cd backend && python -m benchmarks.request_logging --requests 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from loguru import logger
+
+from app import logging as app_logging
+from benchmarks.common import drive, print_table
+
+CONFIGURATIONS = {
+    "none": None,
+    "sync": dict(async_mode=False, sample_rates={}),
+    "async": dict(async_mode=True, sample_rates={}),
+    "async+sampled": dict(async_mode=True, sample_rates={"api": 0.1}),
+}
+
+
+def build_app(lines_per_request):
+    app = FastAPI()
+    app.add_middleware(app_logging.RequestIDMiddleware)
+
+    @app.get("/issues/{issue_id}")
+    async def read_issue(issue_id: int):
+        for i in range(lines_per_request):
+            app_logging.api_logger.info(f"Fetching issue {issue_id} step {i}")
+        return {"id": issue_id}
+
+    return app
+
+
+async def main(args):
+    app = build_app(args.lines)
+
+    async def get_issue(client, i):
+        return await client.get(f"/issues/{i}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as log_dir, open(os.path.join(log_dir, "stdout.log"), "w") as stdout:
+        for name, options in CONFIGURATIONS.items():
+            if options is None:
+                logger.remove()
+            else:
+                app_logging.configure_logging(stdout=stdout, log_dir=log_dir, diagnose=False, **options)
+            # Warm up routing and the sinks before timing
+            await drive(app, name, get_issue, total=100, concurrency=args.concurrency)
+            results.append(await drive(app, name, get_issue, total=args.requests, concurrency=args.concurrency))
+            app_logging.flush_logs()
+        # Stop the writer thread before the scratch directory goes away
+        app_logging.configure_logging(async_mode=False, stdout=stdout, log_dir=log_dir)
+        logger.remove()
+
+    print_table(results)
+    # The event loop is the bottleneck, so time per request is 1 / throughput
+    baseline = 1 / results[0]["throughput_rps"]
+    for result in results[1:]:
+        overhead = (1 / result["throughput_rps"] - baseline) * 1e6
+        print(f"{result['name']}: {overhead:.0f} us of logging per request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--lines", type=int, default=3, help="INFO lines logged per request")
+    asyncio.run(main(parser.parse_args()))
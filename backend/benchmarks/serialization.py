@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Compare issue list serialization: FastAPI's response model vs serialization.
+
+"current" loads Issue objects and runs them through the list[schemas.Issue]
+response model the way FastAPI does for a route returning them; "fast" loads
+only ISSUE_COLUMNS and encodes them with serialization.issue_list_json, as
+GET /issues/ now does. Both read from a scratch in-memory SQLite database.
+
+    cd backend && python -m benchmarks.serialization --sizes 100,1000,10000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.routing import serialize_response
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app import crud, models, serialization
+from app.main import app
+
+# FastAPI's own handling of a list[schemas.Issue] response model: validate the
+# returned objects against the model, then encode them
+list_route = next(route for route in app.routes if getattr(route, "path", None) == "/issues/" and "GET" in route.methods)
+
+
+async def seed(session_factory, count):
+    async with session_factory() as db:
+        await db.execute(insert(models.User), [{"id": 1, "email": "bench@example.com", "hashed_password": "x", "role": models.UserRole.ADMIN}])
+        await db.execute(insert(models.Issue), [
+            {"title": f"Issue {i}", "description": "Steps to reproduce " * 10, "severity": list(models.IssueSeverity)[i % 4], "reporter_id": 1}
+            for i in range(count)
+        ])
+        await db.commit()
+
+
+async def current_path(session_factory, limit):
+    """ORM objects through the response model, as read_issues used to return them"""
+    async with session_factory() as db:
+        issues = await crud.get_issues(db, limit=limit)
+        return await serialize_response(field=list_route.response_field, response_content=issues, dump_json=True)
+
+
+async def fast_path(session_factory, limit):
+    async with session_factory() as db:
+        rows = await crud.get_issues(db, limit=limit, columns=serialization.ISSUE_COLUMNS)
+        return serialization.issue_list_json(rows)
+
+
+async def best_of(path, session_factory, limit, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await path(session_factory, limit)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+async def main(args):
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    await seed(session_factory, max(sizes))
+
+    print(f"{'items':>7}  {'current items/s':>16}  {'fast items/s':>13}  {'speedup':>7}")
+    for size in sizes:
+        current = await best_of(current_path, session_factory, size, args.repeat)
+        fast = await best_of(fast_path, session_factory, size, args.repeat)
+        print(f"{size:>7}  {size / current:>16,.0f}  {size / fast:>13,.0f}  {current / fast:>6.1f}x")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000", help="comma-separated list lengths")
+    parser.add_argument("--repeat", type=int, default=3, help="passes per size; the fastest is reported")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Compare buffered and streaming uploads under concurrency.
+
+"buffered" is the previous implementation: `await file.read()` of the whole
+upload followed by a blocking write on the event loop. "streaming" is
+upload.save_upload_file, which copies UPLOAD_CHUNK_SIZE chunks to a temp file
+in the threadpool and renames it into place. Both run as minimal apps in a
+scratch UPLOAD_DIR. Peak Python heap during each run is measured with
+tracemalloc; the multipart spool files Starlette writes are on disk and not
+counted.
+
+    cd backend && python -m benchmarks.uploads --concurrency 10 --size-mb 10
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import tracemalloc
+import uuid
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, File, UploadFile
+
+from app import upload
+from benchmarks.common import drive, print_table
+
+
+def build_apps():
+    buffered_app = FastAPI()
+
+    @buffered_app.post("/upload/")
+    async def buffered_upload(file: UploadFile = File(...)):
+        content = await file.read()
+        path = os.path.join(upload.UPLOAD_DIR, f"{uuid.uuid4()}{upload.get_file_extension(file.filename)}")
+        with open(path, "wb") as f:
+            f.write(content)
+        return {"filename": os.path.basename(path)}
+
+    streaming_app = FastAPI()
+
+    @streaming_app.post("/upload/")
+    async def streaming_upload(file: UploadFile = File(...)):
+        return {"filename": await upload.save_upload_file(file)}
+
+    return buffered_app, streaming_app
+
+
+def multipart_body(payload, boundary="benchmarkboundary"):
+    """Encode the request body once so the client adds no per-request copies"""
+    head = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="bench.txt"\r\n'
+        "Content-Type: text/plain\r\n\r\n"
+    ).encode()
+    body = head + payload + f"\r\n--{boundary}--\r\n".encode()
+    return body, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+async def main(args):
+    payload = os.urandom(args.size_mb * 1024 * 1024)
+    upload.MAX_FILE_SIZE = len(payload)
+    body, headers = multipart_body(payload)
+    del payload
+
+    view = memoryview(body)
+
+    async def chunks():
+        # Stream the body like a socket would instead of one giant ASGI message
+        for start in range(0, len(view), 64 * 1024):
+            yield bytes(view[start:start + 64 * 1024])
+
+    async def send_file(client, i):
+        return await client.post("/upload/", content=chunks(), headers=headers)
+
+    results = []
+    for name, app in zip(("buffered", "streaming"), build_apps()):
+        with tempfile.TemporaryDirectory() as upload_dir:
+            upload.UPLOAD_DIR = upload_dir
+            tracemalloc.start()
+            result = await drive(app, name, send_file, total=args.requests, concurrency=args.concurrency)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        results.append(result)
+        print(f"{name}: peak traced memory {peak / 2**20:.1f} MB")
+    print_table(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--size-mb", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 """
 Simple test runner for the backend
+
+    python run_tests.py                  # tests with coverage
+    python run_tests.py --bench [ARGS]   # API benchmarks, see benchmarks/api.py;
+                                         # fails on a regression against the baseline
 """
 import subprocess
 import sys
@@ -25,5 +29,17 @@ def run_tests():
         print(f"❌ Error running tests: {e}")
         sys.exit(1)
 
+def run_benchmarks(args):
+    """Run the API benchmark suite, passing extra arguments through"""
+    result = subprocess.run([sys.executable, "-m", "benchmarks.api", *args], cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode == 0:
+        print("✅ Benchmarks passed!")
+    else:
+        print("❌ Benchmarks regressed!")
+        sys.exit(result.returncode)
+
 if __name__ == "__main__":
-    run_tests() 
\ No newline at end of file
+    if "--bench" in sys.argv[1:]:
+        run_benchmarks([arg for arg in sys.argv[1:] if arg != "--bench"])
+    else:
+        run_tests() 
\ No newline at end of file
@@ -1,39 +1,54 @@
+import asyncio
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.pool import StaticPool
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Mounted at import, so it has to be switched on before app.main loads
+os.environ.setdefault("PROFILING_ENABLED", "true")
 
-from app.database import Base
+from app.models import Base
 from app.main import app
-from app.deps import get_db
-from app import crud, models, schemas
+from app.deps import get_db, token_cache, revoked_versions
+from app import crud, dashboard, events, models, schemas, sql_instrumentation
 
 # Test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
-engine = create_engine(
+engine = create_async_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args={"check_same_thread": False},
     poolclass=StaticPool,
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingSessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+sql_instrumentation.instrument(engine.sync_engine)
 
-# Create test database tables
-Base.metadata.create_all(bind=engine)
+def run(coro):
+    """Run a coroutine (e.g. an async crud call) from sync test code"""
+    return asyncio.run(coro)
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
+async def reset_schema():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+async def override_get_db():
+    async with TestingSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 app.dependency_overrides[get_db] = override_get_db
 
+@pytest.fixture(autouse=True)
+def reset_database():
+    run(reset_schema())
+    token_cache.clear()
+    revoked_versions.clear()
+    dashboard.summary_cache.clear()
+    events.broker.clear()
+    yield
+
 @pytest.fixture
 def client():
     return TestClient(app)
@@ -44,7 +59,7 @@ def db_session():
     try:
         yield db
     finally:
-        db.close()
+        run(db.close())
 
 @pytest.fixture
 def test_user(db_session):
@@ -53,7 +68,7 @@ def test_user(db_session):
         "password": "testpassword",
         "role": models.UserRole.REPORTER
     }
-    user = crud.create_user(db_session, schemas.UserCreate(**user_data))
+    user = run(crud.create_user(db_session, schemas.UserCreate(**user_data)))
     return user
 
 @pytest.fixture
@@ -63,7 +78,7 @@ def test_admin_user(db_session):
         "password": "adminpassword",
         "role": models.UserRole.ADMIN
     }
-    user = crud.create_user(db_session, schemas.UserCreate(**user_data))
+    user = run(crud.create_user(db_session, schemas.UserCreate(**user_data)))
     return user
 
 @pytest.fixture
@@ -74,5 +89,5 @@ def test_issue(db_session, test_user):
         "severity": models.IssueSeverity.MEDIUM,
         "status": models.IssueStatus.OPEN
     }
-    issue = crud.create_issue(db_session, schemas.IssueCreate(**issue_data), test_user.id)
+    issue = run(crud.create_issue(db_session, schemas.IssueCreate(**issue_data), test_user.id))
     return issue 
\ No newline at end of file
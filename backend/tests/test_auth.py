@@ -4,7 +4,10 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from tests.conftest import client, test_user
+from tests.conftest import client, test_user, test_admin_user, db_session, run
+from jose import jwt
+from passlib.hash import bcrypt
+from app import crud, deps, models, passwords, schemas
 
 def test_create_user(client):
     """Test user registration"""
@@ -75,4 +78,111 @@ def test_get_current_user_invalid_token(client):
     """Test getting current user with invalid token"""
     headers = {"Authorization": "Bearer invalid_token"}
     response = client.get("/users/me/", headers=headers)
-    assert response.status_code == 401 
\ No newline at end of file
+    assert response.status_code == 401 
+
+def login(client, email, password):
+    """Helper function to get authentication headers"""
+    response = client.post("/token", data={"username": email, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def test_token_carries_role_and_version(client, test_user):
+    """Test that access tokens include the claims used by the auth fast path"""
+    headers = login(client, "test@example.com", "testpassword")
+    claims = jwt.decode(headers["Authorization"].split()[1], deps.SECRET_KEY, algorithms=[deps.ALGORITHM])
+    assert claims["role"] == "REPORTER"
+    assert claims["ver"] == 0
+
+def test_cached_token_skips_user_lookup(client, test_user, monkeypatch):
+    """Test that only the first request with a token loads the user"""
+    headers = login(client, "test@example.com", "testpassword")
+    lookups = []
+    get_user = crud.get_user
+    async def counting_get_user(db, user_id):
+        lookups.append(user_id)
+        return await get_user(db, user_id)
+    monkeypatch.setattr(crud, "get_user", counting_get_user)
+
+    for _ in range(3):
+        assert client.get("/issues/", headers=headers).status_code == 200
+    assert lookups == [test_user.id]
+
+def test_role_downgrade_revokes_tokens(client, db_session, test_admin_user):
+    """Test that a role change takes effect for tokens that are already cached"""
+    maintainer = run(crud.create_user(db_session, schemas.UserCreate(email="maintainer@example.com", password="maintainerpassword", role=models.UserRole.MAINTAINER)))
+    maintainer_headers = login(client, "maintainer@example.com", "maintainerpassword")
+    assert client.get("/issues/", headers=maintainer_headers).status_code == 200
+
+    admin_headers = login(client, "admin@example.com", "adminpassword")
+    response = client.put(f"/users/{maintainer.id}/role", json={"role": "REPORTER"}, headers=admin_headers)
+    assert response.status_code == 200
+    assert response.json()["role"] == "REPORTER"
+
+    assert client.get("/issues/", headers=maintainer_headers).status_code == 401
+    new_headers = login(client, "maintainer@example.com", "maintainerpassword")
+    assert client.get("/users/me/", headers=new_headers).json()["role"] == "REPORTER"
+
+def test_revocation_survives_a_flood_of_revocations(client, db_session, test_admin_user):
+    """Test that newer revocations cannot push out one whose tokens are still cached"""
+    maintainer = run(crud.create_user(db_session, schemas.UserCreate(email="maintainer@example.com", password="maintainerpassword", role=models.UserRole.MAINTAINER)))
+    maintainer_headers = login(client, "maintainer@example.com", "maintainerpassword")
+    assert client.get("/issues/", headers=maintainer_headers).status_code == 200
+
+    admin_headers = login(client, "admin@example.com", "adminpassword")
+    assert client.put(f"/users/{maintainer.id}/role", json={"role": "REPORTER"}, headers=admin_headers).status_code == 200
+    for user_id in range(1000, 1000 + deps.revoked_versions.maxsize):
+        deps.apply_revocation(user_id, 1)
+    assert deps.revoked_versions.get(maintainer.id) is None
+
+    assert client.get("/issues/", headers=maintainer_headers).status_code == 401
+
+def test_revocations_from_other_workers(client, test_user, monkeypatch):
+    """Test that cached tokens are re-verified until this worker hears every revocation"""
+    headers = login(client, "test@example.com", "testpassword")
+    lookups = []
+    get_user = crud.get_user
+    async def counting_get_user(db, user_id):
+        lookups.append(user_id)
+        return await get_user(db, user_id)
+    monkeypatch.setattr(crud, "get_user", counting_get_user)
+    monkeypatch.setattr(deps, "AUTH_REVOCATIONS_REDIS", True)
+    monkeypatch.setattr(deps, "ensure_revocation_listener", lambda: None)
+
+    # Not subscribed to the revocations channel: nothing is served from the cache
+    monkeypatch.setattr(deps, "_revocations_live", False)
+    for _ in range(2):
+        assert client.get("/issues/", headers=headers).status_code == 200
+    assert lookups == [test_user.id] * 2
+
+    # Subscribed: the cache is used, and a revocation received from another worker applies at once
+    monkeypatch.setattr(deps, "_revocations_live", True)
+    assert client.get("/issues/", headers=headers).status_code == 200
+    assert len(lookups) == 2
+    deps.apply_revocation(test_user.id, test_user.token_version + 1)
+    deps.apply_revocation(test_user.id, test_user.token_version)
+    assert client.get("/issues/", headers=headers).status_code == 401
+
+def test_update_user_role_requires_admin(client, test_user):
+    """Test that only admins can change roles"""
+    headers = login(client, "test@example.com", "testpassword")
+    response = client.put(f"/users/{test_user.id}/role", json={"role": "ADMIN"}, headers=headers)
+    assert response.status_code == 403
+
+
+def test_login_rejected_when_hash_queue_full(client, test_user, monkeypatch):
+    """Test that logins are shed with 503 instead of queueing without bound"""
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_QUEUE_LIMIT", 0)
+    response = client.post("/token", data={"username": "test@example.com", "password": "testpassword"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(passwords.PASSWORD_HASH_RETRY_AFTER)
+
+def test_login_rehashes_outdated_cost(client, db_session, test_user):
+    """Test that a hash made with another bcrypt cost is upgraded on login"""
+    old_hash = bcrypt.using(rounds=4).hash("testpassword")
+    run(crud.set_password_hash(db_session, test_user, old_hash))
+    login(client, "test@example.com", "testpassword")
+
+    user = run(crud.get_user_by_email(db_session, "test@example.com"))
+    run(db_session.refresh(user))
+    assert user.hashed_password != old_hash
+    assert bcrypt.from_string(user.hashed_password).rounds == passwords.BCRYPT_ROUNDS
+    login(client, "test@example.com", "testpassword")
\ No newline at end of file
@@ -0,0 +1,29 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.api import parse_size, size_label
+from benchmarks.common import find_regressions
+
+def result(p95_ms, throughput_rps):
+    return {"p95_ms": p95_ms, "throughput_rps": throughput_rps}
+
+def test_dataset_sizes_round_trip():
+    """Test that --sizes accepts k/m suffixes and labels results the same way"""
+    assert [parse_size(s) for s in "10k,100K,1m,2500".split(",")] == [10_000, 100_000, 1_000_000, 2_500]
+    assert [size_label(n) for n in (10_000, 1_000_000, 2_500)] == ["10k", "1m", "2500"]
+
+def test_regressions_beyond_threshold_only():
+    """Test that slower p95 or lower throughput past the threshold is reported, in either direction"""
+    baseline = {"10k GET /issues/": result(100, 200), "10k POST /token": result(50, 20)}
+    current = {
+        "10k GET /issues/": result(119, 170),   # within 20%
+        "10k POST /token": result(70, 10),      # 40% slower, half the throughput
+        "1m GET /issues/": result(900, 5),      # no baseline: not compared
+    }
+    regressions = find_regressions(current, baseline, threshold=0.2)
+    assert len(regressions) == 2
+    assert all(r.startswith("10k POST /token") for r in regressions)
+    assert find_regressions({"10k GET /issues/": result(50, 400)}, baseline, threshold=0.2) == []
+    assert find_regressions({"1m POST /token": {**result(1, 1), "errors": 3, "requests": 50}}, baseline, threshold=0.2) == ["1m POST /token: 3 of 50 requests failed"]
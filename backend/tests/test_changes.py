@@ -0,0 +1,99 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta, timezone
+from tests.conftest import client, test_user, test_admin_user, db_session, run
+from app import changes
+
+def get_auth_headers(client, email, password):
+    """Helper function to get authentication headers"""
+    response = client.post("/token", data={"username": email, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+ISSUE = {"title": "Crash", "description": "On save", "severity": "HIGH"}
+
+def sync(client, headers, since=None, limit=500):
+    params = {"limit": limit}
+    if since:
+        params["since"] = since
+    response = client.get("/issues/changes", params=params, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+def test_changes_return_only_churn_since_cursor(client, test_admin_user):
+    """Test that a sync after the first one carries just the writes and deletes since"""
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    ids = [client.post("/issues/", json=ISSUE, headers=headers).json()["id"] for _ in range(3)]
+
+    full = sync(client, headers)
+    assert [issue["id"] for issue in full["changed"]] == ids
+    assert full["deleted"] == [] and full["has_more"] is False
+    assert sync(client, headers, full["cursor"]) == {**full, "changed": []}
+
+    client.put(f"/issues/{ids[0]}", json={"status": "TRIAGED"}, headers=headers)
+    client.put(f"/issues/{ids[0]}", json={"status": "IN_PROGRESS"}, headers=headers)
+    client.delete(f"/issues/{ids[1]}", headers=headers)
+    created = client.post("/issues/bulk", json={"items": [ISSUE]}, headers=headers).json()["results"][0]["issue"]
+    client.post("/issues/transition", json={"to_status": "DONE", "filter": {"status": ["OPEN"]}}, headers=headers)
+
+    delta = sync(client, headers, full["cursor"])
+    # Each issue appears once, in its latest state
+    assert sorted((issue["id"], issue["status"]) for issue in delta["changed"]) == [
+        (ids[0], "IN_PROGRESS"), (ids[2], "DONE"), (created["id"], "DONE"),
+    ]
+    assert delta["deleted"] == [ids[1]]
+    assert "change_seq" not in delta["changed"][0]
+
+def test_changes_page_with_has_more(client, test_admin_user):
+    """Test that small batches page through every change exactly once"""
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    client.post("/issues/bulk", json={"items": [ISSUE] * 5}, headers=headers)
+    doomed = client.post("/issues/", json=ISSUE, headers=headers).json()["id"]
+    client.delete(f"/issues/{doomed}", headers=headers)
+
+    seen, deleted, cursor, batches = [], [], None, 0
+    while True:
+        batch = sync(client, headers, cursor, limit=2)
+        seen += [issue["id"] for issue in batch["changed"]]
+        deleted += batch["deleted"]
+        cursor = batch["cursor"]
+        batches += 1
+        if not batch["has_more"]:
+            break
+    assert len(seen) == len(set(seen)) == 5
+    assert deleted == [doomed]
+    assert batches == 3
+
+def test_reporters_only_sync_their_issues(client, test_user, test_admin_user):
+    """Test that reporters get changes and deletes only for issues they reported"""
+    admin_headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    user_headers = get_auth_headers(client, "test@example.com", "testpassword")
+    other = client.post("/issues/", json=ISSUE, headers=admin_headers).json()["id"]
+    own = client.post("/issues/", json=ISSUE, headers=user_headers).json()["id"]
+    client.delete(f"/issues/{other}", headers=admin_headers)
+    client.delete(f"/issues/{own}", headers=admin_headers)
+
+    batch = sync(client, user_headers)
+    assert batch["changed"] == [] and batch["deleted"] == [own]
+
+def test_changes_cursor_errors(client, db_session, test_admin_user):
+    """Test that bad cursors are rejected and cursors older than purged tombstones expire"""
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    assert client.get("/issues/changes?since=bogus", headers=headers).status_code == 400
+    assert client.get("/issues/changes", headers={}).status_code == 401
+
+    first = client.post("/issues/", json=ISSUE, headers=headers).json()["id"]
+    cursor = sync(client, headers)["cursor"]
+    client.post("/issues/", json=ISSUE, headers=headers)
+    client.delete(f"/issues/{first}", headers=headers)
+
+    purged = run(db_session.run_sync(changes.purge_tombstones, datetime.now(timezone.utc) + timedelta(days=changes.ISSUE_TOMBSTONE_RETENTION_DAYS + 1)))
+    assert purged == 1
+    response = client.get("/issues/changes", params={"since": cursor}, headers=headers)
+    assert response.status_code == 410
+    # Starting over still works, and its cursor is current
+    fresh = sync(client, headers)
+    assert len(fresh["changed"]) == 1
+    assert sync(client, headers, fresh["cursor"])["changed"] == []
@@ -0,0 +1,40 @@
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.conftest import client
+from app.database import InstrumentedQueuePool
+
+def test_pool_checkout_timeout_is_counted(tmp_path):
+    """Test that exhausting the pool records a timeout"""
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    before = REGISTRY.get_sample_value("database_pool_checkout_timeouts_total", {"engine": "sync"}) or 0
+
+    held = engine.connect()
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+    held.close()
+
+    assert engine.pool.timeouts == 1
+    assert engine.pool.wait_seconds >= 0.05
+    assert REGISTRY.get_sample_value("database_pool_checkout_timeouts_total", {"engine": "sync"}) == before + 1
+    engine.dispose()
+
+def test_detailed_health_reports_pool(client):
+    """Test that the detailed health check includes pool usage"""
+    response = client.get("/health/detailed")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "healthy"
+    assert set(data["pool"]) == {"sync", "async"}
+    assert "checked_out" in data["pool"]["sync"]
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.conftest import client, test_user, test_admin_user, db_session, run, TestingSessionLocal
+from app import deps, events, models, schemas
+from app.deps import get_db
+from app.main import app
+
+def get_auth_headers(client, email, password):
+    """Helper function to get authentication headers"""
+    response = client.post("/token", data={"username": email, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def parse_events(body):
+    """(id, event, data) for each event in an SSE body, skipping comments and retry hints"""
+    parsed = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if not line.startswith(":") and ": " in line)
+        if "event" in fields:
+            parsed.append((int(fields["id"]), fields["event"], json.loads(fields["data"])))
+    return parsed
+
+@pytest.fixture
+def short_streams(monkeypatch):
+    monkeypatch.setattr(events, "ISSUE_STREAM_MAX_SECONDS", 0.2)
+    monkeypatch.setattr(events, "ISSUE_STREAM_KEEPALIVE_SECONDS", 0.1)
+
+REPORTER = schemas.CurrentUser(id=1, email="r@example.com", role=models.UserRole.REPORTER, token_version=0)
+ADMIN = schemas.CurrentUser(id=2, email="a@example.com", role=models.UserRole.ADMIN, token_version=0)
+
+def test_stream_replays_after_last_event_id(client, test_user, test_admin_user, short_streams):
+    """Test that a reconnecting client gets the changes it missed, in order"""
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    issue = {"title": "Crash", "description": "On save", "severity": "HIGH"}
+    first = client.post("/issues/", json=issue, headers=headers).json()
+    client.put(f"/issues/{first['id']}", json={"status": "TRIAGED"}, headers=headers)
+    client.delete(f"/issues/{first['id']}", headers=headers)
+
+    response = client.get("/issues/stream", headers={**headers, "Last-Event-ID": "1"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    (updated_id, updated, issue), deleted = parse_events(response.text)
+    assert (updated_id, updated, issue["id"], issue["status"]) == (2, "updated", first["id"], "TRIAGED")
+    assert deleted == (3, "deleted", {"id": first["id"], "reporter_id": first["reporter_id"]})
+    assert ": keepalive" in response.text
+
+def test_stream_filters_reporters_to_their_issues(client, test_user, test_admin_user, short_streams):
+    """Test that reporters only receive events for issues they reported"""
+    admin_headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    user_headers = get_auth_headers(client, "test@example.com", "testpassword")
+    issue = {"title": "Crash", "description": "On save", "severity": "HIGH"}
+    client.post("/issues/", json=issue, headers=admin_headers)
+    own = client.post("/issues/", json=issue, headers=user_headers).json()
+
+    # EventSource cannot set headers, so it opens the stream with a ticket
+    ticket = client.post("/issues/stream/ticket", headers=user_headers).json()["ticket"]
+    response = client.get(f"/issues/stream?ticket={ticket}", headers={"Last-Event-ID": "0"})
+    assert [(event_id, kind, data["id"]) for event_id, kind, data in parse_events(response.text)] == [(2, "created", own["id"])]
+
+def test_stream_requires_auth(client):
+    """Test that the stream rejects anonymous clients"""
+    assert client.get("/issues/stream").status_code == 401
+    assert client.get("/issues/stream?ticket=bogus").status_code == 401
+
+def test_stream_tickets_are_single_purpose(client, test_user, short_streams, monkeypatch):
+    """Test that access tokens are not taken in the URL and tickets only open the stream"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    token = headers["Authorization"].split(" ", 1)[1]
+    response = client.post("/issues/stream/ticket", headers=headers)
+    assert response.json()["expires_in"] == deps.STREAM_TICKET_SECONDS
+    ticket = response.json()["ticket"]
+
+    assert client.get(f"/issues/stream?ticket={token}").status_code == 401
+    assert client.get(f"/issues/stream?access_token={token}").status_code == 401
+    assert client.get("/issues/", headers={"Authorization": f"Bearer {ticket}"}).status_code == 401
+    assert client.get(f"/issues/stream?ticket={ticket}").status_code == 200
+
+    monkeypatch.setattr(deps, "STREAM_TICKET_SECONDS", -1)
+    expired = client.post("/issues/stream/ticket", headers=headers).json()["ticket"]
+    assert client.get(f"/issues/stream?ticket={expired}").status_code == 401
+
+def test_stream_releases_session_before_streaming(client, test_user, short_streams, monkeypatch):
+    """Test that the session used to authenticate is closed before events are streamed"""
+    open_sessions = []
+    async def tracking_get_db():
+        async with TestingSessionLocal() as db:
+            open_sessions.append(db)
+            try:
+                yield db
+            finally:
+                open_sessions.remove(db)
+    monkeypatch.setitem(app.dependency_overrides, get_db, tracking_get_db)
+    seen = []
+    stream = events.stream
+    async def recording_stream(user, last_event_id=None):
+        seen.append(len(open_sessions))
+        async for chunk in stream(user, last_event_id):
+            yield chunk
+    monkeypatch.setattr(events, "stream", recording_stream)
+
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    assert client.get("/issues/stream", headers=headers).status_code == 200
+    assert seen == [0]
+
+def test_stream_resyncs_when_resume_point_is_gone(client, test_admin_user, short_streams, monkeypatch):
+    """Test that a resume point older than the buffer, or from before a restart, gets a resync"""
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    monkeypatch.setattr(events, "broker", events.Broadcaster(queue_size=10, replay_size=2))
+    issue = {"title": "Crash", "description": "On save", "severity": "HIGH"}
+    for _ in range(3):
+        client.post("/issues/", json=issue, headers=headers)
+
+    response = client.get("/issues/stream", headers={**headers, "Last-Event-ID": "0"})
+    assert parse_events(response.text) == [(3, "resync", {})]
+    response = client.get("/issues/stream", headers={**headers, "Last-Event-ID": "1"})
+    assert [event[:2] for event in parse_events(response.text)] == [(2, "created"), (3, "created")]
+    response = client.get("/issues/stream", headers={**headers, "Last-Event-ID": "99"})
+    assert parse_events(response.text) == [(3, "resync", {})]
+
+def test_bulk_transition_publishes_resync(client, test_admin_user, short_streams):
+    """Test that set-based transitions, which never load rows, tell clients to refetch"""
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    client.post("/issues/", json={"title": "Crash", "description": "On save", "severity": "HIGH"}, headers=headers)
+    client.post("/issues/transition", json={"to_status": "DONE", "filter": {}, "dry_run": True}, headers=headers)
+    client.post("/issues/transition", json={"to_status": "DONE", "filter": {}}, headers=headers)
+
+    response = client.get("/issues/stream", headers={**headers, "Last-Event-ID": "1"})
+    assert parse_events(response.text) == [(2, "resync", {})]
+
+def test_live_events_and_overflow():
+    """Test live delivery to subscribers and that a slow subscriber's backlog becomes one resync"""
+    async def scenario():
+        broker = events.Broadcaster(queue_size=2, replay_size=10)
+        reporter = broker.subscribe(REPORTER)
+        admin = broker.subscribe(ADMIN)
+        broker.dispatch("created", {"id": 10, "reporter_id": REPORTER.id})
+        broker.dispatch("created", {"id": 11, "reporter_id": ADMIN.id})
+        assert [reporter.queue.get_nowait().id] == [1]
+        assert reporter.queue.empty()
+
+        # admin has two queued events; a third overflows its queue
+        broker.dispatch("updated", {"id": 11, "reporter_id": ADMIN.id})
+        assert admin.queue.qsize() == 1
+        assert admin.queue.get_nowait() == events.Event(3, events.RESYNC, None)
+
+        broker.unsubscribe(admin)
+        broker.dispatch("deleted", {"id": 11, "reporter_id": ADMIN.id})
+        assert admin.queue.empty()
+        assert broker.replay(1, REPORTER) == []
+        assert broker.replay(1, ADMIN) == [
+            events.Event(2, "created", {"id": 11, "reporter_id": ADMIN.id}),
+            events.Event(3, "updated", {"id": 11, "reporter_id": ADMIN.id}),
+            events.Event(4, "deleted", {"id": 11, "reporter_id": ADMIN.id}),
+        ]
+    run(scenario())
+
+def test_events_from_other_threads_reach_subscribers():
+    """Test that publishing from another thread wakes a subscriber waiting on its loop"""
+    async def scenario():
+        broker = events.Broadcaster(queue_size=10, replay_size=10)
+        subscriber = broker.subscribe(ADMIN)
+        await asyncio.to_thread(broker.dispatch, "created", {"id": 1, "reporter_id": ADMIN.id})
+        event = await asyncio.wait_for(subscriber.queue.get(), 1)
+        assert event.id == 1
+    run(scenario())
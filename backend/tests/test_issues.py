@@ -4,7 +4,11 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from tests.conftest import client, test_user, test_admin_user, test_issue
+from tests.conftest import client, test_user, test_admin_user, test_issue, run
+from datetime import datetime, timedelta, timezone
+from prometheus_client import REGISTRY
+from app import crud, models, schemas, search
+from app.pagination import encode_cursor
 
 def get_auth_headers(client, email, password):
     """Helper function to get authentication headers"""
@@ -94,4 +98,303 @@ def test_create_issue_unauthorized(client):
         "severity": "LOW"
     }
     response = client.post("/issues/", json=issue_data)
-    assert response.status_code == 401 
\ No newline at end of file
+    assert response.status_code == 401 
+
+def create_issues(db_session, reporter_id, count):
+    """Helper function to create a batch of issues"""
+    return [
+        run(crud.create_issue(db_session, schemas.IssueCreate(title=f"Issue {i}", description="Batch", severity=models.IssueSeverity.LOW), reporter_id))
+        for i in range(count)
+    ]
+
+def test_get_issues_cursor_pagination(client, db_session, test_admin_user):
+    """Test walking the issue list with keyset cursors"""
+    created = create_issues(db_session, test_admin_user.id, 5)
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+
+    seen = []
+    cursor = ""
+    while cursor is not None:
+        response = client.get("/issues/", params={"cursor": cursor, "limit": 2}, headers=headers)
+        assert response.status_code == 200
+        seen.extend(issue["id"] for issue in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+
+    assert seen == sorted((issue.id for issue in created), reverse=True)
+
+def test_get_issues_cursor_reporter_scoped(client, db_session, test_user, test_admin_user):
+    """Test that cursor pages only contain the reporter's own issues"""
+    create_issues(db_session, test_admin_user.id, 3)
+    own = create_issues(db_session, test_user.id, 2)
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    response = client.get("/issues/", params={"cursor": ""}, headers=headers)
+    assert response.status_code == 200
+    assert [issue["id"] for issue in response.json()] == [own[1].id, own[0].id]
+    assert "X-Next-Cursor" not in response.headers
+
+def test_get_issues_invalid_cursor(client, test_user):
+    """Test that a malformed cursor is rejected"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    response = client.get("/issues/", params={"cursor": "not-a-cursor"}, headers=headers)
+    assert response.status_code == 400
+    # Well-formed, right sort, but a key that is not a timestamp or rank
+    for sort, key in (("-created_at", "garbage"), ("-created_at", 5), ("severity", "HIGH"), ("status", None)):
+        response = client.get("/issues/", params={"cursor": encode_cursor(sort, key, 1), "sort": sort}, headers=headers)
+        assert response.status_code == 400
+
+def test_get_issues_filtered(client, db_session, test_admin_user):
+    """Test filtering the issue list by status and severity"""
+    create_issues(db_session, test_admin_user.id, 2)
+    high = run(crud.create_issue(db_session, schemas.IssueCreate(title="High", description="Hot", severity=models.IssueSeverity.HIGH), test_admin_user.id))
+    run(crud.update_issue(db_session, high.id, schemas.IssueUpdate(status=models.IssueStatus.TRIAGED)))
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+
+    response = client.get("/issues/", params={"status": ["TRIAGED", "IN_PROGRESS"], "severity": "HIGH"}, headers=headers)
+    assert response.status_code == 200
+    assert [issue["id"] for issue in response.json()] == [high.id]
+
+    response = client.get("/issues/", params={"status": "OPEN", "severity": "HIGH"}, headers=headers)
+    assert response.json() == []
+
+def test_get_issues_updated_filter_counts_never_edited_issues(client, db_session, test_admin_user):
+    """Test that issues without updated_at filter by their creation time, as they sort"""
+    edited, untouched = create_issues(db_session, test_admin_user.id, 2)
+    edited.created_at = edited.updated_at = datetime.now(timezone.utc) - timedelta(days=10)
+    run(db_session.commit())
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    yesterday = (datetime.now(timezone.utc) - timedelta(days=1)).isoformat()
+
+    response = client.get("/issues/", params={"updated_from": yesterday}, headers=headers)
+    assert [issue["id"] for issue in response.json()] == [untouched.id]
+    response = client.get("/issues/", params={"updated_to": yesterday}, headers=headers)
+    assert [issue["id"] for issue in response.json()] == [edited.id]
+
+def test_get_issues_sorted_with_cursor(client, db_session, test_admin_user):
+    """Test keyset paging through a severity-sorted list"""
+    for severity in (models.IssueSeverity.LOW, models.IssueSeverity.CRITICAL, models.IssueSeverity.MEDIUM, models.IssueSeverity.CRITICAL):
+        run(crud.create_issue(db_session, schemas.IssueCreate(title=severity.value, description="Sorted", severity=severity), test_admin_user.id))
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+
+    severities = []
+    cursor = ""
+    while cursor is not None:
+        response = client.get("/issues/", params={"cursor": cursor, "limit": 3, "sort": "-severity"}, headers=headers)
+        assert response.status_code == 200
+        severities.extend(issue["severity"] for issue in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+    assert severities == ["CRITICAL", "CRITICAL", "MEDIUM", "LOW"]
+
+def test_get_issues_unknown_sort(client, test_user):
+    """Test that only whitelisted sort keys are accepted"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    response = client.get("/issues/", params={"sort": "description"}, headers=headers)
+    assert response.status_code == 422
+
+def test_search_issues(client, db_session, test_admin_user):
+    """Test ranked full-text search with highlighted snippets"""
+    run(crud.create_issue(db_session, schemas.IssueCreate(title="Login page crashes", description="Stack trace on submit", severity=models.IssueSeverity.HIGH), test_admin_user.id))
+    run(crud.create_issue(db_session, schemas.IssueCreate(title="Slow dashboard", description="Crashes sometimes after login", severity=models.IssueSeverity.LOW), test_admin_user.id))
+    run(crud.create_issue(db_session, schemas.IssueCreate(title="Typo in footer", description="Minor", severity=models.IssueSeverity.LOW), test_admin_user.id))
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+
+    response = client.get("/issues/search", params={"q": "login crash"}, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [issue["title"] for issue in data] == ["Login page crashes", "Slow dashboard"]
+    assert data[0]["title_highlight"] == "<mark>Login</mark> page <mark>crashes</mark>"
+    assert "<mark>" in data[1]["snippet"]
+
+def test_search_issues_reporter_scoped_with_cursor(client, db_session, test_user, test_admin_user):
+    """Test that search respects RBAC and pages with cursors"""
+    run(crud.create_issue(db_session, schemas.IssueCreate(title="Export fails", description="Admin export", severity=models.IssueSeverity.LOW), test_admin_user.id))
+    own = [
+        run(crud.create_issue(db_session, schemas.IssueCreate(title=f"Export fails {i}", description="Reporter export", severity=models.IssueSeverity.LOW), test_user.id))
+        for i in range(3)
+    ]
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+
+    seen = []
+    params = {"q": "export", "limit": 2}
+    while True:
+        response = client.get("/issues/search", params=params, headers=headers)
+        assert response.status_code == 200
+        seen.extend(issue["id"] for issue in response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+    assert sorted(seen) == [issue.id for issue in own]
+
+    for key in ("high", ["1"], {"score": 1}, None):
+        response = client.get("/issues/search", params={"q": "export", "cursor": encode_cursor("relevance", key, own[0].id)}, headers=headers)
+        assert response.status_code == 400
+
+def test_search_issues_unsupported_database(client, test_user, monkeypatch):
+    """Test that search on a database without a full-text backend answers 501"""
+    monkeypatch.setattr(search, "_dialect", lambda db: "mysql")
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    response = client.get("/issues/search", params={"q": "export"}, headers=headers)
+    assert response.status_code == 501
+
+def test_bulk_create_issues(client, test_user):
+    """Test that a bulk create writes the valid items and reports the invalid ones"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    before = REGISTRY.get_sample_value("issues_created_total", {"severity": "LOW", "status": "OPEN"}) or 0
+    items = [
+        {"title": "Bot issue 1", "description": "Filed by a bot", "severity": "LOW"},
+        {"title": "Missing severity", "description": "Filed by a bot"},
+        {"title": "Bot issue 2", "description": "Filed by a bot", "severity": "LOW"},
+    ]
+    response = client.post("/issues/bulk", json={"items": items}, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["succeeded"], data["failed"]) == (2, 1)
+    assert [r["status_code"] for r in data["results"]] == [201, 422, 201]
+    assert data["results"][0]["issue"]["title"] == "Bot issue 1"
+    assert data["results"][2]["issue"]["reporter_id"] == test_user.id
+    assert data["results"][1]["detail"][0]["loc"] == ["severity"]
+
+    assert len(client.get("/issues/", headers=headers).json()) == 2
+    assert client.get("/issues/search", params={"q": "bot"}, headers=headers).json()
+    assert REGISTRY.get_sample_value("issues_created_total", {"severity": "LOW", "status": "OPEN"}) == before + 2
+
+def test_bulk_create_limit(client, test_user, monkeypatch):
+    """Test that batches over the item limit are rejected outright"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    item = {"title": "Bot issue", "description": "Filed by a bot", "severity": "LOW"}
+    response = client.post("/issues/bulk", json={"items": [item] * (schemas.ISSUE_BULK_MAX_ITEMS + 1)}, headers=headers)
+    assert response.status_code == 422
+
+def test_bulk_update_issues(client, db_session, test_user, test_admin_user):
+    """Test that a bulk update applies valid items and reports missing and duplicate ids"""
+    create_issues(db_session, test_user.id, 3)
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    issues = client.get("/issues/", params={"sort": "created_at"}, headers=headers).json()
+    before = REGISTRY.get_sample_value("issue_status_changes_total", {"from_status": "OPEN", "to_status": "DONE"}) or 0
+    items = [
+        {"id": issues[0]["id"], "status": "DONE"},
+        {"id": issues[1]["id"], "status": "DONE", "title": "Renamed"},
+        {"id": 999999, "status": "DONE"},
+        {"id": issues[0]["id"], "status": "TRIAGED"},
+        {"id": issues[2]["id"], "severity": "URGENT"},
+    ]
+    response = client.patch("/issues/bulk", json={"items": items}, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [r["status_code"] for r in data["results"]] == [200, 200, 404, 409, 422]
+    assert data["results"][1]["issue"]["title"] == "Renamed"
+    assert data["results"][1]["issue"]["updated_at"] is not None
+
+    assert client.get(f"/issues/{issues[0]['id']}", headers=headers).json()["status"] == "DONE"
+    assert client.get(f"/issues/{issues[2]['id']}", headers=headers).json()["status"] == "OPEN"
+    assert REGISTRY.get_sample_value("issue_status_changes_total", {"from_status": "OPEN", "to_status": "DONE"}) == before + 2
+
+def test_bulk_update_requires_maintainer(client, test_user, test_issue):
+    """Test that reporters cannot bulk update"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    response = client.patch("/issues/bulk", json={"items": [{"id": test_issue.id, "status": "DONE"}]}, headers=headers)
+    assert response.status_code == 403
+
+def test_transition_issues_by_filter(client, db_session, test_user, test_admin_user):
+    """Test closing old LOW issues with one set-based transition"""
+    old = create_issues(db_session, test_user.id, 3)
+    recent = create_issues(db_session, test_user.id, 1)
+    old[2].status = models.IssueStatus.TRIAGED
+    for issue in old:
+        issue.created_at = datetime.now(timezone.utc) - timedelta(days=120)
+    run(db_session.commit())
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    before = REGISTRY.get_sample_value("issue_status_changes_total", {"from_status": "OPEN", "to_status": "DONE"}) or 0
+    body = {
+        "to_status": "DONE",
+        "filter": {"severity": ["LOW"], "created_to": (datetime.now(timezone.utc) - timedelta(days=90)).isoformat()},
+    }
+
+    preview = client.post("/issues/transition", json={**body, "dry_run": True}, headers=headers).json()
+    assert preview["affected"] == 3
+    assert client.get(f"/issues/{old[0].id}", headers=headers).json()["status"] == "OPEN"
+
+    response = client.post("/issues/transition", json=body, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["affected"] == 3
+    assert data["transitions"] == [
+        {"from_status": "OPEN", "to_status": "DONE", "count": 2},
+        {"from_status": "TRIAGED", "to_status": "DONE", "count": 1},
+    ]
+    assert client.get(f"/issues/{old[2].id}", headers=headers).json()["status"] == "DONE"
+    assert client.get(f"/issues/{old[0].id}", headers=headers).json()["updated_at"] is not None
+    assert client.get(f"/issues/{recent[0].id}", headers=headers).json()["status"] == "OPEN"
+    assert REGISTRY.get_sample_value("issue_status_changes_total", {"from_status": "OPEN", "to_status": "DONE"}) == before + 2
+
+def test_transition_issues_requires_maintainer(client, test_user):
+    """Test that reporters cannot run bulk transitions"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    response = client.post("/issues/transition", json={"to_status": "DONE"}, headers=headers)
+    assert response.status_code == 403
+
+def test_get_issue_conditional(client, test_user, test_admin_user, test_issue):
+    """Test ETag/Last-Modified revalidation of a single issue"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    response = client.get(f"/issues/{test_issue.id}", headers=headers)
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+    assert response.headers["last-modified"]
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    response = client.get(f"/issues/{test_issue.id}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    response = client.get(f"/issues/{test_issue.id}", headers={**headers, "If-Modified-Since": response.headers["last-modified"]})
+    assert response.status_code == 304
+
+    admin_headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    client.put(f"/issues/{test_issue.id}", json={"status": "TRIAGED"}, headers=admin_headers)
+    response = client.get(f"/issues/{test_issue.id}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["status"] == "TRIAGED"
+    assert response.headers["etag"] != etag
+
+def test_get_issue_conditional_checks_permissions(client, test_user, test_admin_user):
+    """Test that a matching ETag does not let a reporter see another user's issue"""
+    admin_headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    issue = client.post("/issues/", json={"title": "Private", "description": "Admin only", "severity": "LOW"}, headers=admin_headers)
+    etag = client.get(f"/issues/{issue.json()['id']}", headers=admin_headers).headers["etag"]
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    response = client.get(f"/issues/{issue.json()['id']}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 403
+
+def test_get_issues_conditional(client, test_admin_user):
+    """Test that list ETags change with any write to the selected issues, and only then"""
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    issue = {"title": "Crash", "description": "On save", "severity": "HIGH"}
+    first = client.post("/issues/", json=issue, headers=headers).json()
+    client.post("/issues/", json={**issue, "severity": "LOW"}, headers=headers)
+
+    def revalidate(url, etag):
+        return client.get(url, headers={**headers, "If-None-Match": etag})
+
+    etag = client.get("/issues/", headers=headers).headers["etag"]
+    high_etag = client.get("/issues/?severity=HIGH", headers=headers).headers["etag"]
+    assert etag != high_etag
+    assert revalidate("/issues/", etag).status_code == 304
+    assert revalidate("/issues/?limit=1", etag).status_code == 200
+
+    # A write outside the filter leaves the filtered list valid
+    client.post("/issues/", json={**issue, "severity": "LOW"}, headers=headers)
+    assert revalidate("/issues/?severity=HIGH", high_etag).status_code == 304
+    response = revalidate("/issues/", etag)
+    assert response.status_code == 200 and len(response.json()) == 3
+    etag = response.headers["etag"]
+
+    client.delete(f"/issues/{first['id']}", headers=headers)
+    assert revalidate("/issues/?severity=HIGH", high_etag).status_code == 200
+    assert revalidate("/issues/", etag).status_code == 200
+
+    # Only the page's own rows count: a write past the page leaves it valid
+    page = client.get("/issues/?limit=1", headers=headers)
+    second, third = client.get("/issues/", headers=headers).json()
+    client.put(f"/issues/{third['id']}", json={"status": "TRIAGED"}, headers=headers)
+    assert revalidate("/issues/?limit=1", page.headers["etag"]).status_code == 304
+    client.put(f"/issues/{second['id']}", json={"status": "TRIAGED"}, headers=headers)
+    assert revalidate("/issues/?limit=1", page.headers["etag"]).status_code == 200
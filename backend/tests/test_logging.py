@@ -0,0 +1,99 @@
+import io
+import json
+import pytest
+import threading
+import time
+from types import SimpleNamespace
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+from tests.conftest import client, test_user
+from app import logging as app_logging
+
+@pytest.fixture
+def captured():
+    """Records seen by the global logger, after patching and before any sink"""
+    records = []
+    handler_id = logger.add(lambda message: records.append(message.record), level="DEBUG")
+    yield records
+    logger.remove(handler_id)
+
+@pytest.fixture
+def reconfigure(tmp_path):
+    stdout = io.StringIO()
+
+    def configure(**options):
+        app_logging.configure_logging(stdout=stdout, log_dir=str(tmp_path), **options)
+        return stdout
+    yield configure
+    app_logging.configure_logging()
+
+def test_request_id_tags_response_and_logs(client, test_user, captured):
+    """Test that a request's log lines and response carry its X-Request-ID"""
+    response = client.post("/token", data={"username": "test@example.com", "password": "testpassword"}, headers={"X-Request-ID": "req-123"})
+    assert response.headers["x-request-id"] == "req-123"
+    login_lines = [r for r in captured if r["message"].startswith("Login attempt")]
+    assert login_lines and all(r["extra"]["request_id"] == "req-123" for r in login_lines)
+
+    # Missing or unsafe ids are replaced with a fresh one
+    response = client.get("/health", headers={"X-Request-ID": "bad id\nforged"})
+    assert len(response.headers["x-request-id"]) == 32
+    assert response.headers["x-request-id"] != client.get("/health").headers["x-request-id"]
+
+def test_sample_filter_only_thins_low_levels():
+    """Test that sampling drops DEBUG/INFO per logger but never warnings"""
+    keep = app_logging.sample_filter({"api": 0.0, "auth": 1.0})
+    seen = []
+    handler_id = logger.add(lambda message: seen.append(message.record["message"]), filter=keep, level="DEBUG")
+    try:
+        app_logging.api_logger.info("sampled out")
+        app_logging.api_logger.warning("always kept")
+        app_logging.auth_logger.info("kept at rate 1")
+        app_logging.db_logger.info("not sampled")
+    finally:
+        logger.remove(handler_id)
+    assert seen == ["always kept", "kept at rate 1", "not sampled"]
+
+def test_async_logging_writes_from_background_thread(reconfigure, tmp_path):
+    """Test that queued messages reach every sink at its level, serialized once"""
+    stdout = reconfigure(async_mode=True)
+    app_logging.api_logger.debug("debug only in app.log")
+    app_logging.api_logger.info("hello")
+    app_logging.api_logger.error("broken")
+    app_logging.flush_logs()
+
+    lines = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    assert [line["record"]["message"] for line in lines] == ["hello", "broken"]
+    assert lines[0]["record"]["extra"]["name"] == "api"
+    assert lines[0]["record"]["function"] == "test_async_logging_writes_from_background_thread"
+    with open(tmp_path / "app.log") as f:
+        assert len(f.readlines()) == 3
+    with open(tmp_path / "error.log") as f:
+        assert [json.loads(line)["record"]["message"] for line in f] == ["broken"]
+
+def test_async_logging_drops_low_levels_when_full(reconfigure):
+    """Test that a full queue drops INFO instead of blocking the caller"""
+    reconfigure(async_mode=True, queue_size=1)
+    sink = app_logging.queue_sink
+    sink.stop()  # nothing drains the queue now
+    sink.queue.put(("INFO", "filler\n"))
+    app_logging.api_logger.info("dropped")
+    assert sink.dropped == 1
+
+def test_async_logging_bounds_the_wait_for_errors(reconfigure):
+    """Test that errors logged behind a stuck writer wait briefly, then are dropped"""
+    reconfigure(async_mode=True, queue_size=1)
+    sink = app_logging.queue_sink
+    release = threading.Event()
+    sink.writer = SimpleNamespace(log=lambda *item: release.wait())
+    sink.queue.put(("INFO", "taken by the writer, which blocks on it\n"))
+    sink.queue.put(("INFO", "fills the queue\n"))
+    try:
+        started = time.perf_counter()
+        app_logging.api_logger.error("dropped")
+        assert time.perf_counter() - started < 1
+        assert sink.dropped == 1
+    finally:
+        release.set()
@@ -0,0 +1,103 @@
+import subprocess
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prometheus_client import REGISTRY
+from tests.conftest import client, test_admin_user, TestingSessionLocal, run
+from app import counters, db_metrics, upload
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def get_auth_headers(client, email, password):
+    """Helper function to get authentication headers"""
+    response = client.post("/token", data={"username": email, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def requests_total(method, endpoint, status):
+    return REGISTRY.get_sample_value("http_requests_total", {"method": method, "endpoint": endpoint, "status": status}) or 0
+
+def test_requests_labelled_by_route_template_and_real_status(client, test_admin_user):
+    """Test that request metrics use route templates and the status actually sent"""
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    before_ok = requests_total("GET", "/issues/{issue_id}", "200")
+    before_missing = requests_total("GET", "/issues/{issue_id}", "404")
+    before_unmatched = requests_total("GET", "unmatched", "404")
+    before_too_large = requests_total("POST", "/upload/", "413")
+
+    issue_id = client.post("/issues/", json={"title": "A", "description": "B", "severity": "LOW"}, headers=headers).json()["id"]
+    client.get(f"/issues/{issue_id}", headers=headers)
+    client.get("/issues/999999", headers=headers)
+    client.get("/no/such/path/1")
+    client.post("/upload/", headers={**headers, "Content-Length": str(upload.MAX_FILE_SIZE * 2)}, content=b"")
+
+    assert requests_total("GET", "/issues/{issue_id}", "200") == before_ok + 1
+    assert requests_total("GET", "/issues/{issue_id}", "404") == before_missing + 1
+    assert requests_total("GET", "unmatched", "404") == before_unmatched + 1
+    assert requests_total("POST", "/upload/", "413") == before_too_large + 1
+    assert REGISTRY.get_sample_value("http_requests_total", {"method": "GET", "endpoint": f"/issues/{issue_id}", "status": "200"}) is None
+    assert REGISTRY.get_sample_value("http_requests_in_progress", {"method": "GET"}) == 0
+
+def test_multiprocess_metrics_aggregate_workers(tmp_path):
+    """Test that /metrics sums the samples recorded by every worker process"""
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    record = "from app import metrics; metrics.REQUEST_COUNT.labels(method='GET', endpoint='/issues/', status='200').inc()"
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", record], cwd=BACKEND_DIR, env=env, check=True)
+    scrape = "from app import metrics; print(metrics.get_metrics().body.decode())"
+    output = subprocess.run([sys.executable, "-c", scrape], cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True).stdout
+    assert 'http_requests_total{endpoint="/issues/",method="GET",status="200"} 2.0' in output
+
+def test_multiprocess_pool_gauges(tmp_path):
+    """Test that pool usage reaches the multiprocess files, not just this process"""
+    (tmp_path / "metrics").mkdir()
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path / "metrics"), "DATABASE_URL": f"sqlite:///{tmp_path / 'pool.db'}"}
+    script = (
+        "from app import database, metrics\n"
+        "held = [database.engine.connect() for _ in range(2)]\n"
+        "print(metrics.get_metrics().body.decode())\n"
+    )
+    output = subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True).stdout
+    assert 'database_pool_checked_out_connections{engine="sync"} 2.0' in output
+    assert f'database_pool_size{{engine="sync"}} {float(os.getenv("DB_POOL_SIZE", "5"))}' in output
+
+def load_from_test_db():
+    async def summary():
+        async with TestingSessionLocal() as db:
+            return await counters.get_summary(db)
+    return run(summary())
+
+def test_db_gauges_computed_on_scrape(client, test_admin_user, monkeypatch):
+    """Test that /metrics reports issue counts straight from the database, deletes included"""
+    monkeypatch.setattr(db_metrics.issue_counts, "load", load_from_test_db)
+    db_metrics.issue_counts.cache.clear()
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    ids = [client.post("/issues/", json={"title": "A", "description": "B", "severity": "HIGH"}, headers=headers).json()["id"] for _ in range(3)]
+    client.put(f"/issues/{ids[0]}", json={"status": "DONE"}, headers=headers)
+    client.delete(f"/issues/{ids[1]}", headers=headers)
+    db_metrics.issue_counts.cache.clear()
+
+    output = client.get("/metrics").text
+    assert 'open_issues_by_severity{severity="HIGH"} 1.0' in output
+    assert 'open_issues_by_status{status="DONE"} 1.0' in output
+    assert 'open_issues_by_status{status="OPEN"} 1.0' in output
+
+def test_db_gauges_cached_for_ttl():
+    """Test that scrapes within the TTL share one query and a failed query keeps the last values"""
+    calls = []
+
+    def load():
+        calls.append(1)
+        if len(calls) > 1:
+            raise RuntimeError("database down")
+        return {"issues_by_severity": {"LOW": 2}, "issues_by_status": {"OPEN": 2}}
+
+    collector = db_metrics.IssueCountsCollector(load=load, ttl=60, use_redis=False)
+    first = [sample for family in collector.collect() for sample in family.samples]
+    second = [sample for family in collector.collect() for sample in family.samples]
+    assert first == second and len(calls) == 1
+
+    collector.cache.clear()
+    assert [sample for family in collector.collect() for sample in family.samples] == first
+    assert len(calls) == 2
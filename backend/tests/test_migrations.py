@@ -0,0 +1,58 @@
+import subprocess
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, inspect, text
+from app.models import Base
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def upgrade_head(url):
+    env = {**os.environ, "DATABASE_URL": url}
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+
+def schema(url):
+    """Tables with their columns and indexes, leaving out Alembic's own table"""
+    engine = create_engine(url)
+    inspector = inspect(engine)
+    tables = {}
+    for table in inspector.get_table_names():
+        if table == "alembic_version":
+            continue
+        columns = {column["name"]: (column["nullable"], column["default"]) for column in inspector.get_columns(table)}
+        indexes = {(index["name"], tuple(index["column_names"]), bool(index["unique"])) for index in inspector.get_indexes(table)}
+        tables[table] = (columns, indexes)
+    engine.dispose()
+    return tables
+
+def create_all(url):
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    return engine
+
+def test_upgrade_builds_the_model_schema(tmp_path):
+    """Test that alembic upgrade head on an empty database matches create_all"""
+    migrated = f"sqlite:///{tmp_path / 'migrated.db'}"
+    created = f"sqlite:///{tmp_path / 'created.db'}"
+    upgrade_head(migrated)
+    create_all(created).dispose()
+
+    assert schema(migrated) == schema(created)
+
+def test_upgrade_after_create_all(tmp_path):
+    """Test that a database the app already built upgrades cleanly and keeps its data"""
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    engine = create_all(url)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, email, role) VALUES (1, 'a@example.com', 'REPORTER')"))
+        conn.execute(text("INSERT INTO issues (title, description, severity, status, reporter_id) VALUES ('A', 'B', 'LOW', 'OPEN', 1)"))
+        conn.execute(text("INSERT INTO issue_counters (status, severity, count) VALUES ('OPEN', 'LOW', 1)"))
+    expected = schema(url)
+
+    upgrade_head(url)
+
+    assert schema(url) == expected
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT status, severity, count FROM issue_counters")).all() == [("OPEN", "LOW", 1)]
+    engine.dispose()
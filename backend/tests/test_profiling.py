@@ -0,0 +1,61 @@
+import re
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.conftest import client, test_user, test_admin_user, db_session, run
+from app import crud, deps, models, profiling
+
+def get_auth_headers(client, email, password):
+    """Helper function to get authentication headers"""
+    response = client.post("/token", data={"username": email, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def timings(response):
+    return dict(re.findall(r"(\w+);dur=([\d.]+)", response.headers["server-timing"]))
+
+def test_admin_profiles_async_route(client, test_admin_user):
+    """Test that an admin's flagged request gets Server-Timing and a stored profile"""
+    profiling.profiles.clear()
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    client.post("/issues/", json={"title": "A", "description": "B", "severity": "LOW"}, headers=headers)
+
+    response = client.get("/issues/", headers={**headers, "X-Profile": "store"})
+    assert response.status_code == 200
+    assert set(timings(response)) == {"total", "sql", "auth", "serialize"}
+    assert re.search(r'sql;dur=[\d.]+;desc="[1-9]\d* queries"', response.headers["server-timing"])
+
+    profile_id = response.headers["x-profile-id"]
+    listed = client.get("/admin/profiles", headers=headers).json()
+    assert [p["id"] for p in listed] == [profile_id]
+    assert listed[0]["path"] == "/issues/" and listed[0]["status"] == 200
+    detail = client.get(f"/admin/profiles/{profile_id}", headers=headers).json()
+    assert detail["server_timing"] == response.headers["server-timing"]
+    assert client.get("/admin/profiles/missing", headers=headers).status_code == 404
+
+def test_profiling_sync_route_and_query_flag(client, test_admin_user):
+    """Test that sync routes are profiled too, and ?profile=1 does not store"""
+    profiling.profiles.clear()
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    response = client.get("/metrics?profile=1", headers=headers)
+    assert response.status_code == 200
+    assert "total" in timings(response)
+    assert "x-profile-id" not in response.headers
+    assert len(profiling.profiles) == 0
+
+def test_profiling_ignored_for_non_admins(client, test_user):
+    """Test that the flag does nothing without an admin token"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    assert "server-timing" not in client.get("/issues/", headers={**headers, "X-Profile": "1"}).headers
+    assert "server-timing" not in client.get("/health", headers={"X-Profile": "1", "Authorization": "Bearer forged"}).headers
+    assert client.get("/admin/profiles", headers=headers).status_code == 403
+
+def test_profiling_ignored_for_demoted_admins(client, db_session, test_admin_user):
+    """Test that a token minted before a demotion elsewhere cannot profile, even uncached"""
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    assert "server-timing" in client.get("/issues/", headers={**headers, "X-Profile": "1"}).headers
+    # Demoted through another worker: no local revocation, and this worker's cache misses
+    run(crud.update_user_role(db_session, test_admin_user.id, models.UserRole.REPORTER))
+    deps.token_cache.clear()
+    assert "server-timing" not in client.get("/health", headers={**headers, "X-Profile": "1"}).headers
@@ -0,0 +1,16 @@
+import json
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.conftest import TestingSessionLocal, run
+from benchmarks.serialization import current_path, fast_path, seed
+
+# Timings live in benchmarks/serialization.py: python -m benchmarks.serialization
+
+def test_fast_path_matches_response_model():
+    """Test that the fast list path produces the same JSON as the response model"""
+    run(seed(TestingSessionLocal, 50))
+    assert run(fast_path(TestingSessionLocal, 50)) == run(current_path(TestingSessionLocal, 50))
+    assert len(json.loads(run(fast_path(TestingSessionLocal, 50)))) == 50
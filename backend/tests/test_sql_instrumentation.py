@@ -0,0 +1,90 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collections import Counter
+from loguru import logger
+from prometheus_client import REGISTRY
+from sqlalchemy import select
+from tests.conftest import client, test_admin_user, TestingSessionLocal, run
+from app import models, sql_instrumentation
+
+def get_auth_headers(client, email, password):
+    """Helper function to get authentication headers"""
+    response = client.post("/token", data={"username": email, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def sample_total(name):
+    """Sum of a metric's samples across all label values"""
+    return sum(sample.value for metric in REGISTRY.collect() for sample in metric.samples if sample.name == name)
+
+def test_describe_fingerprints_statements():
+    """Test that statements differing only in bound values share a fingerprint"""
+    one = sql_instrumentation.describe("SELECT issues.id FROM issues WHERE issues.id IN (?, ?, ?)")
+    two = sql_instrumentation.describe("SELECT issues.id\nFROM issues WHERE issues.id IN ($1, $2)")
+    assert one.fingerprint == two.fingerprint == "SELECT issues.id FROM issues WHERE issues.id IN (?)"
+    assert (one.operation, one.table) == ("select", "issues")
+    assert sql_instrumentation.describe('INSERT INTO "users" (email) VALUES (%(email)s)').table == "users"
+    assert sql_instrumentation.describe("UPDATE issue_counters SET count=?").operation == "update"
+    assert sql_instrumentation.describe("PRAGMA table_info(issues)").operation == "other"
+
+def test_parameter_shape_hides_values():
+    """Test that logged parameter shapes carry types only"""
+    assert sql_instrumentation.parameter_shape({"email": "a@example.com", "id": 3}) == "{email: str, id: int}"
+    assert sql_instrumentation.parameter_shape(tuple(range(500)) + ("x",)) == "(int x500, str)"
+    assert sql_instrumentation.parameter_shape([(1, "a"), (2, "b")], executemany=True) == "2 rows of (int, str)"
+
+def test_statements_timed_and_slow_ones_logged(client, test_admin_user, monkeypatch):
+    """Test that every statement is observed and slow ones are logged with parameter shapes"""
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    labels = {"operation": "select", "table": "issues"}
+    before = REGISTRY.get_sample_value("database_operation_duration_seconds_count", labels) or 0
+    client.get("/issues/", headers=headers)
+    assert REGISTRY.get_sample_value("database_operation_duration_seconds_count", labels) > before
+
+    monkeypatch.setattr(sql_instrumentation, "SQL_SLOW_QUERY_MS", 0)
+    slow_before = REGISTRY.get_sample_value("database_slow_queries_total", labels) or 0
+    messages = []
+    handler_id = logger.add(lambda message: messages.append(message.record["message"]), level="WARNING")
+    try:
+        client.get("/issues/", headers=headers)
+    finally:
+        logger.remove(handler_id)
+    assert REGISTRY.get_sample_value("database_slow_queries_total", labels) > slow_before
+    assert any(m.startswith("Slow query") and "FROM issues" in m and "params (" in m for m in messages)
+
+def test_repeated_selects_reported_as_n_plus_one():
+    """Test that one fingerprint run past the threshold within a request is flagged"""
+    async def lazy_load_style(count):
+        async with TestingSessionLocal() as db:
+            for user_id in range(count):
+                await db.execute(select(models.User).where(models.User.id == user_id))
+
+    counts = Counter()
+    token = sql_instrumentation.statement_counts.set(counts)
+    try:
+        run(lazy_load_style(sql_instrumentation.SQL_N_PLUS_ONE_THRESHOLD + 1))
+    finally:
+        sql_instrumentation.statement_counts.reset(token)
+    before = REGISTRY.get_sample_value("database_n_plus_one_total", {"endpoint": "GET /test", "table": "users"}) or 0
+    repeated = sql_instrumentation.report_repeats(counts, "GET /test")
+    assert [(table, count) for _, table, count in repeated] == [("users", sql_instrumentation.SQL_N_PLUS_ONE_THRESHOLD + 1)]
+    assert REGISTRY.get_sample_value("database_n_plus_one_total", {"endpoint": "GET /test", "table": "users"}) == before + 1
+
+def test_issue_endpoints_have_no_n_plus_one(client, test_admin_user):
+    """Regression guard: pages of issues must not run a query per issue"""
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    items = [{"title": f"Issue {i}", "description": "Body", "severity": "HIGH"} for i in range(sql_instrumentation.SQL_N_PLUS_ONE_THRESHOLD * 2)]
+    ids = [result["issue"]["id"] for result in client.post("/issues/bulk", json={"items": items}, headers=headers).json()["results"]]
+    before = sample_total("database_n_plus_one_total")
+
+    responses = [
+        client.patch("/issues/bulk", json={"items": [{"id": issue_id, "status": "TRIAGED"} for issue_id in ids]}, headers=headers),
+        client.get("/issues/", headers=headers),
+        client.get("/issues/search", params={"q": "Issue"}, headers=headers),
+        client.get("/issues/changes", headers=headers),
+        client.get("/dashboard/summary", headers=headers),
+    ]
+    assert [response.status_code for response in responses] == [200] * len(responses)
+    assert sample_total("database_n_plus_one_total") == before
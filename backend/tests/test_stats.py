@@ -0,0 +1,165 @@
+import asyncio
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update
+from tests.conftest import client, test_user, test_admin_user, db_session, run
+from app import counters, crud, dashboard, models, schemas, stats
+
+def get_auth_headers(client, email, password):
+    """Helper function to get authentication headers"""
+    response = client.post("/token", data={"username": email, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def stored_counts(db_session):
+    rows = run(db_session.execute(counters.counts_query())).all()
+    return {(status.value, severity.value): count for status, severity, count in rows}
+
+def test_counters_follow_issue_writes(client, db_session, test_user, test_admin_user):
+    """Test that every write path keeps issue_counters in step with issues"""
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    issue = {"title": "Crash", "description": "On save", "severity": "HIGH"}
+    first = client.post("/issues/", json=issue, headers=headers).json()
+    client.post("/issues/bulk", json={"items": [issue, {**issue, "severity": "LOW"}]}, headers=headers)
+    assert stored_counts(db_session) == {("OPEN", "HIGH"): 2, ("OPEN", "LOW"): 1}
+
+    client.put(f"/issues/{first['id']}", json={"status": "TRIAGED", "severity": "CRITICAL"}, headers=headers)
+    assert stored_counts(db_session) == {("OPEN", "HIGH"): 1, ("OPEN", "LOW"): 1, ("TRIAGED", "CRITICAL"): 1}
+
+    client.post("/issues/transition", json={"to_status": "DONE", "filter": {"status": ["OPEN"]}}, headers=headers)
+    assert stored_counts(db_session) == {("DONE", "HIGH"): 1, ("DONE", "LOW"): 1, ("TRIAGED", "CRITICAL"): 1}
+
+    client.patch("/issues/bulk", json={"items": [{"id": first["id"], "status": "IN_PROGRESS"}]}, headers=headers)
+    client.delete(f"/issues/{first['id']}", headers=headers)
+    assert stored_counts(db_session) == {("DONE", "HIGH"): 1, ("DONE", "LOW"): 1}
+
+    response = client.get("/stats/issues", headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total_issues"] == 2
+    assert data["open_issues"] == 0
+    assert data["issues_by_status"] == {"OPEN": 0, "TRIAGED": 0, "IN_PROGRESS": 0, "DONE": 2}
+
+def test_reconcile_repairs_drift(client, db_session, test_user):
+    """Test that reconciliation recounts from issues"""
+    run(crud.create_issue(db_session, schemas.IssueCreate(title="Crash", description="On save", severity=models.IssueSeverity.HIGH), test_user.id))
+    # Simulate drift, e.g. a row changed outside crud
+    run(db_session.execute(update(models.Issue).values(severity=models.IssueSeverity.LOW)))
+    run(db_session.commit())
+
+    corrections = run(db_session.run_sync(counters.reconcile))
+    assert dict(corrections) == {
+        (models.IssueStatus.OPEN, models.IssueSeverity.HIGH): -1,
+        (models.IssueStatus.OPEN, models.IssueSeverity.LOW): 1,
+    }
+    assert stored_counts(db_session) == {("OPEN", "LOW"): 1}
+    assert not run(db_session.run_sync(counters.reconcile))
+
+def test_detailed_health_reads_counters(client, test_user, test_issue):
+    """Test that /health/detailed reports totals from issue_counters"""
+    metrics = client.get("/health/detailed").json()["metrics"]
+    assert metrics["total_issues"] == 1
+    assert metrics["issues_by_severity"]["MEDIUM"] == 1
+
+def add_snapshots(db_session, counts_by_time):
+    for when, counts in counts_by_time:
+        for status, count in counts.items():
+            db_session.add(models.DailyStats(date=when, status=status, count=count))
+    run(db_session.commit())
+
+def test_timeseries_buckets_keep_last_snapshot(client, db_session, test_user):
+    """Test that coarse buckets downsample to the last snapshot in each bucket"""
+    day = datetime(2026, 3, 2, tzinfo=timezone.utc)  # a Monday
+    add_snapshots(db_session, [
+        (day + timedelta(hours=1), {models.IssueStatus.OPEN: 5, models.IssueStatus.DONE: 1}),
+        (day + timedelta(hours=23), {models.IssueStatus.OPEN: 3, models.IssueStatus.DONE: 3}),
+        (day + timedelta(days=1, hours=2), {models.IssueStatus.OPEN: 2, models.IssueStatus.DONE: 4}),
+        (day + timedelta(days=8), {models.IssueStatus.OPEN: 7, models.IssueStatus.DONE: 4}),
+    ])
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    params = {"from": day.isoformat(), "to": (day + timedelta(days=14)).isoformat()}
+
+    data = client.get("/stats/timeseries", params={**params, "bucket": "day"}, headers=headers).json()
+    assert [p["count"] for p in data["series"]["OPEN"]] == [3, 2, 7]
+    assert data["series"]["OPEN"][0]["bucket"].startswith("2026-03-02T00:00:00")
+
+    data = client.get("/stats/timeseries", params={**params, "bucket": "week", "status": "DONE"}, headers=headers).json()
+    assert list(data["series"]) == ["DONE"]
+    assert [(p["bucket"][:10], p["count"]) for p in data["series"]["DONE"]] == [("2026-03-02", 4), ("2026-03-09", 4)]
+
+    data = client.get("/stats/timeseries", params={**params, "bucket": "hour"}, headers=headers).json()
+    assert [p["count"] for p in data["series"]["OPEN"]] == [5, 3, 2, 7]
+
+def test_timeseries_rejects_too_many_points(client, test_user):
+    """Test that fine buckets over long ranges are refused"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    params = {"from": "2020-01-01T00:00:00Z", "to": "2026-01-01T00:00:00Z", "bucket": "hour"}
+    assert client.get("/stats/timeseries", params=params, headers=headers).status_code == 400
+
+def test_snapshot_written_once_per_slot(db_session, test_user, test_issue):
+    """Test that sub-daily snapshots are taken once per slot from the counters"""
+    now = datetime(2026, 3, 2, 10, 20, tzinfo=timezone.utc)
+    assert run(db_session.run_sync(stats.take_snapshot, now)) == datetime(2026, 3, 2, 10, tzinfo=timezone.utc)
+    assert run(db_session.run_sync(stats.take_snapshot, now + timedelta(minutes=30))) is None
+    assert run(db_session.run_sync(stats.take_snapshot, now + timedelta(hours=1))) is not None
+
+    rows = run(db_session.execute(select(models.DailyStats.status, models.DailyStats.count))).all()
+    assert len(rows) == 2 * len(models.IssueStatus)
+    assert (models.IssueStatus.OPEN, 1) in rows
+
+def test_dashboard_summary_cached_until_write(client, test_user, test_admin_user, monkeypatch):
+    """Test that the summary is computed once and recomputed after an issue write"""
+    headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    calls = []
+    compute_summary = dashboard.compute_summary
+    async def counting_compute(db, user):
+        calls.append(user.id)
+        return await compute_summary(db, user)
+    monkeypatch.setattr(dashboard, "compute_summary", counting_compute)
+
+    issue = {"title": "Outage", "description": "Everything is down", "severity": "CRITICAL"}
+    client.post("/issues/", json=issue, headers=headers)
+    first = client.get("/dashboard/summary", headers=headers).json()
+    assert client.get("/dashboard/summary", headers=headers).json() == first
+    assert len(calls) == 1
+    assert first["total_issues"] == 1
+    assert [i["title"] for i in first["recent_criticals"]] == ["Outage"]
+
+    client.post("/issues/", json={**issue, "title": "Second outage"}, headers=headers)
+    second = client.get("/dashboard/summary", headers=headers).json()
+    assert len(calls) == 2
+    assert second["issues_by_severity"]["CRITICAL"] == 2
+    assert [i["title"] for i in second["recent_criticals"]] == ["Second outage", "Outage"]
+
+def test_dashboard_summary_scoped_to_reporter(client, db_session, test_user, test_admin_user):
+    """Test that reporters' counts and recent criticals only cover their own issues"""
+    run(crud.create_issue(db_session, schemas.IssueCreate(title="Admin outage", description="Down", severity=models.IssueSeverity.CRITICAL), test_admin_user.id))
+    run(crud.create_issue(db_session, schemas.IssueCreate(title="Typo", description="On login", severity=models.IssueSeverity.LOW), test_user.id))
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    data = client.get("/dashboard/summary", headers=headers).json()
+    assert (data["total_issues"], data["open_issues"]) == (1, 1)
+    assert data["issues_by_severity"] == {"LOW": 1, "MEDIUM": 0, "HIGH": 0, "CRITICAL": 0}
+    assert data["recent_criticals"] == []
+
+    admin_headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    assert client.get("/dashboard/summary", headers=admin_headers).json()["total_issues"] == 2
+
+def test_dashboard_summary_single_flight(db_session, test_admin_user, monkeypatch):
+    """Test that concurrent cache misses share one recompute"""
+    calls = []
+    compute_summary = dashboard.compute_summary
+    async def slow_compute(db, user):
+        calls.append(user.id)
+        await asyncio.sleep(0.05)
+        return await compute_summary(db, user)
+    monkeypatch.setattr(dashboard, "compute_summary", slow_compute)
+    user = schemas.CurrentUser(id=test_admin_user.id, email=test_admin_user.email, role=test_admin_user.role, token_version=0)
+
+    async def burst():
+        return await asyncio.gather(*(dashboard.get_summary(db_session, user) for _ in range(10)))
+    results = run(burst())
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
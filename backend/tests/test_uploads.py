@@ -0,0 +1,228 @@
+import hashlib
+import pytest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.conftest import client, test_user, test_admin_user, db_session, run
+from app import upload
+
+def get_auth_headers(client, email, password):
+    """Helper function to get authentication headers"""
+    response = client.post("/token", data={"username": email, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(upload, "UPLOAD_CHUNK_SIZE", 1024)
+    return tmp_path
+
+def stored_files(upload_dir):
+    return sorted(p.name for p in upload_dir.rglob("*") if p.is_file())
+
+def test_upload_streams_file_to_disk(client, test_user, upload_dir):
+    """Test that an upload larger than one chunk is stored intact"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    content = os.urandom(10 * 1024 + 7)
+    response = client.post("/upload/", files={"file": ("log.txt", content)}, headers=headers)
+    assert response.status_code == 200
+    stored = Path(upload.get_file_path(response.json()["filename"]))
+    assert stored_files(upload_dir) == [stored.name]
+    assert stored.read_bytes() == content
+
+def test_upload_over_limit_leaves_no_files(client, test_user, upload_dir, monkeypatch):
+    """Test that an oversized upload is rejected and its temp file removed"""
+    monkeypatch.setattr(upload, "MAX_FILE_SIZE", 4 * 1024)
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    response = client.post("/upload/", files={"file": ("log.txt", b"x" * 5000)}, headers=headers)
+    assert response.status_code == 400
+    assert stored_files(upload_dir) == []
+
+def test_upload_rejected_from_content_length(client, test_user, upload_dir, monkeypatch):
+    """Test that a request declaring an oversized body is refused before parsing"""
+    monkeypatch.setattr(upload, "MAX_FILE_SIZE", 1024)
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    response = client.post("/upload/", files={"file": ("log.txt", b"x" * (upload.MULTIPART_OVERHEAD + 2048))}, headers=headers)
+    assert response.status_code == 413
+    assert stored_files(upload_dir) == []
+
+def upload_bytes(client, headers, name, content):
+    response = client.post("/upload/", files={"file": (name, content)}, headers=headers)
+    assert response.status_code == 200
+    return response.json()["filename"]
+
+def test_identical_uploads_share_one_blob(client, test_user, upload_dir):
+    """Test that the same body uploaded twice is stored once under its hash"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    first = upload_bytes(client, headers, "screenshot.png", b"same bytes")
+    second = upload_bytes(client, headers, "copy.png", b"same bytes")
+    digest = hashlib.sha256(b"same bytes").hexdigest()
+    assert first == second == f"{digest}.png"
+    assert stored_files(upload_dir) == [digest]
+    assert (upload_dir / digest[:2] / digest[2:4] / digest).read_bytes() == b"same bytes"
+
+    response = client.get(f"/files/{first}", headers=headers)
+    assert response.content == b"same bytes"
+    assert response.headers["content-type"] == "image/png"
+
+def sweep(db_session, after_seconds=0):
+    """Run the blob sweep as if `after_seconds` past the grace period had gone by"""
+    now = datetime.now(timezone.utc) + timedelta(seconds=upload.UPLOAD_BLOB_GRACE_SECONDS + after_seconds)
+    return run(db_session.run_sync(upload.sweep_blobs, now))
+
+def test_blob_freed_with_last_reference(client, db_session, test_user, test_admin_user, upload_dir):
+    """Test that deleting an issue only frees its attachment once nothing else uses it"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    admin_headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    filename = upload_bytes(client, headers, "log.txt", b"stack trace")
+    issue = {"title": "Crash", "description": "See log", "severity": "HIGH", "file_path": filename}
+    first = client.post("/issues/", json=issue, headers=headers).json()
+    second = client.post("/issues/", json=issue, headers=headers).json()
+
+    assert client.delete(f"/issues/{first['id']}", headers=admin_headers).status_code == 200
+    assert sweep(db_session, 1) == 0
+    assert client.get(f"/files/{filename}", headers=headers).status_code == 200
+    assert client.delete(f"/issues/{second['id']}", headers=admin_headers).status_code == 200
+    assert sweep(db_session, -60) == 0
+    assert sweep(db_session, 1) == 1
+    assert client.get(f"/files/{filename}", headers=headers).status_code == 404
+    assert stored_files(upload_dir) == []
+
+def test_freed_blob_kept_when_uploaded_again(client, db_session, test_user, test_admin_user, upload_dir):
+    """Test that a blob freed while an identical upload is being attached survives the sweep"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    admin_headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    filename = upload_bytes(client, headers, "log.txt", b"stack trace")
+    issue = {"title": "Crash", "description": "See log", "severity": "HIGH", "file_path": filename}
+    first = client.post("/issues/", json=issue, headers=headers).json()
+    blob = Path(upload.get_file_path(filename))
+    old = blob.stat().st_mtime - upload.UPLOAD_BLOB_GRACE_SECONDS - 60
+    os.utime(blob, (old, old))
+
+    # The identical upload reuses the stored blob, then the last reference goes away
+    assert upload_bytes(client, headers, "copy.txt", b"stack trace") == filename
+    assert client.delete(f"/issues/{first['id']}", headers=admin_headers).status_code == 200
+    assert sweep(db_session, -60) == 0
+    second = client.post("/issues/", json=issue, headers=headers)
+    assert second.status_code == 200
+    assert sweep(db_session, 1) == 0
+    assert client.get(f"/files/{filename}", headers=headers).content == b"stack trace"
+
+def test_unattached_uploads_swept_after_grace(client, db_session, test_user, upload_dir):
+    """Test that uploads no issue ever attached are removed once the grace period is over"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    upload_bytes(client, headers, "log.txt", b"never attached")
+    assert sweep(db_session, -60) == 0
+    assert stored_files(upload_dir) != []
+    assert sweep(db_session, 1) == 1
+    assert stored_files(upload_dir) == []
+
+def test_unknown_attachment_rejected(client, test_user, upload_dir):
+    """Test that an issue cannot reference a blob that was never uploaded"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    issue = {"title": "Crash", "description": "See log", "severity": "HIGH", "file_path": f"{'0' * 64}.txt"}
+    assert client.post("/issues/", json=issue, headers=headers).status_code == 400
+
+def test_attachment_must_be_an_upload_name(client, test_user, test_admin_user, upload_dir, tmp_path_factory):
+    """Test that issues cannot point at arbitrary paths, so deleting them cannot remove files"""
+    canary = tmp_path_factory.mktemp("outside") / "canary.txt"
+    canary.write_text("keep me")
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    admin_headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    for file_path in (str(canary), "../app/main.py", "../../etc/passwd"):
+        issue = {"title": "Crash", "description": "See log", "severity": "HIGH", "file_path": file_path}
+        assert client.post("/issues/", json=issue, headers=headers).status_code == 422
+        created = client.post("/issues/", json={**issue, "file_path": None}, headers=headers).json()
+        assert client.put(f"/issues/{created['id']}", json={"file_path": file_path}, headers=admin_headers).status_code == 422
+        assert client.get(f"/files/{file_path}", headers=headers).status_code == 404
+    assert canary.read_text() == "keep me"
+
+def test_flat_files_kept_when_issue_deleted(client, test_user, test_admin_user, upload_dir, monkeypatch):
+    """Test that flat files, which carry no reference count, survive their issues"""
+    monkeypatch.setattr(upload, "UPLOAD_STORAGE", "flat")
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    admin_headers = get_auth_headers(client, "admin@example.com", "adminpassword")
+    filename = upload_bytes(client, headers, "log.txt", b"flat")
+    issue = {"title": "Crash", "description": "See log", "severity": "HIGH", "file_path": filename}
+    first = client.post("/issues/", json=issue, headers=headers).json()
+    client.post("/issues/", json=issue, headers=headers)
+
+    assert client.delete(f"/issues/{first['id']}", headers=admin_headers).status_code == 200
+    assert client.get(f"/files/{filename}", headers=headers).content == b"flat"
+    missing = {**issue, "file_path": "00000000-0000-4000-8000-000000000000.txt"}
+    assert client.post("/issues/", json=missing, headers=headers).status_code == 400
+
+def test_file_served_by_its_upload_extension_only(client, test_user, upload_dir):
+    """Test that an upload cannot be served as active content by renaming it in the URL"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    filename = upload_bytes(client, headers, "notes.txt", b"<script>alert(1)</script>")
+    digest = upload.blob_digest(filename)
+    for name in (f"{digest}.html", f"{digest}.svg", f"{digest}.HTML"):
+        assert client.get(f"/files/{name}", headers=headers).status_code == 404
+
+    response = client.get(f"/files/{filename}", headers=headers)
+    assert response.headers["x-content-type-options"] == "nosniff"
+    assert response.headers["content-disposition"] == f'attachment; filename="{filename}"'
+    image = upload_bytes(client, headers, "screenshot.png", b"png bytes")
+    response = client.get(f"/files/{image}", headers=headers)
+    assert response.headers["x-content-type-options"] == "nosniff"
+    assert "content-disposition" not in response.headers
+
+def test_file_requires_authentication(client, test_user, upload_dir):
+    """Test that attachments are only served to signed-in users"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    filename = upload_bytes(client, headers, "log.txt", b"private")
+    assert client.get(f"/files/{filename}").status_code == 401
+
+def test_file_conditional_get(client, test_user, upload_dir):
+    """Test that a matching If-None-Match or If-Modified-Since gets 304"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    filename = upload_bytes(client, headers, "log.txt", b"cache me")
+    response = client.get(f"/files/{filename}", headers=headers)
+    etag, last_modified = response.headers["etag"], response.headers["last-modified"]
+    assert etag == f'"{hashlib.sha256(b"cache me").hexdigest()}"'
+
+    response = client.get(f"/files/{filename}", headers={**headers, "If-None-Match": f'"other", {etag}'})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    response = client.get(f"/files/{filename}", headers={**headers, "If-Modified-Since": last_modified})
+    assert response.status_code == 304
+    assert client.get(f"/files/{filename}", headers={**headers, "If-None-Match": '"other"'}).status_code == 200
+
+def test_file_range_requests(client, test_user, upload_dir):
+    """Test single and multi-range requests"""
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    filename = upload_bytes(client, headers, "log.txt", b"0123456789")
+
+    response = client.get(f"/files/{filename}", headers={**headers, "Range": "bytes=2-5"})
+    assert response.status_code == 206
+    assert response.content == b"2345"
+    assert response.headers["content-range"] == "bytes 2-5/10"
+
+    response = client.get(f"/files/{filename}", headers={**headers, "Range": "bytes=0-1,8-"})
+    assert response.status_code == 206
+    assert response.headers["content-type"].startswith("multipart/byteranges")
+    assert b"01" in response.content and b"89" in response.content
+
+    response = client.get(f"/files/{filename}", headers={**headers, "Range": "bytes=2-5", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == b"0123456789"
+
+def test_file_accel_redirect(client, test_user, upload_dir, monkeypatch):
+    """Test that the nginx offload mode hands the transfer to nginx"""
+    monkeypatch.setattr(upload, "UPLOAD_ACCEL_REDIRECT_PREFIX", "/protected-uploads/")
+    headers = get_auth_headers(client, "test@example.com", "testpassword")
+    filename = upload_bytes(client, headers, "log.txt", b"offloaded")
+    digest = hashlib.sha256(b"offloaded").hexdigest()
+
+    response = client.get(f"/files/{filename}", headers=headers)
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["x-accel-redirect"] == f"/protected-uploads/{digest[:2]}/{digest[2:4]}/{digest}"
+    assert response.headers["content-type"].startswith("text/plain")
+    assert client.get(f"/files/{'0' * 64}.txt", headers=headers).status_code == 404